@@ -47,6 +47,62 @@ from .driver import find_driver
 _logger = logging.getLogger("ant.base.ant")
 
 
+class TxFrame():
+    """Preallocated data message of a channel, written to the driver as is on each TX tick.
+
+    Layout: sync, length (9), message id, channel, 8 payload bytes, checksum. The payload is written in place, by
+    set_payload() or pack_payload(), and the checksum is updated with the payload bytes changed only, no message,
+    array or checksum reduce per broadcast.
+    """
+    SYNC = 0xa4
+    PAYLOAD_OFFSET = 4
+    PAYLOAD_SIZE = 8
+    CHECKSUM_OFFSET = PAYLOAD_OFFSET + PAYLOAD_SIZE
+
+    def __init__(self, channel, message_id=Message.ID.BROADCAST_DATA):
+        self.channel = channel
+        self.buffer = bytearray(self.CHECKSUM_OFFSET + 1)
+        self.buffer[0] = self.SYNC
+        self.buffer[1] = self.PAYLOAD_SIZE + 1
+        self.buffer[2] = message_id
+        self.buffer[3] = channel
+        # the payload is all 0, the checksum is the one of the header.
+        self.buffer[self.CHECKSUM_OFFSET] = self.SYNC ^ (self.PAYLOAD_SIZE + 1) ^ message_id ^ channel
+        # the 8 payload bytes, a view in the buffer.
+        self.payload = memoryview(self.buffer)[self.PAYLOAD_OFFSET:self.CHECKSUM_OFFSET]
+
+    def set_payload(self, data):
+        """Copy the 8 bytes of data, bytes, bytearray or array('B'), in the payload."""
+        buffer = self.buffer
+        checksum = buffer[self.CHECKSUM_OFFSET]
+        offset = self.PAYLOAD_OFFSET
+        # an index loop, the small ints are cached, no iterator object.
+        index = 0
+        while index < self.PAYLOAD_SIZE:
+            new = data[index]
+            old = buffer[offset + index]
+            if new != old:
+                # xor the old byte out, the new one in.
+                checksum ^= old ^ new
+                buffer[offset + index] = new
+            index += 1
+        buffer[self.CHECKSUM_OFFSET] = checksum
+
+    def pack_payload(self, packer, *values):
+        """Pack the values in the payload with packer, a struct.Struct of 8 bytes, struct.pack_into in place."""
+        self.buffer[self.CHECKSUM_OFFSET] ^= self._payload_xor()
+        packer.pack_into(self.buffer, self.PAYLOAD_OFFSET, *values)
+        self.buffer[self.CHECKSUM_OFFSET] ^= self._payload_xor()
+
+    def _payload_xor(self):
+        # xor of the 8 payload bytes, folded from the 64 bit integer of them.
+        value = int.from_bytes(self.payload, 'little')
+        value ^= value >> 32
+        value ^= value >> 16
+        value ^= value >> 8
+        return value & 0xff
+
+
 class Ant():
     _RESET_WAIT = 1
 
@@ -63,6 +119,9 @@ class Ant():
         self._burst_data = array.array('B', [])
         self._last_data = array.array('B', [])
 
+        # channel: TxFrame of its broadcasts, see send_broadcast_data().
+        self._tx_frames = {}
+
         self._running = True
 
         self._driver.open()
@@ -75,11 +134,20 @@ class Ant():
     def start(self):
         self._main()
 
-    def stop(self):
+    def stop(self, timeout=None):
+        """Stop the reading thread, wait for it up to timeout seconds, and release the device.
+
+        The thread stops after its current read, the device read timeout. Return True if it's stopped.
+        """
         if self._running:
             _logger.debug("Stoping ant.base")
             self._running = False
-            self._worker_thread.join()
+            self._worker_thread.join(timeout)
+            if self._worker_thread.is_alive():
+                _logger.warning("ant.base thread still running after %s seconds", timeout)
+                return False
+            self._driver.close()
+        return not self._worker_thread.is_alive()
 
     def _on_broadcast(self, message):
         self._events.put(('event', (message._data[0],
@@ -314,14 +382,30 @@ class Ant():
         Almost the same with ACK data, the only difference is this is a immediate call,
         Use write_message(message) directly, instead of putting it into ACK queue (write_message_timeslot)
 
+        The message is the TxFrame of the channel, its payload is set in place and the same buffer is written on each
+        call, nothing is allocated per broadcast.
+
         :param channel: A number, indicate which channel to sent on the chip.
         :param data: Byte array, or array.array('B'), a 8-byte data payload.
         :return: nothing.
         """
         assert len(data) == 8
-        message = Message(Message.ID.BROADCAST_DATA,
-                          array.array('B', [channel]) + data)
-        self.write_message(message)
+        tx_frame = self.get_tx_frame(channel)
+        tx_frame.set_payload(data)
+        self.send_tx_frame(tx_frame)
+
+    def get_tx_frame(self, channel):
+        """The TxFrame of the channel broadcasts, for encoders packing the payload in it with pack_payload()."""
+        tx_frame = self._tx_frames.get(channel)
+        if tx_frame is None:
+            tx_frame = self._tx_frames[channel] = TxFrame(channel)
+        return tx_frame
+
+    def send_tx_frame(self, tx_frame):
+        """Write the TxFrame, its payload set in place, to the driver."""
+        self._driver.write(tx_frame.buffer)
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug("Write data: %s", format_list(tx_frame.buffer))
 
     def send_acknowledged_data(self, channel, data):
         assert len(data) == 8
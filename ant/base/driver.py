@@ -161,6 +161,7 @@ try:
             # was it found?
             if dev is None:
                 raise ValueError('Device not found')
+            self._dev = dev
 
             _logger.debug("USB Config values:")
             for cfg in dev:
@@ -223,7 +224,11 @@ try:
             assert self._out is not None and self._in is not None
 
         def close(self):
-            pass
+            # release the claimed interface, so the next open, in this process or another, gets the device.
+            dev = getattr(self, '_dev', None)
+            if dev is not None:
+                usb.util.dispose_resources(dev)
+                self._dev = None
 
         def read(self):
             return self._in.read(4096)
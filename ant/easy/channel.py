@@ -111,6 +111,14 @@ class Channel():
         _logger.debug("send broadcast data %s", self.id)
         self._ant.send_broadcast_data(self.id, data)
 
+    def get_tx_frame(self):
+        """The preallocated broadcast message of this channel, to set its payload in place, see ant.base.ant.TxFrame."""
+        return self._ant.get_tx_frame(self.id)
+
+    def send_tx_frame(self, tx_frame):
+        """Broadcast the message of get_tx_frame(), its payload already set, no copy."""
+        self._ant.send_tx_frame(tx_frame)
+
 
     def send_acknowledged_data(self, data):
         try:
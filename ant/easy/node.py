@@ -25,6 +25,7 @@ from __future__ import absolute_import, print_function
 import collections
 import threading
 import logging
+import time
 
 try:
     # Python 3
@@ -41,6 +42,11 @@ from ant.easy.filter import wait_for_event, wait_for_response, wait_for_special
 _logger = logging.getLogger("ant.easy.node")
 
 
+def _remaining(deadline):
+    # seconds left to the deadline, for a join(), None for no deadline.
+    return None if deadline is None else max(0, deadline - time.monotonic())
+
+
 class Node():
     def __init__(self):
 
@@ -135,11 +141,17 @@ class Node():
     def start(self):
         self._main()
 
-    def stop(self):
+    def stop(self, timeout=None):
+        """Stop the message loop and the threads, within timeout seconds if given, release the device.
+
+        Return True if all the threads are stopped.
+        """
         if self._running:
             _logger.debug("Stoping ant.easy")
+            deadline = None if timeout is None else time.monotonic() + timeout
             self._running = False
-            self.ant.stop()
-            self._worker_thread.join()
+            self.ant.stop(_remaining(deadline))
+            self._worker_thread.join(_remaining(deadline))
+        return not self._worker_thread.is_alive() and not self.ant._worker_thread.is_alive()
 
 
@@ -0,0 +1,56 @@
+# Ant
+#
+# Copyright (c) 2017, Rhys Kidd <rhyskidd@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import absolute_import, print_function
+
+import array
+import struct
+import unittest
+
+from ant.base.ant import TxFrame
+from ant.base.message import Message
+
+
+class TxFrameTest(unittest.TestCase):
+
+    def _message(self, channel, payload):
+        return bytes(Message(Message.ID.BROADCAST_DATA, array.array('B', [channel]) + array.array('B', payload)).get())
+
+    def test_set_payload(self):
+        tx_frame = TxFrame(2)
+        buffer = tx_frame.buffer
+        for payload in ([16, 176, 4, 40, 160, 15, 255, 38], [16, 176, 8, 40, 160, 15, 255, 38],
+                        [22, 255, 255, 255, 24, 200, 0, 32], [0] * 8):
+            tx_frame.set_payload(array.array('B', payload))
+            self.assertEqual(bytes(tx_frame.buffer), self._message(2, payload))
+            # the same buffer each time.
+            self.assertIs(tx_frame.buffer, buffer)
+        Message.parse(array.array('B', tx_frame.buffer))
+
+    def test_pack_payload(self):
+        tx_frame = TxFrame(0)
+        packer = struct.Struct('<BBBBHBB')
+        tx_frame.set_payload(bytes([1, 2, 3, 4, 5, 6, 7, 8]))
+        tx_frame.pack_payload(packer, 16, 176, 4, 40, 4000, 255, 38)
+        self.assertEqual(bytes(tx_frame.buffer), self._message(0, packer.pack(16, 176, 4, 40, 4000, 255, 38)))
+        self.assertEqual(bytes(tx_frame.payload), packer.pack(16, 176, 4, 40, 4000, 255, 38))
@@ -0,0 +1,278 @@
+"""Declarative ant+ data pages, compiled into struct encoders and decoders
+
+A page is a PageSpec, its page number, byte 0, and its fields, PageField, on the bytes 1 to 7:
+    PageField(name, offset, width=1, scale=1, rollover=None, invalid=None, maximum=None, default=None, value=None,
+              rounded=False)
+
+    name        the key of the field in the source of the encoder, a Mapping, or the attribute of a RowerFrame, and in
+                the dict of the decoder.
+    offset      first byte of the field, 1 to 7.
+    width       1, 2 or 4 bytes, little endian.
+    scale       raw = value * scale, 4 for the time in 0.25s, 1000 for the speed in 0.001m/s.
+    rollover    raw % rollover, for the accumulated fields.
+    invalid     the raw value sent when the source has no value, decoded back to None.
+    maximum     largest raw value, the largest of the width by default, but the invalid one.
+    default     value of the field when the source has none, instead of the invalid value.
+    value       a constant raw value, not read from the source, nor checked.
+    rounded     round the scaled value, instead of truncating it.
+The bytes no field covers are reserved, 0xFF.
+
+PageSpec compiles the fields into a struct.Struct and a tuple of converters, once: values(), pack_into() and encode()
+are a converter call per field and one pack, decode() one unpack, and decode_page() decodes any page of PAGE_SPECS, for
+the tools checking the broadcasts.
+
+Ant+ FE device profile, pages 16, 17, 18, 22, 54 and 71, common pages 80 and 81.
+
+"""
+
+import struct
+from collections.abc import Mapping
+
+from rower import RowerFrame
+
+PAGE_SIZE = 8
+
+# struct format of the field widths.
+_WIDTH_FORMATS = {1: 'B', 2: 'H', 4: 'I'}
+RESERVED = 0xFF
+
+
+class PageSpecError(Exception):
+    pass
+
+
+class PageField:
+    """A field of a data page, see the module doc."""
+
+    __slots__ = ('name', 'offset', 'width', 'scale', 'rollover', 'invalid', 'maximum', 'default', 'value', 'rounded')
+
+    def __init__(self, name, offset, width=1, scale=1, rollover=None, invalid=None, maximum=None, default=None,
+                 value=None, rounded=False):
+        if width not in _WIDTH_FORMATS:
+            raise PageSpecError("Field %s: width %r is not 1, 2 or 4 bytes" % (name, width))
+        if not 1 <= offset or offset + width > PAGE_SIZE:
+            raise PageSpecError("Field %s: bytes %d to %d out of the page" % (name, offset, offset + width - 1))
+        self.name = name
+        self.offset = offset
+        self.width = width
+        self.scale = scale
+        self.rollover = rollover
+        self.invalid = invalid
+        if maximum is None:
+            maximum = (1 << (8 * width)) - 1
+            if invalid == maximum:
+                maximum -= 1
+        self.maximum = maximum
+        self.default = default
+        self.value = value
+        self.rounded = rounded
+
+    def compile_encoder(self):
+        """Return a function of the value of the field in the source, returning its raw value."""
+        name, scale, rollover, invalid = self.name, self.scale, self.rollover, self.invalid
+        maximum, default, rounded = self.maximum, self.default, self.rounded
+
+        def encode(value):
+            if value is None:
+                value = default
+                if value is None:
+                    if invalid is None:
+                        raise PageSpecError("No value for %s, and no invalid value" % (name,))
+                    return invalid
+            raw = value * scale
+            raw = int(round(raw)) if rounded else int(raw)
+            if rollover is not None:
+                return raw % rollover
+            if not 0 <= raw <= maximum:
+                raise PageSpecError("%s %r out of range, raw %d not in 0 to %d" % (name, value, raw, maximum))
+            return raw
+
+        return encode
+
+    def decode(self, raw):
+        """The value of the raw field, None for the invalid value."""
+        if raw == self.invalid:
+            return None
+        if self.scale != 1:
+            return raw / self.scale
+        return raw
+
+
+class PageSpec:
+    """The fields of a data page, compiled, see the module doc."""
+
+    def __init__(self, page_number, fields, name=None):
+        self.page_number = page_number
+        self.name = name
+        self.fields = tuple(sorted(fields, key=lambda field: field.offset))
+
+        # the struct of the page, the reserved bytes in the gaps.
+        formats = ['<B']
+        # per struct item after the page number: the field, None for a reserved byte.
+        items = []
+        offset = 1
+        for field in self.fields:
+            if field.offset < offset:
+                raise PageSpecError("Page %d: field %s overlaps the byte %d" % (page_number, field.name, offset - 1))
+            while offset < field.offset:
+                formats.append('B')
+                items.append(None)
+                offset += 1
+            formats.append(_WIDTH_FORMATS[field.width])
+            items.append(field)
+            offset += field.width
+        while offset < PAGE_SIZE:
+            formats.append('B')
+            items.append(None)
+            offset += 1
+
+        self.struct = struct.Struct(''.join(formats))
+        assert self.struct.size == PAGE_SIZE
+        self._items = tuple(items)
+        # the struct values, the page number, the reserved bytes and the constants set once, and (index, name,
+        # encoder) of the fields read from the source.
+        self._template = [page_number]
+        variables = []
+        for field in items:
+            if field is None:
+                self._template.append(RESERVED)
+            elif field.value is not None:
+                self._template.append(field.value)
+            else:
+                variables.append((len(self._template), field.name, field.compile_encoder()))
+                self._template.append(None)
+        self._variables = tuple(variables)
+
+    def pack_into(self, buffer, offset, source=None):
+        """Encode the fields of source into the 8 bytes of the buffer at offset.
+
+        source is a Mapping, read with get(), or an object with the fields as attributes. A RowerFrame, a Mapping of
+        the schema fields only, is read as slots, the faster, its derived fields included.
+        """
+        self.struct.pack_into(buffer, offset, *self.values(source))
+
+    def values(self, source=None):
+        """The tuple of the struct values of the fields of source, see pack_into(), to pack with struct later."""
+        values = self._template.copy()
+        if source is None:
+            source = {}
+        if isinstance(source, Mapping) and not isinstance(source, RowerFrame):
+            get = source.get
+            for index, name, encode in self._variables:
+                values[index] = encode(get(name))
+        else:
+            for index, name, encode in self._variables:
+                values[index] = encode(getattr(source, name, None))
+        return tuple(values)
+
+    def encode(self, source=None):
+        """The 8 bytes payload of the fields of source, see pack_into()."""
+        payload = bytearray(PAGE_SIZE)
+        self.pack_into(payload, 0, source)
+        return bytes(payload)
+
+    def decode(self, payload):
+        """The dict of the fields of the payload, None for the invalid values, the reserved bytes are left out."""
+        raw_values = self.struct.unpack_from(payload)
+        if raw_values[0] != self.page_number:
+            raise PageSpecError("Page %d, not page %d" % (raw_values[0], self.page_number))
+        return {field.name: field.decode(raw) for field, raw in zip(self._items, raw_values[1:]) if field is not None}
+
+
+# General FE Data
+PAGE_16 = PageSpec(16, [
+    # FE type, bits 0-4, rower is 22, bits 5-7 are 0, 22 << 3.
+    PageField('equipment_type', 1, value=176),
+    # accumulated, in 0.25s, rollover at 64s.
+    PageField('total_elapsed_time', 2, scale=4, rollover=256),
+    # accumulated, in meter, rollover at 256m.
+    PageField('total_distance_traveled', 3, rollover=256),
+    # in 0.001m/s.
+    PageField('instantaneous_speed', 4, width=2, scale=1000, invalid=0xFFFF, rounded=True),
+    # no heart rate.
+    PageField('heart_rate', 6, value=0xFF, invalid=0xFF),
+    # 00 (no HR) + 1 (distance enabled) + 0 (real speed) + 011 (FE in_use state) + 0, todo: configurable.
+    PageField('capabilities_fe_state', 7, value=38),
+], name='General FE Data')
+
+# General Settings
+PAGE_17 = PageSpec(17, [
+    # in 0.01m.
+    PageField('stroke_length', 3, scale=100, invalid=0xFF),
+    # no incline on a rower, the bytes 0x7F 0xFF.
+    PageField('incline', 4, width=2, value=0xFF7F),
+    # in 0.5%, 100% when the rower doesn't tell.
+    PageField('resistance_level', 6, scale=200, maximum=200, default=1.0),
+    # 0x0 capabilities, 0x6 in use, todo: configurable.
+    PageField('capabilities_fe_state', 7, value=6),
+], name='General Settings')
+
+# General FE Metabolic Data
+PAGE_18 = PageSpec(18, [
+    # in 0.1kCal/hr.
+    PageField('calories_burn_rate', 4, width=2, scale=10, invalid=0xFFFF),
+    # accumulated calories, not available.
+    PageField('accumulated_calories', 6, value=0),
+    PageField('capabilities_fe_state', 7, value=6),
+], name='General FE Metabolic Data')
+
+# Specific Rower Data
+PAGE_22 = PageSpec(22, [
+    # stroke count, not available.
+    PageField('stroke_count', 3, value=0),
+    PageField('strokes_per_minute', 4, invalid=0xFF),
+    # in watts.
+    PageField('instantaneous_power', 5, width=2, invalid=0xFFFF),
+    PageField('capabilities_fe_state', 7, value=6),
+], name='Specific Rower Data')
+
+# FE Capabilities, sent on request.
+PAGE_54 = PageSpec(54, [
+    # in newtons, 0 when the rower doesn't tell.
+    PageField('maximum_resistance', 5, width=2, default=0),
+    # bit 0 basic resistance, bit 1 target power, bit 2 simulation modes, none by default.
+    PageField('capabilities', 7, maximum=0x07, default=0),
+], name='FE Capabilities')
+
+# Command Status, the answer to a control command.
+PAGE_71 = PageSpec(71, [
+    # page number of the last control command received, 0xFF for none.
+    PageField('last_command', 1, invalid=0xFF),
+    # its sequence number, 0xFF for none.
+    PageField('sequence_number', 2, invalid=0xFF),
+    # 0 pass, 1 fail, 2 not supported, 3 rejected, 4 pending, 0xFF uninitialized.
+    PageField('command_status', 3, invalid=0xFF),
+    # the data of the command, 0xFFFFFFFF for none.
+    PageField('response_data', 4, width=4, invalid=0xFFFFFFFF),
+], name='Command Status')
+
+# Manufacturer's Information
+PAGE_80 = PageSpec(80, [
+    # HW Revision, 0x0A or whatever.
+    PageField('hw_revision', 3, value=10),
+    # developer ID, 0x00FF.
+    PageField('manufacturer_id', 4, width=2, value=0x00FF),
+    PageField('model_number', 6, width=2, value=1),
+], name="Manufacturer's Information")
+
+# Product Information
+PAGE_81 = PageSpec(81, [
+    # supplemental SW revision, invalid.
+    PageField('supplemental_sw_revision', 2, value=0xFF, invalid=0xFF),
+    # SW revision, version 01.
+    PageField('sw_revision', 3, value=1),
+    # the lowest 32 bits of the serial number, 0xFFFFFFFF for no serial number.
+    PageField('serial_number', 4, width=4, value=0xFFFFFFFF, invalid=0xFFFFFFFF),
+], name='Product Information')
+
+# page number: PageSpec.
+PAGE_SPECS = {spec.page_number: spec for spec in (PAGE_16, PAGE_17, PAGE_18, PAGE_22, PAGE_54, PAGE_71, PAGE_80,
+                                                 PAGE_81)}
+
+
+def decode_page(payload):
+    """Decode the 8 bytes payload of a broadcast, return (page number, dict of the fields)."""
+    spec = PAGE_SPECS.get(payload[0])
+    if spec is None:
+        raise PageSpecError("Unknown page %d" % (payload[0],))
+    return spec.page_number, spec.decode(payload)
@@ -1,19 +1,30 @@
 import array
+import math
 import threading
+import time
 
 from ant.easy.node import Node
 from ant.easy.channel import Channel
 
-from rower import Rower
+from ant_page_spec import PAGE_16, PAGE_17, PAGE_18, PAGE_22, PAGE_54, PAGE_71, PAGE_80, PAGE_81
+from rower import Rower, RowerFrame
 
 
 class BaseDataPage:
+    # the page is built from fields a FrameExtrapolator projects on each tick, its cache in AntRower is keyed by the
+    # frame object, instead of the frame seq.
+    per_frame_object = False
+
     def __init__(self):
         self.bytes = array.array('B', [0, 0, 0, 0, 0, 0, 0, 0])
 
     def to_payload(self):
         return self.bytes
 
+    def write_payload(self, tx_frame):
+        """Write the payload in place in the TxFrame of the channel, only the bytes changed."""
+        tx_frame.set_payload(self.bytes)
+
     def _self_check(self):
         # data length should be 8
         assert len(self.bytes) == 8
@@ -22,278 +33,177 @@ class BaseDataPage:
             assert 0 <= self.bytes[i] <= 255
 
 
-class DataPage16(BaseDataPage):
-    # class attributes, shared across instances.
-    # for accumulated values to be calculated correctly, last time value is needed.
-    last_total_elapsed_time = 0
-    last_distance_traveled = 0
-
-    def __init__(self, incoming_rower_dict):
-        super(DataPage16, self).__init__()
-        assert isinstance(incoming_rower_dict, dict)
-
-        # this is a page 16
-        self.bytes[0] = 16
-
-        # construct data page 16 from incoming dict.
-
-        # Byte 1
-        # bit 0-4 is FE Type, rower is 22; bit 5-7 is 0.
-        # so it's 22 left shifted by 3 bit, so it's 22*2*2*2 = 176
-        equipment_type_bit_field = 176
-
-        # Byte 2
-        # elapsed_time_increment is a accumulated field, the unit is 0.25s.
-        # rollover at 64s
-        elapsed_time_after_rollover = int((incoming_rower_dict['total_elapsed_time'] / 0.25) % 256)
-
-        # if elapsed_time_increment > 255:
-        #     # if ant+ rower is started later than the actual rower, the total_elapsed_time may already be very big,
-        #     # we just ignore the work before, and assume now as the start.
-        #     # the first time a 255 (64s) will be sent, above then it will be normal.
-        #     # you can't avoid the bad that in this situation, you display device (watch) will not have the same
-        #     # total time as your head unit on the rower.
-        #     # so make sure the program is started before actual rowing.
-        #     elapsed_time_increment = 255
-        # update last value for next time, use tmp copy to prevent the possibility the value could change meanwhile.
-        # DataPage16.last_total_elapsed_time = incoming_rower_dict['total_elapsed_time']
-
-        # Byte 3
-        # unit is 1 meter.
-        distance_traveled_after_rollover = int(incoming_rower_dict['total_distance_traveled'] % 256)
-        # DataPage16.last_distance_traveled = incoming_rower_dict['total_distance_traveled']
-
-        # Byte 4 & 5,
-        # Combined to represent instant speed.
-        # tmp_current_instant_speed = self.instantaneous_speed
-        # speed precision is 0.001m/s
-        rounded_spd = round(incoming_rower_dict['instantaneous_speed'], 3)
-        # speed*1000 is 0-65534
-        int_spd = int(rounded_spd * 1000)
-        assert 0 <= int_spd < 65535
-
-        instant_speed_lsb = int_spd & 0xFF
-        instant_speed_msb = (int_spd & 0xFF00) >> 8
-
-        # Byte 6
-        # HR, we don't use it.
-        hr = 255
-
-        # Byte 7
-        # Capabilities Bit Field + RE State Bit Field
-        # 00 (no HR) +  1 (distance enabled) + 0 (real speed) + 011 (FE in_use state) + 0
-        # 00100110 = 38
-        # todo: make them configurable. for now hard code.
-        capability_and_fe_state = 38
-
-        # set the bytes accordingly.
-        self.bytes[1] = equipment_type_bit_field
-        self.bytes[2] = elapsed_time_after_rollover
-        self.bytes[3] = distance_traveled_after_rollover
-        self.bytes[4] = instant_speed_lsb
-        self.bytes[5] = instant_speed_msb
-        self.bytes[6] = hr
-        self.bytes[7] = capability_and_fe_state
-
-        # make sure it's a data page 16
-        assert self.bytes[0] == 16
+class SpecDataPage(BaseDataPage):
+    """A data page encoded by its PageSpec, see ant_page_spec, from the fields of a frame, or a plain dict."""
+
+    spec = None
+
+    def __init__(self, incoming_rower_dict=None):
+        super(SpecDataPage, self).__init__()
+        # the spec reads the fields of a frame as its slots, of a plain dict with get(), encoded once, packed on
+        # each tick the page is sent.
+        self.values = self.spec.values(incoming_rower_dict)
+        self.spec.struct.pack_into(self.bytes, 0, *self.values)
         self._self_check()
 
+    def write_payload(self, tx_frame):
+        """Pack the encoded values straight into the payload of the TxFrame, one struct pack in place."""
+        tx_frame.pack_payload(self.spec.struct, *self.values)
 
-class DataPage17(BaseDataPage):
-    """General settings page"""
 
-    def __init__(self, incoming_rower_dict):
-        super(DataPage17, self).__init__()
-        assert isinstance(incoming_rower_dict, dict)
+class DataPage16(SpecDataPage):
+    """General FE Data, elapsed time, distance and speed"""
+    # elapsed time and distance, projected between the frames.
+    per_frame_object = True
+    spec = PAGE_16
 
-        # resistance level
-        resistance_level = incoming_rower_dict.get('resistance_level', None)
-        if resistance_level is not None:
-            # unit is 0.5%
-            resistance_level_number = int(resistance_level / 0.005)
-            assert 0 < resistance_level_number <= 200
-        else:
-            # if no resistance data, it's a 100%, so 200.
-            resistance_level_number = 200
-
-        # assume stroke length in meters
-        stroke_length = incoming_rower_dict.get('stroke_length', None)
-        if stroke_length is not None:
-            stroke_length_number = int(stroke_length / 0.01)
-            assert 0 <= stroke_length_number <= 254
-        else:
-            # 0xFF indicates it's invalid on this rower.
-            stroke_length_number = 255
-
-        # set the bytes
-        self.bytes[0] = 17
-        self.bytes[1] = 255
-        self.bytes[2] = 255
-        self.bytes[3] = stroke_length_number
-        self.bytes[4] = 0x7F
-        self.bytes[5] = 0xFF
-        self.bytes[6] = resistance_level_number
-        self.bytes[7] = 6  # 0x0, 0x6=in use. # todo: configurable.
-
-        assert self.bytes[0] == 17
-        self._self_check()
+
+class DataPage17(SpecDataPage):
+    """General settings page"""
+    spec = PAGE_17
 
 
-class DataPage18(BaseDataPage):
+class DataPage18(SpecDataPage):
     """General FE Metabolic Data"""
+    spec = PAGE_18
 
-    def __init__(self, incoming_rower_dict):
-        super(DataPage18, self).__init__()
-        assert isinstance(incoming_rower_dict, dict)
 
-        # caloric burn rate
-        cal_per_hour = incoming_rower_dict.get('calories_burn_rate', None)
-        if cal_per_hour is not None:
-            # ant+ FE use unit of 0.1kCal/hr
-            cal_rate_number = cal_per_hour * 10
-            assert 0 <= cal_rate_number <= 65534
-        else:
-            cal_rate_number = 65535
-
-        # transfer to LSB, MSB
-        cal_rate_lsb = int(cal_rate_number) & 0xFF
-        cal_rate_msb = (int(cal_rate_number) & 0xFF00) >> 8
-
-        # set the bytes
-        self.bytes[0] = 18
-        self.bytes[1] = 0xFF
-        self.bytes[2] = 0xFF
-        self.bytes[3] = 0xFF
-        self.bytes[4] = cal_rate_lsb
-        self.bytes[5] = cal_rate_msb
-        self.bytes[6] = 0x00  # accumulated calories, not available.
-        self.bytes[7] = 6  # 0x0, 0x6, in-use, todo: configurable.
-
-        assert self.bytes[0] == 18
-        self._self_check()
+class DataPage22(SpecDataPage):
+    """Specific Rower Data"""
+    spec = PAGE_22
 
 
-class DataPage22(BaseDataPage):
-    """Specific Rower Data"""
+class DataPage54(SpecDataPage):
+    """FE Capabilities, from a dict of maximum_resistance and capabilities, sent on request"""
+    spec = PAGE_54
 
-    def __init__(self, incoming_rower_dict):
-        super(DataPage22, self).__init__()
-        assert isinstance(incoming_rower_dict, dict)
-
-        # get the spm
-        spm = incoming_rower_dict.get('strokes_per_minute', None)
-        if spm is None:
-            spm = 0xFF  # 0xFF indicates spm is not available
-        assert 0 <= spm <= 255
-        print(spm)
-
-        # get the power
-        power = incoming_rower_dict.get('instantaneous_power', None)
-        if power is None:
-            power = 65535  # 0xFF = invalid.
-        assert 0 <= power <= 65535
-        print(power)
-        power_lsb = power & 0xFF
-        power_msb = (power & 0xFF00) >> 8
-
-        # set the bits
-        self.bytes[0] = 22
-        self.bytes[1] = 255
-        self.bytes[2] = 255
-        self.bytes[3] = 0  # my case stroke count is not available.
-        self.bytes[4] = spm
-        self.bytes[5] = power_lsb
-        self.bytes[6] = power_msb
-        self.bytes[7] = 6  # 0x0, 0x6, in use. todo: configurable
-
-        assert self.bytes[0] == 22
-        self._self_check()
 
+class DataPage71(SpecDataPage):
+    """Command Status, from a dict of last_command, sequence_number, command_status and response_data"""
+    spec = PAGE_71
 
-class DataPage80(BaseDataPage):
+
+class DataPage80(SpecDataPage):
     """Common Data Page 80: Manufacturer’s Information
 
     Supposed to be a singleton to AntRower class, information is mainly fixed.
 
     """
-
-    def __init__(self):
-        super(DataPage80, self).__init__()
-
-        # this is a data page 80
-        self.bytes[0] = 80
-        # byte 1,2 reserved to 0xFF
-        self.bytes[1] = 255
-        self.bytes[2] = 255
-
-        # Byte 3, HW Revision, set to 0x0A or whatever.
-        hw_revision = 10
-
-        # byte 4,5: Manufacturer ID LSB, Manufacturer ID MSB
-        # use developer ID, 0x00FF
-        manufacturer_id_lsb = 255  # 0xFF
-        manufacturer_id_msb = 0  # 0x00
-
-        # byte 6,7: Model Number LSB, MSB.
-        # use whatever, here use 1, 0x0001
-        model_number_lsb = 1  # 0x01
-        model_number_msb = 0  # 0x00
-
-        # set the bytes accordingly.
-        self.bytes[3] = hw_revision
-        self.bytes[4] = manufacturer_id_lsb
-        self.bytes[5] = manufacturer_id_msb
-        self.bytes[6] = model_number_lsb
-        self.bytes[7] = model_number_msb
-
-        # make sure it's page 80
-        assert self.bytes[0] == 80
-        self._self_check()
+    spec = PAGE_80
 
 
-class DataPage81(BaseDataPage):
+class DataPage81(SpecDataPage):
     """Common Data Page 81: Product Information
 
     Supposed to be a singleton to AntRower class, information is mainly fixed.
 
     """
+    spec = PAGE_81
 
-    def __init__(self):
-        super(DataPage81, self).__init__()
-
-        # this is a data page 81
-        self.bytes[0] = 81
-        # byte 1 reserved to 0xFF
-        self.bytes[1] = 255
-
-        # byte 2, Supplemental SW Revision (Invalid = 0xFF)
-        supplemental_sw_revision = 255
-
-        # byte 3, SW Revision (Main), SW version defined by manufacturer if byte 2 is set to 0xFF.
-        # we use version 01
-        sw_revision = 1
-
-        # byte 4-7
-        # Serial Number. The lowest 32 bits of the serial number.
-        # Value 0xFFFFFFFF to be used for devices without serial numbers
-        # we use 0xFFFFFFFF, low_1 means 1st LSB, low_2 means 2nd LSB, ...
-        sn_low_1 = 255
-        sn_low_2 = 255
-        sn_low_3 = 255
-        sn_low_4 = 255
-
-        # set the bytes accordingly.
-        self.bytes[2] = supplemental_sw_revision
-        self.bytes[3] = sw_revision
-        self.bytes[4] = sn_low_1
-        self.bytes[5] = sn_low_2
-        self.bytes[6] = sn_low_3
-        self.bytes[7] = sn_low_4
-
-        # make sure it's page 81
-        assert self.bytes[0] == 81
-        self._self_check()
+
+# Transmission patterns, see Ant+ FE device profile page 24 of 74.
+#
+# A pattern is a schedule, a tuple of page ids, one per TX tick, looped over. Its length is a whole number of
+# 132 message cycles: 64 data pages, 2 of page 80, 64 data pages, 2 of page 81, the 64/2/64/2 common page layout.
+
+# length of the message cycle, and the common pages at their slots in it, from 0.
+CYCLE_LENGTH = 132
+COMMON_PAGE_SLOTS = {64: 80, 65: 80, 130: 81, 131: 81}
+# data slots in a cycle.
+DATA_SLOTS_PER_CYCLE = CYCLE_LENGTH - len(COMMON_PAGE_SLOTS)
+
+# data page id: page class.
+DATA_PAGE_CLASSES = {16: DataPage16, 17: DataPage17, 18: DataPage18, 22: DataPage22}
+
+
+class TransmissionPatternError(Exception):
+    pass
+
+
+def build_pattern(data_pages):
+    """Lay the data page ids over the data slots of the message cycles, repeated, the common pages in between.
+
+    The sequence goes on over the common pages and from one cycle to the next, the schedule has as many cycles as
+    needed for the sequence to end with a cycle: a 20 page sequence takes 5 cycles, 660 messages.
+    """
+    data_pages = tuple(data_pages)
+    if not data_pages:
+        raise TransmissionPatternError("No data page in the pattern")
+    cycles = len(data_pages) // math.gcd(len(data_pages), DATA_SLOTS_PER_CYCLE)
+    schedule = []
+    data_index = 0
+    for slot in range(cycles * CYCLE_LENGTH):
+        common_page = COMMON_PAGE_SLOTS.get(slot % CYCLE_LENGTH)
+        if common_page is not None:
+            schedule.append(common_page)
+        else:
+            schedule.append(data_pages[data_index % len(data_pages)])
+            data_index += 1
+    return tuple(schedule)
+
+
+def weighted_data_pages(weights):
+    """A sequence of data page ids with each page as often as its weight, spread out, {16: 2, 22: 1, 17: 1}.
+
+    Smooth weighted round robin: the pages of a weight are as evenly spaced as the others let them.
+    """
+    total = sum(weights.values())
+    current = dict.fromkeys(weights, 0)
+    sequence = []
+    for _ in range(total):
+        for page_id, weight in weights.items():
+            current[page_id] += weight
+        page_id = max(current, key=current.get)
+        current[page_id] -= total
+        sequence.append(page_id)
+    return sequence
+
+
+def validate_pattern(schedule):
+    """Raise TransmissionPatternError if the schedule doesn't follow the common page layout.
+
+    Whole cycles, the common pages at their slots, only known data pages in the other slots, and page 16, the
+    general FE data, in each half cycle.
+    """
+    if not schedule or len(schedule) % CYCLE_LENGTH:
+        raise TransmissionPatternError("Pattern length %d is not a multiple of %d" % (len(schedule), CYCLE_LENGTH))
+    for slot, page_id in enumerate(schedule):
+        common_page = COMMON_PAGE_SLOTS.get(slot % CYCLE_LENGTH)
+        if common_page is not None:
+            if page_id != common_page:
+                raise TransmissionPatternError("Slot %d is page %r, not the common page %d" % (slot, page_id,
+                                                                                               common_page))
+        elif page_id not in DATA_PAGE_CLASSES:
+            raise TransmissionPatternError("Slot %d is page %r, not a data page" % (slot, page_id))
+    for start in range(0, len(schedule), CYCLE_LENGTH // 2):
+        if 16 not in schedule[start:start + CYCLE_LENGTH // 2]:
+            raise TransmissionPatternError("No page 16 in messages %d to %d" % (start, start + CYCLE_LENGTH // 2))
+
+
+# pattern name: schedule, the suggested patterns of the device profile, and the registered ones.
+TRANSMISSION_PATTERNS = {
+    # only page 16, the minimum requirement.
+    'a': build_pattern([16]),
+    # 16 16 22 22
+    'b': build_pattern([16, 16, 22, 22]),
+    # the first 64 messages are 16 16 22 17 16 16 18 22, but the second 64 are 16 16 17 22 16 16 22 18, as in the
+    # document.
+    'c': build_pattern([16, 16, 22, 17, 16, 16, 18, 22] * 8 + [16, 16, 17, 22, 16, 16, 22, 18] * 8),
+    # repeats in 20 data messages, on over the common pages: 16 X X X X 16 X X X 18 16 X X X X 16 X X X 17
+    'd': build_pattern([16, 22, 22, 22, 22, 16, 22, 22, 22, 18, 16, 22, 22, 22, 22, 16, 22, 22, 22, 17]),
+}
+
+
+def register_transmission_pattern(name, schedule):
+    """Register a schedule, checked by validate_pattern(), for the TRANSMISSION_TYPE config of AntRower.
+
+    build_pattern() makes a schedule from a data page sequence, weighted_data_pages() a sequence from weights:
+        register_transmission_pattern('e', build_pattern(weighted_data_pages({16: 2, 22: 1, 18: 1})))
+    """
+    schedule = tuple(schedule)
+    validate_pattern(schedule)
+    TRANSMISSION_PATTERNS[name] = schedule
+    return schedule
 
 
 class AntRower:
@@ -303,10 +213,13 @@ class AntRower:
 
     """
 
+    # seconds to wait for the ant threads to stop, when the message loop ends on its own.
+    STOP_TIMEOUT = 2.0
+
     def __init__(self, source: Rower, config: dict):
         # only take one parameter, source.
         # source is a object represents a rower, best to be an instance of Rower,
-        # it should have a method of get_current_frame(), which returns a K-V dict, containing the rower info.
+        # it should have a method of get_current_frame(), which returns a RowerFrame, containing the rower info.
         # this method is called whenever the current rower data is needed, mostly, in a TX event to send out data.
         self.source = source
 
@@ -324,26 +237,50 @@ class AntRower:
         self.node = None  # later, when opened, node will be a instance of Node.
         self.channel = None  # later, when opened, will be the assigned channel object on the node.
 
-        # outbound message count
-        # used to implement specific transmission pattern, will be rollovered according to the specific pattern.
-        # transmission pattern is implemented in function _get_next_page(), for detail check there.
-        self.message_count = 1
         # if transmission type does not specifed, use type b as default.
         self.transmission_pattern = config.get('TRANSMISSION_TYPE', 'b')  # 1=a, 2=b, 3=c, 4=d, see Ant+ FE device profile page 24 of 74.
-        self.transmission_pattern_func_dict = {
-            'a': self._get_next_page_transmission_pattern_a,
-            'b': self._get_next_page_transmission_pattern_b,
-            'c': self._get_next_page_transmission_pattern_c,
-            'd': self._get_next_page_transmission_pattern_d
-        }
-        self.transmission_pattern_d_internal_count = 1
+        try:
+            # page id of each TX tick, see TRANSMISSION_PATTERNS.
+            self._schedule = TRANSMISSION_PATTERNS[self.transmission_pattern]
+        except KeyError:
+            raise TransmissionPatternError("Unknown transmission pattern %r" % (self.transmission_pattern,))
+        # slot of the next message in the schedule, rolled over at its end.
+        self._slot = 0
+
+        # adaptive scheduling: a data slot of the pattern, but the ones of page 16, of a page with no field changed
+        # since it was sent, sends the page of the pattern whose fields changed the most recently, instead of it
+        # waiting for its own slot. Page 16 and the common pages keep their slots, and only the pages of the pattern
+        # are sent, so the pattern stays compliant.
+        self.adaptive_pages = config.get('ADAPTIVE_PAGES', False)
+        # data page id: changed mask of its frame fields, for the pages which may take another page's slot.
+        self._page_field_masks = {
+            page_id: RowerFrame.field_mask(field.name for field in DATA_PAGE_CLASSES[page_id].spec.fields)
+            for page_id in sorted(set(self._schedule)) if page_id in DATA_PAGE_CLASSES and page_id != 16}
+        # data page id: slot: messages from the slot to the next slot of the page, 0 for its own, how long a
+        # page would wait for its slot.
+        self._slots_to_page = {page_id: self._slots_to(page_id) for page_id in self._page_field_masks}
+        # data page id: seq of the frame its fields changed in, not sent since.
+        self._fresh_pages = {}
+        # data pages which gave their slot away, not sent since, they keep their next slot: no page is starved by
+        # pages changing on each frame, a page is sent at least in every other slot of its own. And the data pages
+        # sent in a slot of another page, which give their next slot back.
+        self._owed_pages = set()
+        self._early_pages = set()
+        # seq of the last frame seen by the adaptive scheduling.
+        self._seen_seq = None
 
         # singleton, fixed data pages, 80 and 81
         self.page_80 = DataPage80()
         self.page_81 = DataPage81()
+        self._common_pages = {80: self.page_80, 81: self.page_81}
+        # page class: (frame, page) of the last page built of each kind, pages are only built again for a new frame.
+        self._page_cache = {}
+        # TxFrame of the channel, set once the channel is up.
+        self._tx_frame = None
 
-        # thread handler
+        # thread handler, and the stop request of close(), seen by the thread if it comes before the node is up.
         self.ant_thread = None
+        self._stop_event = threading.Event()
 
     def on_tx_event(self, data):
         """Callback function for Ant+ (openant)
@@ -354,10 +291,9 @@ class AntRower:
         """
         # data = array.array('B', [1, 255, 133, 128, 8, 0, 128, 0])
         page_to_send = self._get_next_page()
-        data_payload = page_to_send.to_payload()  # get new data payload to sent at this TX event.
-        # call channel's send_broadcast_data to set the TX buffer to new data.
-        self.channel.send_broadcast_data(data_payload)
-        print("send TX")
+        # write the new data payload to sent at this TX event in the channel's preallocated message, and send it.
+        page_to_send.write_payload(self._tx_frame)
+        self.channel.send_tx_frame(self._tx_frame)
 
     def _open_and_start(self):
         """Open ant+ channel, if no error, start broadcast immediately"""
@@ -373,6 +309,8 @@ class AntRower:
         self.channel = self.node.new_channel(Channel.Type.BIDIRECTIONAL_TRANSMIT)
         # set the callback function for TX tick, each TX tick, this function will be called.
         self.channel.on_TX_event = self.on_tx_event
+        # the broadcast message of the channel, the payload of each TX tick is written in it.
+        self._tx_frame = self.channel.get_tx_frame()
 
         # set the channel configurations
         self.channel.set_period(self.channel_period)
@@ -384,177 +322,146 @@ class AntRower:
         # once opened, the channel could be found by other devices, but No data sending yet.
         try:
             self.channel.open()
+            # closed while opening, node.stop() of close() may have missed the node.
+            if self._stop_event.is_set():
+                return
             # start the message loop on the ant device.
             # once started, the messages will be dispatched to callback functions of each channel.
+            # it runs until node.stop().
             self.node.start()
         finally:
-            self.node.stop()
+            self.node.stop(self.STOP_TIMEOUT)
 
     def start(self):
         """Start the broadcast event loop, from now on, each TX tick, send new broadcast"""
-        self.ant_thread = threading.Thread(target=self._open_and_start)
+        self._stop_event.clear()
+        self.ant_thread = threading.Thread(target=self._open_and_start, name="rowercast.ant", daemon=True)
         self.ant_thread.start()
         # this ensures the function is returned immediately to main thread, not blocking other lines in caller.
 
-    def close(self):
-        # todo: cleaning things up.
-        pass
+    def close(self, timeout=None):
+        """Stop broadcasting, release the USB device, wait for the threads up to timeout seconds.
+
+        Return True if all the threads are stopped, the USB device is released then.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._stop_event.set()
+        stopped = True
+        if self.node is not None:
+            stopped = self.node.stop(timeout)
+        if self.ant_thread is not None:
+            self.ant_thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+            stopped = stopped and not self.ant_thread.is_alive()
+        return stopped
+
+    def _cached_page(self, page_class, frame):
+        """The page of the frame, the current one of the source, built only once for each frame.
+
+        The frame changes about once a second, the page is sent 4 times a second, or more with many channels.
+        A page is built again when the frame seq changes, or for a per_frame_object page, on each new frame object.
+        """
+        cached = self._page_cache.get(page_class)
+        if cached is not None:
+            cached_frame, page = cached
+            if cached_frame is frame or (not page_class.per_frame_object and cached_frame.seq == frame.seq):
+                return page
+        page = page_class(frame)
+        self._page_cache[page_class] = (frame, page)
+        return page
 
     # Transmission pattern handling
 
     def _get_next_page(self) -> BaseDataPage:
         """Implemented the suggested transmission patterns illustrated in Ant+ FE device profile.
 
-        This function will return the next new page which should be sent out,
-        it handles when and what here, according the message count and the specific pattern.
+        This function will return the next new page which should be sent out, the page id of the tick is looked up
+        in the schedule of the transmission pattern, all the cases are in the table.
 
         """
-        assert 0 < self.message_count < 133
-
-        if self.message_count == 65 or self.message_count == 66:
-            # send page 80
-            next_page = self.page_80
-        elif self.message_count == 131 or self.message_count == 132:
-            # send page 81
-            next_page = self.page_81
-        else:
-            # send data page according to transmission type
-            # use dict in a way of switch statement, call different functions of different transmission type.
-            next_page = self.transmission_pattern_func_dict[self.transmission_pattern]()
-
-        # roll-over to 1 if msg count reaches 132
-        if self.message_count == 132:
-            self.message_count = 1
-            assert self.message_count <= 132
+        page_id = self._schedule[self._slot]
+        self._slot += 1
+        if self._slot == len(self._schedule):
+            self._slot = 0
+
+        # the frame of the tick, fetched once, a FrameExtrapolator projects a new one on each call.
+        frame = None
+        if self.adaptive_pages:
+            frame = self.source.get_current_frame()
+            self._note_changed_pages(frame)
+            if page_id in self._page_field_masks:
+                page_id = self._take_freshest_page(page_id)
+
+        page = self._common_pages.get(page_id)
+        if page is None:
+            if frame is None:
+                frame = self.source.get_current_frame()
+            page = self._cached_page(DATA_PAGE_CLASSES[page_id], frame)
+        return page
+
+    def _note_changed_pages(self, frame):
+        """Mark the pages carrying a field changed in the frame, if new, with the seq of the frame."""
+        if frame.seq == self._seen_seq:
+            return
+        # the mask is against the frame before, a frame skipped in between may have changed any field.
+        if self._seen_seq is not None and frame.seq == self._seen_seq + 1:
+            changed = frame.changed
         else:
-            self.message_count += 1
-
-        return next_page
-
-    def _get_next_page_transmission_pattern_a(self):
-        """Transmission pattern A
-
-        Only send page 16, the minimum requirement.
-
-        :return: data payload of page 16.
-        """
-        # construct a data page 16 from current rower data of source Rower object.
-        return DataPage16(self.source.get_current_frame())
-
-    def _get_next_page_transmission_pattern_b(self):
-        """Transmission pattern B
-
-        [16 16 X X ...(64)...] (65)80 (66)80 [(67)16 16 X X ....(130)] (131)81 (132)81
-
-        Mod left part directly, mode right part with minus 2.
-
-        """
-        if self.message_count <= 64:
-            # left half
-            # 1-64, directly mod 4 will be fine, remainder is the sequence.
-            # 1 % 4 = 1, 2%4 = 2, 3%4 = 3, 4%4 =0, 5%4 = 1, ..., 8%4 = 0.
-            if self.message_count % 4 == 1 or self.message_count % 4 == 2:
-                return DataPage16(self.source.get_current_frame())
-            else:
-                # could only be 3, 0
-                return DataPage22(self.source.get_current_frame())
-        elif self.message_count >= 67:
-            # right half, -2 before mod.
-            if ((self.message_count - 2) % 4 == 1) or ((self.message_count - 2) % 4 == 2):
-                return DataPage16(self.source.get_current_frame())
-            else:
-                # could only be 3, 0
-                return DataPage22(self.source.get_current_frame())
-
-    def _get_next_page_transmission_pattern_c(self):
-        """Transmission pattern C
-
-        Note that the illustrated pattern in the document is
-        first 64 message are          16 16 X 17 16 16 18 X
-        but second 64 messages are    16 16 17 X 16 16 X 18
-
-        Don't know why, but better follow.
-
-        simply look into message count, see which patter should used.
-
-        mod by 8 (right part -2 first), then know which page to go.
-
+            changed = RowerFrame.ALL_CHANGED
+        self._seen_seq = frame.seq
+        for page_id, mask in self._page_field_masks.items():
+            if changed & mask:
+                self._fresh_pages[page_id] = frame.seq
+
+    def _slots_to(self, page_id):
+        """Tuple of the messages from each slot of the schedule to the next slot of the page, rolled over."""
+        length = len(self._schedule)
+        slots_to_page = [0] * length
+        distance = None
+        # backwards, twice around, the slots past the last one of the page count from its first one.
+        for slot in reversed(range(2 * length)):
+            if self._schedule[slot % length] == page_id:
+                distance = 0
+            elif distance is not None:
+                distance += 1
+            if slot < length:
+                slots_to_page[slot] = distance
+        return tuple(slots_to_page)
+
+    def _take_freshest_page(self, page_id):
+        """The page to send in the data slot of page_id, page_id itself unless it has nothing new to send.
+
+        A page sent in another page's slot gives its next slot of its own back to it, a swap, the pattern keeps the
+        number of each page, only their order changes.
         """
-
-        if self.message_count <= 64:
-            # left half
-            # 1-64, directly mod 8 will be fine, remainder is the sequence.
-            msg_count_mod_8 = self.message_count % 8
-            assert 0 <= msg_count_mod_8 < 8
-
-            if msg_count_mod_8 == 1 or msg_count_mod_8 == 2:
-                return DataPage16(self.source.get_current_frame())
-            elif msg_count_mod_8 == 3:
-                return DataPage22(self.source.get_current_frame())
-            elif msg_count_mod_8 == 4:
-                return DataPage17(self.source.get_current_frame())
-            elif msg_count_mod_8 == 5 or msg_count_mod_8 == 6:
-                return DataPage16(self.source.get_current_frame())
-            elif msg_count_mod_8 == 7:
-                return DataPage18(self.source.get_current_frame())
-            else:
-                # could only be 0, so the 8th
-                return DataPage22(self.source.get_current_frame())
-        elif self.message_count >= 67:
-            # right half, -2 before mod.
-            msg_count_mod_8 = (self.message_count - 2) % 8
-            assert 0 <= msg_count_mod_8 < 8
-
-            if msg_count_mod_8 == 1 or msg_count_mod_8 == 2:
-                return DataPage16(self.source.get_current_frame())
-            elif msg_count_mod_8 == 3:
-                return DataPage17(self.source.get_current_frame())
-            elif msg_count_mod_8 == 4:
-                return DataPage22(self.source.get_current_frame())
-            elif msg_count_mod_8 == 5 or msg_count_mod_8 == 6:
-                return DataPage16(self.source.get_current_frame())
-            elif msg_count_mod_8 == 7:
-                return DataPage22(self.source.get_current_frame())
-            else:
-                # could only be 0, so the 8th
-                return DataPage18(self.source.get_current_frame())
-
-    def _get_next_page_transmission_pattern_d(self):
-        """Transmission pattern D
-
-        This pattern is a little bit different from others, pattern repeat in 20 messages, ignore others.
-
-        16 X X X X 16 X X X 18 16 X X X X 16 X X X 17
-
-        1,6,11,16 is page 16
-        10, is page 18
-        20, page 17
-        others, page 22
-
-        this pattern it self repeats, whenever it in time slot for 64 pages of data, after 80 and 81 interrupts,
-        it resumes, it's independent from the 64-2-64-2 134 messages pattern.
-
-        So we use a function property to maintain its own pattern counts.
-        This property roll-over every 20 data messages.
-
-        """
-
-        assert 0 < self.transmission_pattern_d_internal_count <= 20
-
-        if (self.transmission_pattern_d_internal_count == 1
-                or self.transmission_pattern_d_internal_count == 6
-                or self.transmission_pattern_d_internal_count == 11
-                or self.transmission_pattern_d_internal_count == 16):
-            return DataPage16(self.source.get_current_frame())
-        elif self.transmission_pattern_d_internal_count == 10:
-            return DataPage18(self.source.get_current_frame())
-        elif self.transmission_pattern_d_internal_count == 20:
-            # roll-over to 1
-            self.transmission_pattern_d_internal_count = 1
-            # return page 17 for current time
-            return DataPage17(self.source.get_current_frame())
+        fresh_pages = self._fresh_pages
+        owed_pages = self._owed_pages
+        early_pages = self._early_pages
+        scheduled = page_id
+        if fresh_pages and scheduled not in fresh_pages and scheduled not in owed_pages:
+            # the slot would send nothing new, it goes to the freshest page, of them the one whose next slot is the
+            # farthest, it would wait the longest.
+            slot = self._slot
+            slots_to_page = self._slots_to_page
+            page_id = max(fresh_pages, key=lambda fresh_id: (fresh_pages[fresh_id], slots_to_page[fresh_id][slot]))
+            if page_id != scheduled:
+                if scheduled in early_pages:
+                    # already sent ahead of this slot.
+                    early_pages.discard(scheduled)
+                else:
+                    owed_pages.add(scheduled)
+        elif scheduled in early_pages and owed_pages:
+            # sent ahead of this slot, the slot goes back to a page which gave its own away.
+            early_pages.discard(scheduled)
+            page_id = min(owed_pages)
+
+        if page_id == scheduled:
+            early_pages.discard(page_id)
+            owed_pages.discard(page_id)
+        elif page_id in owed_pages:
+            owed_pages.discard(page_id)
         else:
-            # should be all page 22.
-            return DataPage22(self.source.get_current_frame())
+            early_pages.add(page_id)
+        fresh_pages.pop(page_id, None)
+        return page_id
 
     # others implemented later.
@@ -0,0 +1,72 @@
+"""Benchmark of the ant+ page building, per TX tick.
+
+Compare the ticks/sec of building each data page from the frame on each tick, as before the page cache, with
+AntRower._get_next_page() which builds a page once per frame. Page 16 is still built on each new frame object, the
+ones of a FrameExtrapolator are new on each tick.
+
+Run from the repository root:
+    python benchmark/ant_page_bench.py [number_of_ticks]
+
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rower  # noqa: E402
+from ant_rower import AntRower, DataPage16, DataPage17, DataPage18, DataPage22  # noqa: E402
+
+# pattern c, without the common pages.
+PATTERN_C = (DataPage16, DataPage16, DataPage22, DataPage17, DataPage16, DataPage16, DataPage18, DataPage22)
+
+# ticks between two frames, the rower updates once a second, a channel sends 4 pages a second, 8 channels.
+TICKS_PER_FRAME = 32
+
+
+class FrameSource:
+    """Source of prebuilt frames, switched by the benchmark, so the Rower update isn't in the timings."""
+
+    def __init__(self, count):
+        my_rower = rower.Rower(history_capacity=0)
+        self.frames = []
+        for i in range(count // TICKS_PER_FRAME + 1):
+            my_rower.on_update_data({'total_elapsed_time': i, 'total_distance_traveled': i * 4,
+                                     'instantaneous_speed': 4.0, 'strokes_per_minute': 24, 'instantaneous_power': 200,
+                                     'calories_burn_rate': 900, 'resistance_level': 0.5})
+            self.frames.append(my_rower.get_current_frame())
+        self.frame = self.frames[0]
+
+    def get_current_frame(self):
+        return self.frame
+
+
+def bench_uncached(count):
+    source = FrameSource(count)
+    start = time.perf_counter()
+    for i in range(count):
+        source.frame = source.frames[i // TICKS_PER_FRAME]
+        PATTERN_C[i % 8](source.get_current_frame()).to_payload()
+    return time.perf_counter() - start
+
+
+def bench_cached(count):
+    source = FrameSource(count)
+    ant_rower = AntRower(source, {'TRANSMISSION_TYPE': 'c'})
+    start = time.perf_counter()
+    for i in range(count):
+        source.frame = source.frames[i // TICKS_PER_FRAME]
+        ant_rower._get_next_page().to_payload()
+    return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for name, elapsed in (('page built on each tick', bench_uncached(count)),
+                          ('page cache', bench_cached(count))):
+        print('%-34s %12.0f ticks/sec' % (name, count / elapsed))
+
+
+if __name__ == '__main__':
+    main()
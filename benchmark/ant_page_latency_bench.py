@@ -0,0 +1,80 @@
+"""Benchmark of the latency from a change on the rower to the ant+ page carrying it, fixed and adaptive patterns.
+
+A simulated session: a new frame each second, 4 TX ticks a second, as the 8192 channel period. The power, the stroke
+rate and the calories change on each frame, the resistance on one frame in 10. For each field, the latency is the time
+from the frame to the first page sent with the field, after the frame. The same seeded session is sent with the
+fixed pattern, and with ADAPTIVE_PAGES.
+
+Run from the repository root:
+    python benchmark/ant_page_latency_bench.py [seconds] [pattern]
+
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rower  # noqa: E402
+from ant_rower import AntRower  # noqa: E402
+from ant_page_spec import PAGE_SPECS  # noqa: E402
+
+TICKS_PER_SECOND = 4
+FIELDS = ('resistance_level', 'strokes_per_minute', 'instantaneous_power', 'calories_burn_rate')
+
+# page number: the fields it carries.
+PAGE_FIELDS = {number: {field.name for field in spec.fields} for number, spec in PAGE_SPECS.items()}
+
+
+def run(seconds, pattern, adaptive, seed=1):
+    """Return {field: [latency in seconds of each change]}."""
+    generator = random.Random(seed)
+    my_rower = rower.Rower(history_capacity=0)
+    ant_rower = AntRower(my_rower, {'TRANSMISSION_TYPE': pattern, 'ADAPTIVE_PAGES': adaptive})
+    fields = {'total_elapsed_time': 0, 'total_distance_traveled': 0, 'instantaneous_speed': 4.0,
+              'strokes_per_minute': 24, 'instantaneous_power': 200, 'calories_burn_rate': 900,
+              'resistance_level': 0.5}
+    latencies = {name: [] for name in FIELDS}
+    # field: tick of its change not sent yet.
+    pending = {}
+    tick = 0
+    for second in range(seconds):
+        fields = dict(fields, total_elapsed_time=second, total_distance_traveled=second * 4,
+                      strokes_per_minute=generator.randint(20, 30),
+                      instantaneous_power=generator.randint(150, 250),
+                      calories_burn_rate=generator.randint(800, 1000))
+        if generator.random() < 0.1:
+            fields['resistance_level'] = generator.choice([0.25, 0.5, 0.75, 1.0])
+        previous = my_rower.get_current_frame()
+        my_rower.on_update_data(dict(fields))
+        frame = my_rower.get_current_frame()
+        for name in FIELDS:
+            if getattr(frame, name) != getattr(previous, name) and name not in pending:
+                pending[name] = tick
+        for _ in range(TICKS_PER_SECOND):
+            page_number = ant_rower._get_next_page().to_payload()[0]
+            tick += 1
+            for name in PAGE_FIELDS[page_number] & pending.keys():
+                latencies[name].append((tick - pending.pop(name)) / TICKS_PER_SECOND)
+    return latencies
+
+
+def main():
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 3600
+    pattern = sys.argv[2] if len(sys.argv) > 2 else 'c'
+    print('pattern %s, %d seconds, latency in seconds, mean / max' % (pattern, seconds))
+    fixed = run(seconds, pattern, False)
+    adaptive = run(seconds, pattern, True)
+    for name in FIELDS:
+        cells = []
+        for latencies in (fixed[name], adaptive[name]):
+            if latencies:
+                cells.append('%5.2f / %5.2f' % (sum(latencies) / len(latencies), max(latencies)))
+            else:
+                cells.append('%13s' % 'not sent')
+        print('%-22s fixed %s   adaptive %s' % (name, cells[0], cells[1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Benchmark of the memory allocated by the ant+ TX path, per TX tick, with tracemalloc.
+
+Compare the broadcast as before, a Message of array('B', [channel]) + data, its reduce checksum and the array of
+Message.get(), with Ant.send_broadcast_data() on the preallocated TxFrame of the channel, and the whole tick of
+AntRower.on_tx_event(), from the cached data page to the driver write.
+
+The driver is a fake keeping a reference to the data written, the ticks are on a frame already seen, no page is
+built. For each path it prints the bytes still allocated after the ticks, per tick, and the peak of the memory
+allocated during the ticks, above the one before them: the peak of a path allocating nothing per tick is the
+iteration itself, whatever the number of ticks.
+
+Run from the repository root:
+    python benchmark/ant_tx_alloc_bench.py [number_of_ticks]
+
+"""
+
+import array
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rower  # noqa: E402
+from ant.base.ant import Ant  # noqa: E402
+from ant.base.message import Message  # noqa: E402
+from ant_rower import AntRower  # noqa: E402
+
+# the payloads sent in turn, as the cached pages of a pattern.
+PAYLOADS = [array.array('B', [16, 176, i, 40, 160, 15, 255, 38]) for i in range(4)]
+
+
+class FakeDriver:
+    """A driver allocating nothing on write, it keeps the last data."""
+
+    def __init__(self):
+        self.data = None
+
+    def write(self, data):
+        self.data = data
+
+
+class FakeChannel:
+    """The easy Channel of the TX path, on an Ant with the fake driver."""
+
+    def __init__(self, ant):
+        self._ant = ant
+
+    def get_tx_frame(self):
+        return self._ant.get_tx_frame(0)
+
+    def send_tx_frame(self, tx_frame):
+        self._ant.send_tx_frame(tx_frame)
+
+
+def fake_ant():
+    # no device, only what the TX path uses.
+    ant = Ant.__new__(Ant)
+    ant._driver = FakeDriver()
+    ant._tx_frames = {}
+    return ant
+
+
+def measure(tick, payloads):
+    """Run tick(payload) for each payload, return (bytes retained per tick, peak bytes above the start)."""
+    # warm up, the caches and the TxFrame are made.
+    for payload in payloads[:100]:
+        tick(payload)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = tracemalloc.get_traced_memory()[0]
+    for payload in payloads:
+        tick(payload)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (current - start) / len(payloads), peak - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    # a list of references to iterate, no int per tick as a range() would.
+    payloads = [PAYLOADS[i % len(PAYLOADS)] for i in range(count)]
+
+    ant = fake_ant()
+
+    def message_tick(payload):
+        ant._driver.write(Message(Message.ID.BROADCAST_DATA, array.array('B', [0]) + payload).get())
+
+    def tx_frame_tick(payload):
+        ant.send_broadcast_data(0, payload)
+
+    my_rower = rower.Rower(history_capacity=0)
+    my_rower.on_update_data({'total_elapsed_time': 10, 'total_distance_traveled': 40, 'instantaneous_speed': 4.0,
+                             'strokes_per_minute': 24, 'instantaneous_power': 200})
+    ant_rower = AntRower(my_rower, {'TRANSMISSION_TYPE': 'b'})
+    ant_rower.channel = FakeChannel(ant)
+    ant_rower._tx_frame = ant_rower.channel.get_tx_frame()
+
+    def ant_rower_tick(payload):
+        ant_rower.on_tx_event(None)
+
+    print('%-34s %16s %12s' % ('', 'retained B/tick', 'peak B'))
+    for name, tick in (('no tick, the iteration', lambda payload: None),
+                       ('Message per broadcast', message_tick),
+                       ('TxFrame', tx_frame_tick),
+                       ('AntRower.on_tx_event', ant_rower_tick)):
+        retained, peak = measure(tick, payloads)
+        print('%-34s %16.4f %12d' % (name, retained, peak))
+
+
+if __name__ == '__main__':
+    main()
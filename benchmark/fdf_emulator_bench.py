@@ -0,0 +1,65 @@
+"""Benchmark of the serial to frame path, through a pty, with the FDF head unit emulator.
+
+An FDFEmulator sends frames at a rate, each with its number as the distance, the time it's written is kept. An
+FDFReader reads them through pyserial, and a subscriber of the Rower takes the latency of each frame, from the
+write on the emulator side to the frame in the Rower. Reports the frames/sec, the frames lost, and the latency.
+
+Run from the repository root:
+    python benchmark/fdf_emulator_bench.py [seconds]
+
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rower  # noqa: E402
+from fdf_emulator import FDFEmulator  # noqa: E402
+from serial_reader import FDFReader  # noqa: E402
+
+# the 5 distance digits of a frame.
+MAX_DISTANCE = 100000
+
+
+def bench(rate, seconds):
+    send_times = {}
+    latencies = []
+
+    def source(elapsed):
+        number = len(send_times) % MAX_DISTANCE
+        # the write follows this call at once.
+        send_times[number] = time.monotonic()
+        return {'total_elapsed_time': int(elapsed), 'total_distance_traveled': number,
+                'instantaneous_speed': 4.0, 'strokes_per_minute': 26, 'instantaneous_power': 180}
+
+    my_rower = rower.Rower()
+    my_rower.subscribe(
+        lambda frame: latencies.append(frame.timestamp - send_times[frame['total_distance_traveled']]))
+
+    with FDFEmulator(rate=rate, source=source) as emulator:
+        reader = FDFReader(my_rower, emulator.device)
+        reader.start()
+        time.sleep(seconds)
+        reader.close(timeout=2)
+        sent = emulator.frames
+
+    latencies.sort()
+    count = len(latencies)
+    if not count:
+        print('%6d Hz no frame read' % rate)
+        return
+    print('%6d Hz %8d sent %8d read %10.0f frames/sec  latency ms: median %6.3f  p99 %6.3f  max %6.3f' %
+          (rate, sent, count, count / seconds, latencies[count // 2] * 1000,
+           latencies[min(count - 1, count * 99 // 100)] * 1000, latencies[-1] * 1000))
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    for rate in (1, 10, 100, 1000, 5000):
+        bench(rate, seconds)
+
+
+if __name__ == '__main__':
+    main()
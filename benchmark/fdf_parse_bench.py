@@ -0,0 +1,87 @@
+"""Benchmark of the FDF frame parser.
+
+Compare frames/sec of the old slicing _parse (an int() per field), the one-pass parse_fdf_frame, and the batch
+decode_fdf_frames into columns, on a synthetic capture of a million frames.
+
+Run from the repository root:
+    python benchmark/fdf_parse_bench.py [number_of_frames]
+
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from serial_reader import decode_fdf_frames, encode_fdf_frame, parse_fdf_frame  # noqa: E402
+
+# the head unit shows at most 99:59, longer synthetic sessions start over, like a reset.
+SESSION_LENGTH = 6000
+
+
+def legacy_parse(ser_bytes):
+    """The slicing FDFReader._parse before the one-pass parser, kept here as the baseline."""
+    if len(ser_bytes) == 31:
+        if not (ser_bytes[3:12].isdigit() and ser_bytes[13:29].isdigit()):
+            return None
+        total_minutes = int(ser_bytes[3:5], 10)
+        total_seconds = int(ser_bytes[5:7], 10)
+        distance = int(ser_bytes[7:12], 10)
+        minutes_to_500m = int(ser_bytes[13:15], 10)
+        seconds_to_500m = int(ser_bytes[15:17], 10)
+        spm = int(ser_bytes[17:20], 10)
+        watt = int(ser_bytes[20:23], 10)
+        cal_per_hour = int(ser_bytes[23:27], 10)
+        level = int(ser_bytes[27:29], 10)
+        if minutes_to_500m == 0 and seconds_to_500m == 0:
+            return None
+        return {
+            'total_elapsed_time': total_minutes * 60 + total_seconds,
+            'total_distance_traveled': distance,
+            'instantaneous_speed': 500 / (minutes_to_500m * 60 + seconds_to_500m),
+            'strokes_per_minute': spm,
+            'instantaneous_power': watt,
+            'calories_burn_rate': cal_per_hour,
+            'resistance_level': level / 4
+        }
+    return None
+
+
+def make_frames(count):
+    return [encode_fdf_frame(i % SESSION_LENGTH, i % SESSION_LENGTH * 4, 110 + i % 30, spm=28, power=150 + i % 50,
+                             cal_per_hour=650, level=2)
+            for i in range(count)]
+
+
+def report(name, count, elapsed):
+    print('%-36s %12.0f frames/sec %8.2f us/frame' % (name, count / elapsed, elapsed / count * 1e6))
+
+
+def bench(name, func, frames):
+    start = time.perf_counter()
+    for frame in frames:
+        func(frame)
+    report(name, len(frames), time.perf_counter() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    frames = make_frames(count)
+    capture = b''.join(frames)
+    # the same frames, with a command response every 100 frames, not a clean stream.
+    noisy_capture = b''.join(frame + b'C1164\r\n' if i % 100 == 0 else frame for i, frame in enumerate(frames))
+
+    bench('legacy slicing _parse', legacy_parse, frames)
+    bench('parse_fdf_frame', parse_fdf_frame, frames)
+
+    start = time.perf_counter()
+    decode_fdf_frames(capture)
+    report('decode_fdf_frames, clean stream', count, time.perf_counter() - start)
+    start = time.perf_counter()
+    decode_fdf_frames(noisy_capture)
+    report('decode_fdf_frames, with responses', count, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
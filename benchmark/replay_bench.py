@@ -0,0 +1,63 @@
+"""Benchmark of the whole parse -> validate -> encode pipeline, with replayed FDF frames.
+
+A synthetic session of raw FDF frames is replayed as fast as possible by a ReplayReader, through FDFReader._parse(),
+the Rower (check, metrics, history), and the subscribed consumers. A field capture can be replayed instead.
+
+Run from the repository root:
+    python benchmark/replay_bench.py [number_of_frames | capture_file]
+
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rower  # noqa: E402
+from fit_encoder import FitActivityEncoder  # noqa: E402
+from serial_reader import ReplayReader, encode_fdf_frame  # noqa: E402
+
+
+# the head unit shows at most 99:59, longer synthetic sessions start over, like a reset.
+SESSION_LENGTH = 6000
+
+
+def make_messages(count):
+    return [(float(i), encode_fdf_frame(i % SESSION_LENGTH, i % SESSION_LENGTH * 4, 125, spm=28, power=180,
+                                        cal_per_hour=650, level=2))
+            for i in range(count)]
+
+
+def bench(name, capture, with_fit):
+    my_rower = rower.Rower()
+    reader = ReplayReader(my_rower, capture, speed=0)
+    encoder = None
+    if with_fit:
+        fd, path = tempfile.mkstemp(suffix='.fit')
+        os.close(fd)
+        encoder = FitActivityEncoder(path)
+        encoder.start(my_rower)
+
+    start = time.perf_counter()
+    sent = reader.replay()
+    if encoder is not None:
+        encoder.finish()
+    elapsed = time.perf_counter() - start
+
+    if encoder is not None:
+        os.remove(path)
+    print('%-32s %8d frames %12.0f frames/sec' % (name, sent, sent / elapsed))
+
+
+def main():
+    argument = sys.argv[1] if len(sys.argv) > 1 else '36000'
+    capture = make_messages(int(argument)) if argument.isdigit() else argument
+
+    bench('parse -> rower', capture, with_fit=False)
+    bench('parse -> rower -> fit file', capture, with_fit=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Micro-benchmark of the Rower frame validity check, and of the whole on_update_data() it is part of.
+
+The validity check is measured alone: the old list-scan _check_dict_validity against the compiled schema check.
+
+on_update_data() does much more than the check since the frame history and the derived metrics were added, so its
+numbers are for the whole update, with each stage measured on its own as well, to see where the time goes:
+    - the validity check,
+    - the MetricsEngine update,
+    - building the RowerFrame,
+    - the FrameHistory append.
+The trusted path only skips the check, it can't be much faster than the checked path, most of the time is in the
+metrics.
+
+Run from the repository root:
+    python benchmark/rower_validity_bench.py [number_of_frames]
+
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import frame_history  # noqa: E402
+import metrics  # noqa: E402
+import rower  # noqa: E402
+
+
+def legacy_check_dict_validity(incoming_dict):
+    """The list-scan validity check before the compiled schema, kept here as the baseline."""
+    all_valid_keys = ['total_elapsed_time', 'total_distance_traveled', 'instantaneous_speed', 'strokes_per_minute',
+                      'instantaneous_power', 'calories_burn_rate', 'resistance_level']
+    mandatory_keys = ['total_elapsed_time', 'total_distance_traveled', 'instantaneous_speed']
+    integer_keys = ['total_elapsed_time', 'total_distance_traveled', 'strokes_per_minute', 'instantaneous_power']
+    negative_keys = []
+
+    for key in incoming_dict.keys():
+        if key not in all_valid_keys:
+            raise rower.IncomingRowerDictInvalidKeyError(key)
+        value = incoming_dict.get(key, None)
+        if value is None:
+            if key in mandatory_keys:
+                raise rower.IncomingRowerDictInvalidKeyError(key)
+        else:
+            if key in integer_keys:
+                if int(value) != value:
+                    raise rower.IncomingRowerDictInvalidValueError(key)
+            if key not in negative_keys:
+                if value < 0:
+                    raise rower.IncomingRowerDictInvalidValueError(key)
+
+    for m_key in mandatory_keys:
+        if m_key not in incoming_dict.keys():
+            raise rower.IncomingRowerDictMissingKeyError(m_key)
+
+
+def make_frames(count):
+    return [{
+        'total_elapsed_time': i,
+        'total_distance_traveled': i * 2,
+        'instantaneous_speed': 2.5,
+        'strokes_per_minute': 30,
+        'instantaneous_power': 180,
+        'calories_burn_rate': 650,
+        'resistance_level': 0.5
+    } for i in range(count)]
+
+
+def bench(name, func, frames):
+    start = time.perf_counter()
+    for frame in frames:
+        func(frame)
+    elapsed = time.perf_counter() - start
+    print('%-40s %12.0f frames/sec %8.2f us/frame' % (name, len(frames) / elapsed, elapsed / len(frames) * 1e6))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    frames = make_frames(count)
+    my_rower = rower.Rower()
+
+    print('validity check:')
+    bench('  legacy list-scan check', legacy_check_dict_validity, frames)
+    bench('  compiled schema check', my_rower._check_dict_validity, frames)
+
+    print('on_update_data() stages:')
+    bench('  metrics update', metrics.MetricsEngine().update, frames)
+    derived = metrics.MetricsEngine().update(frames[0])
+    bench('  RowerFrame build', lambda frame: rower.RowerFrame(1, 0.0, frame, derived), frames)
+    history = frame_history.FrameHistory(rower.Rower.DEFAULT_HISTORY_CAPACITY, rower.FRAME_FIELD_TYPES)
+    rower_frame = rower.RowerFrame(1, 0.0, frames[0], derived)
+    bench('  history append', lambda frame: history.append(rower_frame), frames)
+
+    print('on_update_data():')
+    bench('  checked', rower.Rower().on_update_data, frames)
+    trusted_rower = rower.Rower()
+    bench('  trusted', lambda frame: trusted_rower.on_update_data(frame, trusted=True), frames)
+    bench('  checked, no history', rower.Rower(history_capacity=0).on_update_data, frames)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Load test of the Rower with a fleet of simulated rowers.
+
+SimulatorFleet steps N simulated rowers on one schedule, each frame through the Rower (check, metrics, history) and
+a FrameExtrapolator reading it back, like the ant+ TX tick does. Reports the frames/sec reached and the ticks behind
+the schedule, for some fleet sizes and rates.
+
+Run from the repository root:
+    python benchmark/simulator_bench.py [seconds]
+
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rower  # noqa: E402
+from frame_extrapolator import FrameExtrapolator  # noqa: E402
+from simulator import Interval, RowingSimulator, SimulatorFleet  # noqa: E402
+
+
+def bench(count, rate, seconds):
+    workout = [Interval(seconds, spm=lambda t: 22 + t % 8, pace=115)]
+    rowers = [rower.Rower() for _ in range(count)]
+    for my_rower in rowers:
+        extrapolator = FrameExtrapolator(my_rower)
+        my_rower.subscribe(lambda frame, extrapolator=extrapolator: extrapolator.get_current_frame())
+    fleet = SimulatorFleet([RowingSimulator(my_rower, workout) for my_rower in rowers], rate=rate)
+
+    start = time.perf_counter()
+    fleet.start()
+    fleet.worker_thread.join()
+    elapsed = time.perf_counter() - start
+
+    ticks = int(seconds * rate)
+    print('%4d rowers %6d Hz %10d frames %12.0f frames/sec %8d ticks late of %d' %
+          (count, rate, fleet.frames, fleet.frames / elapsed, fleet.late, ticks))
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    for count, rate in ((1, 1000), (10, 100), (10, 1000), (100, 100), (100, 1000)):
+        bench(count, rate, seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,24 @@
 """Config const for rowercast"""
 
+import os
+
+# protocol of the rower console: 'fdf', 'waterrower_s4' or 'csafe', see serial_reader.create_reader().
+SERIAL_PROTOCOL = 'fdf'
+# serial port of the head unit, '' to auto detect it, FDF only.
 SERIAL_ADDRESS = ''
+# where the auto detected port is remembered, None to scan on each start.
+SERIAL_PORT_CACHE = os.path.expanduser('~/.rowercast_serial.json')
+
+# frames the Rower keeps for frames_since() and frames_in_last(), 10 minutes of the 1 frame/second head unit, about
+# 120 kB, 0 for no history.
+HISTORY_CAPACITY = 10 * 60
+
+# seconds main waits for the reader and the ant+ threads to stop, on exit or restart.
+SHUTDOWN_TIMEOUT = 5.0
 
 ANT_CONFIG = {
     'ANT_DEVICE_ID': 12345,
-    'TRANSMISSION_TYPE': 'c'
+    'TRANSMISSION_TYPE': 'c',
+    # send the page of a changed field in the next data slot, not only in its own slot of the pattern, opt-in.
+    'ADAPTIVE_PAGES': False
 }
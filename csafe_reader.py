@@ -0,0 +1,191 @@
+"""Serial reader for the Concept2 performance monitors, and the other CSAFE consoles
+
+CSAFE frames:
+    0xF1, the contents, an XOR checksum of the contents, 0xF2.
+    The bytes 0xF0 to 0xF3 in the contents and the checksum are stuffed: 0xF3, then the byte & 0x03.
+A request holds commands, one after the other, a short command is one byte, 0x80 to 0xFF, with no data. The response
+holds a status byte, then for each command: the command byte, the number of data bytes, the data, little endian.
+
+The console is polled, the short get commands due in a poll round go in one frame, one round trip for all of them.
+The PM limits a frame to MAX_FRAME_SIZE bytes, the reply of each command takes 2 bytes, plus its data.
+
+"""
+
+import serial
+
+from serial_reader import PolledSerialReader, register_reader
+
+FRAME_START = 0xF1
+FRAME_STOP = 0xF2
+STUFF_FLAG = 0xF3
+# the bytes stuffed in the contents: the extended start, the start, the stop and the stuff flag.
+_STUFFED = frozenset((0xF0, 0xF1, 0xF2, 0xF3))
+
+# largest frame the PM takes or sends, with its framing.
+MAX_FRAME_SIZE = 120
+
+
+class CSAFEFrameError(Exception):
+    pass
+
+
+class CSAFECommand:
+    """A short CSAFE get command, its data size in the reply, and decode(data) -> {field: value}."""
+
+    __slots__ = ('name', 'code', 'data_size', 'decode')
+
+    def __init__(self, name, code, data_size, decode):
+        self.name = name
+        self.code = code
+        self.data_size = data_size
+        self.decode = decode
+
+
+def _unsigned(data, size=2):
+    return int.from_bytes(data[:size], 'little')
+
+
+def _decode_work_time(data):
+    hours, minutes, seconds = data[0], data[1], data[2]
+    return {'total_elapsed_time': (hours * 60 + minutes) * 60 + seconds}
+
+
+# distance units: meter, and kilometer, the meters on the PM.
+_DISTANCE_UNITS = {0x24: 1, 0x21: 1000}
+
+
+def _decode_horizontal(data):
+    return {'total_distance_traveled': _unsigned(data) * _DISTANCE_UNITS.get(data[2], 1)}
+
+
+def _decode_pace(data):
+    # seconds per km, 0 when not rowing.
+    pace = _unsigned(data)
+    return {'instantaneous_speed': 1000 / pace if pace else 0.0}
+
+
+GET_TWORK = CSAFECommand('work_time', 0xA0, 3, _decode_work_time)
+GET_HORIZONTAL = CSAFECommand('horizontal', 0xA1, 3, _decode_horizontal)
+GET_PACE = CSAFECommand('pace', 0xA6, 3, _decode_pace)
+GET_CADENCE = CSAFECommand('cadence', 0xA7, 3, lambda data: {'strokes_per_minute': _unsigned(data)})
+GET_POWER = CSAFECommand('power', 0xB4, 3, lambda data: {'instantaneous_power': _unsigned(data)})
+
+CSAFE_COMMANDS = {command.code: command for command in
+                  (GET_TWORK, GET_HORIZONTAL, GET_PACE, GET_CADENCE, GET_POWER)}
+
+
+def csafe_frame(contents):
+    """Build the standard frame of the contents bytes, with its checksum and the byte stuffing."""
+    checksum = 0
+    for byte in contents:
+        checksum ^= byte
+    frame = bytearray([FRAME_START])
+    for byte in bytes(contents) + bytes([checksum]):
+        if byte in _STUFFED:
+            frame += bytes([STUFF_FLAG, byte & 0x03])
+        else:
+            frame.append(byte)
+    frame.append(FRAME_STOP)
+    return bytes(frame)
+
+
+def csafe_unframe(frame):
+    """Return the contents of a standard frame, raise CSAFEFrameError if it's cut or its checksum is wrong."""
+    if len(frame) < 3 or frame[0] != FRAME_START or frame[-1] != FRAME_STOP:
+        raise CSAFEFrameError("Not a CSAFE frame: %r" % (bytes(frame),))
+    contents = bytearray()
+    stuffed = False
+    for byte in frame[1:-1]:
+        if stuffed:
+            contents.append(0xF0 | byte)
+            stuffed = False
+        elif byte == STUFF_FLAG:
+            stuffed = True
+        else:
+            contents.append(byte)
+    if stuffed or not contents:
+        raise CSAFEFrameError("Cut CSAFE frame: %r" % (bytes(frame),))
+    checksum = 0
+    for byte in contents:
+        checksum ^= byte
+    if checksum:
+        raise CSAFEFrameError("Bad CSAFE checksum: %r" % (bytes(frame),))
+    return bytes(contents[:-1])
+
+
+def decode_csafe_response(contents):
+    """Decode the contents of a response, return (status, {command code: data bytes})."""
+    if not contents:
+        raise CSAFEFrameError("Empty CSAFE response")
+    status = contents[0]
+    replies = {}
+    offset = 1
+    while offset + 2 <= len(contents):
+        code, size = contents[offset], contents[offset + 1]
+        data = contents[offset + 2:offset + 2 + size]
+        if len(data) != size:
+            raise CSAFEFrameError("Cut CSAFE response: %r" % (bytes(contents),))
+        replies[code] = data
+        offset += 2 + size
+    return status, replies
+
+
+@register_reader('csafe')
+class CSAFEReader(PolledSerialReader):
+    """Serial reader for the CSAFE consoles, the Concept2 PM3 to PM5, polled, see the module doc."""
+
+    # (command, every n rounds): time, distance and pace each round, stroke rate and power every other round.
+    queries = (
+        (GET_TWORK, 1),
+        (GET_HORIZONTAL, 1),
+        (GET_PACE, 1),
+        (GET_CADENCE, 2),
+        (GET_POWER, 2),
+    )
+    # the reply is the larger frame, the start, status, checksum and stop bytes, and 2 + data bytes per command.
+    max_batch_size = MAX_FRAME_SIZE - 4
+
+    BAUD_RATE = 9600
+
+    def _query_size(self, command):
+        return 2 + command.data_size
+
+    def _open_port(self, timeout=1):
+        return serial.Serial(self.serial_device_address, baudrate=self.BAUD_RATE, timeout=timeout)
+
+    def _connect(self, ser):
+        # no session to open, the console answers the get commands at any time.
+        pass
+
+    def _encode_queries(self, batch):
+        return csafe_frame(bytes(command.code for command in batch))
+
+    def _read_reply(self, ser, batch):
+        """Read up to the end of the response frame, the bytes before its start are dropped."""
+        buffer = bytearray()
+        deadline = self.clock() + self.REPLY_TIMEOUT
+        while self.clock() < deadline:
+            data = self._read_before(ser, deadline)
+            if not data:
+                continue
+            buffer += data
+            start = buffer.find(bytes([FRAME_START]))
+            if start < 0:
+                buffer.clear()
+                continue
+            stop = buffer.find(bytes([FRAME_STOP]), start)
+            if stop >= 0:
+                return bytes(buffer[start:stop + 1])
+        return b''
+
+    def _decode_reply(self, reply):
+        try:
+            _, replies = decode_csafe_response(csafe_unframe(reply))
+        except CSAFEFrameError:
+            return {}
+        fields = {}
+        for code, data in replies.items():
+            command = CSAFE_COMMANDS.get(code)
+            if command is not None and len(data) >= command.data_size:
+                fields.update(command.decode(data))
+        return fields
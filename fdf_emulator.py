@@ -0,0 +1,193 @@
+"""FDF head unit emulator, on a pseudo terminal
+
+FDFEmulator opens a pty pair and plays the FDF head unit on it: FDFReader, or rowercast itself, opens the slave end,
+emulator.device, as if it were the USB serial port of the rower, and goes through the real pyserial I/O. For the end
+to end tests and the serial to frame latency and throughput benchmarks, on a box with no rower.
+
+On the master end it answers the commands, a line each:
+    C       connect, replies C1164, and starts the frames.
+    R       reset, the time and distance start over from 0, no reply.
+    V       version, replies the version, V1161016.
+    L<n>    set the resistance level 1 to 4, replies L<n>, L alone replies the current level.
+    H       heart rate, replies H000, no heart rate strap.
+the other lines are ignored.
+
+Once connected it sends the 31-byte data frames, rate a second, on a drift-free schedule. The frame values come from
+source(seconds since the reset), a dict of Rower fields, steady rowing by default, or a RowingSimulator:
+    simulator = RowingSimulator(Rower(), workout)
+    emulator = FDFEmulator(rate=10, source=simulator.advance)
+The resistance level of the frames is the one set by the L command. There's no baud rate, a pty is as fast as it can.
+
+Usage:
+    with FDFEmulator(rate=10) as emulator:
+        reader = FDFReader(my_rower, emulator.device)
+        reader.start()
+        ...
+
+Or from the command line, to run rowercast with SERIAL_ADDRESS set to the device printed:
+    python fdf_emulator.py [frames per second]
+
+"""
+
+import logging
+import os
+import select
+import sys
+import threading
+import time
+import tty
+
+from serial_reader import FDF_LEVELS, encode_fdf_frame
+
+_logger = logging.getLogger("rowercast.fdf_emulator")
+
+VERSION = b'V1161016'
+
+
+def steady_rowing(seconds):
+    """Frame fields of a steady row, 24 spm, 2:00 /500m, 200 watts."""
+    return {
+        'total_elapsed_time': int(seconds),
+        'total_distance_traveled': int(seconds * 500 / 120),
+        'instantaneous_speed': 500 / 120,
+        'strokes_per_minute': 24,
+        'instantaneous_power': 200,
+        'calories_burn_rate': 988
+    }
+
+
+class FDFEmulator:
+    """The FDF head unit on the master end of a pty, the slave end is device.
+
+    :param rate: data frames a second, once connected.
+    :param source: function(seconds since the reset) -> dict of Rower fields, or None for no frame at that time.
+    :param level: resistance level 1 to 4 at start.
+    """
+
+    def __init__(self, rate=1.0, source=steady_rowing, level=1, clock=time.monotonic):
+        self.rate = rate
+        self.source = source
+        self.level = level
+        self.clock = clock
+
+        # the slave end stays open too, the master gets I/O errors when no one has the slave open.
+        self.master, self.slave = os.openpty()
+        # raw slave, no echo of the commands, no line end translation, before the reader sets it up.
+        tty.setraw(self.slave)
+        self.device = os.ttyname(self.slave)
+
+        # the commands received, frames sent, and the ones sent behind the schedule.
+        self.commands = []
+        self.frames = 0
+        self.late = 0
+        self.connected = False
+
+        self._input = bytearray()
+        self._reset_time = None
+        self._schedule_start = None
+        self._sent_on_schedule = 0
+        self._running = False
+        self.worker_thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def start(self):
+        self._running = True
+        self.worker_thread = threading.Thread(target=self._thread_worker, name="rowercast.fdf_emulator",
+                                              daemon=True)
+        self.worker_thread.start()
+
+    def close(self, timeout=1.0):
+        """Stop the thread, close the pty, the reader on the slave end sees the port gone."""
+        self._running = False
+        if self.worker_thread is not None:
+            self.worker_thread.join(timeout)
+        os.close(self.master)
+        os.close(self.slave)
+
+    def _thread_worker(self):
+        while self._running:
+            due = None
+            timeout = 0.1
+            if self.connected:
+                due = self._schedule_start + (self._sent_on_schedule + 1) / self.rate
+                timeout = min(timeout, max(0.0, due - self.clock()))
+            readable, _, _ = select.select([self.master], [], [], timeout)
+            if readable:
+                self._on_input(os.read(self.master, 1024))
+            if due is not None and self.connected and self.clock() >= due:
+                if self.clock() - due > 1 / self.rate:
+                    self.late += 1
+                self._sent_on_schedule += 1
+                self._send_frame()
+
+    def _on_input(self, data):
+        self._input += data
+        while True:
+            end = self._input.find(b'\n')
+            if end < 0:
+                break
+            line = bytes(self._input[:end]).strip()
+            del self._input[:end + 1]
+            if line:
+                self.commands.append(line)
+                self._on_command(line)
+
+    def _on_command(self, line):
+        letter, argument = line[:1], line[1:]
+        if letter == b'C':
+            if not self.connected:
+                self.connected = True
+                self._reset_time = self._schedule_start = self.clock()
+                self._sent_on_schedule = 0
+            self._write(b'C1164')
+        elif letter == b'R':
+            self._reset_time = self.clock()
+        elif letter == b'V':
+            self._write(VERSION)
+        elif letter == b'L':
+            if argument.isdigit() and int(argument) in FDF_LEVELS:
+                self.level = int(argument)
+            self._write(b'L%d' % self.level)
+        elif letter == b'H':
+            self._write(b'H000')
+        else:
+            _logger.debug("Unknown command %r", line)
+
+    def _write(self, line):
+        os.write(self.master, line + b'\r\n')
+
+    def _send_frame(self):
+        fields = self.source(self.clock() - self._reset_time)
+        if fields is None:
+            return
+        speed = fields.get('instantaneous_speed') or 0
+        # no pace 0000 when not moving, the reader skips that frame, like the head unit idle.
+        pace = 500 / speed if speed else 0
+        os.write(self.master, encode_fdf_frame(fields['total_elapsed_time'], fields['total_distance_traveled'],
+                                               min(pace, 99 * 60 + 59),
+                                               spm=fields.get('strokes_per_minute') or 0,
+                                               power=fields.get('instantaneous_power') or 0,
+                                               cal_per_hour=fields.get('calories_burn_rate') or 0,
+                                               level=self.level))
+        self.frames += 1
+
+
+def main():
+    rate = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    with FDFEmulator(rate=rate) as emulator:
+        print('FDF head unit emulated on', emulator.device)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
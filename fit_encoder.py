@@ -0,0 +1,428 @@
+"""Streaming FIT activity file encoder
+
+FitActivityEncoder writes a rowing session as a FIT activity file (the ant.fs File.Identifier.ACTIVITY file type),
+one record message per rower frame, written as the frames arrive, so a 2 hours session is never held in memory.
+
+File layout:
+    header          14 bytes, with the data size and the header CRC
+    file_id         the file type, activity
+    definitions     one per message type, written once at start
+    records         one per frame: timestamp, distance, speed, power, cadence
+    laps            one per interval of the MetricsEngine, written when the next interval starts
+    session         summary of the session, at finish
+    activity        at finish
+    CRC             2 bytes, over the header and the data
+
+Each message layout is compiled once into a struct.Struct, so writing a record is a single pack() call. The CRC is
+updated with each write, at finish the header is patched with the final data size, and the CRC of the new header is
+combined with the running CRC of the data, in O(log n) with no second pass over the file.
+
+Usage:
+    encoder = FitActivityEncoder('session.fit')
+    encoder.start(my_rower)
+    ...
+    encoder.finish()
+
+"""
+
+import struct
+import threading
+import time
+
+from ant.fs.file import File
+
+# FIT timestamps are seconds since 1989-12-31 00:00:00 UTC.
+FIT_EPOCH = 631065600
+
+PROTOCOL_VERSION = 0x20
+PROFILE_VERSION = 2132
+
+# FIT enum values used in the messages.
+MANUFACTURER_DEVELOPMENT = 255
+SPORT_ROWING = 15
+SUB_SPORT_INDOOR_ROWING = 14
+EVENT_SESSION = 8
+EVENT_LAP = 9
+EVENT_ACTIVITY = 26
+EVENT_TYPE_STOP = 1
+ACTIVITY_TYPE_MANUAL = 0
+
+# base type name: (FIT base type number, struct format, invalid value)
+_BASE_TYPES = {
+    'enum': (0x00, 'B', 0xFF),
+    'uint8': (0x02, 'B', 0xFF),
+    'uint16': (0x84, 'H', 0xFFFF),
+    'uint32': (0x86, 'I', 0xFFFFFFFF),
+    'uint32z': (0x8C, 'I', 0),
+}
+
+_FILE_HEADER = struct.Struct('<BBHI4s')
+_FILE_HEADER_SIZE = _FILE_HEADER.size + 2
+_DEFINITION_HEADER = struct.Struct('<BBBHB')
+_FIELD_DEFINITION = struct.Struct('<BBB')
+_CRC = struct.Struct('<H')
+
+
+def _make_crc_table():
+    # CRC-16 of the FIT protocol, reflected polynomial 0xA001, initial value 0.
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+
+_CRC_TABLE = _make_crc_table()
+
+
+def fit_crc(data, crc=0):
+    """FIT CRC of data, continued from crc."""
+    table = _CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def _apply(operator, value):
+    # operator is a GF(2) 16x16 matrix, as the image of each bit.
+    result = 0
+    bit = 0
+    while value:
+        if value & 1:
+            result ^= operator[bit]
+        value >>= 1
+        bit += 1
+    return result
+
+
+# the CRC over one zero byte, as a matrix, the CRC is linear with an initial value of 0.
+_ZERO_BYTE_OPERATOR = tuple(fit_crc(b'\0', 1 << bit) for bit in range(16))
+
+
+def crc_combine(crc_a, crc_b, length_b):
+    """CRC of a + b, from the CRC of a, the CRC of b and the length of b.
+
+    crc_a is shifted over length_b zero bytes by squaring the zero byte operator, O(log length_b).
+    """
+    operator = _ZERO_BYTE_OPERATOR
+    while length_b:
+        if length_b & 1:
+            crc_a = _apply(operator, crc_a)
+        length_b >>= 1
+        if length_b:
+            operator = tuple(_apply(operator, column) for column in operator)
+    return crc_a ^ crc_b
+
+
+class FitMessage:
+    """A FIT message type, compiled for one local message type.
+
+    :param local_type: local message number, 0-15.
+    :param global_number: FIT global message number.
+    :param fields: sequence of (name, field number, base type name, scale), the value written is round(value * scale).
+    """
+
+    def __init__(self, local_type, global_number, fields):
+        self.local_type = local_type
+        self.global_number = global_number
+        self.names = tuple(name for name, _, _, _ in fields)
+        self._scales = tuple(scale for _, _, _, scale in fields)
+        self._invalid = tuple(_BASE_TYPES[base_type][2] for _, _, base_type, _ in fields)
+        # record header byte then the fields.
+        self._struct = struct.Struct('<B' + ''.join(_BASE_TYPES[base_type][1] for _, _, base_type, _ in fields))
+        self._limits = tuple(1 << (8 * struct.calcsize(_BASE_TYPES[base_type][1])) for _, _, base_type, _ in fields)
+
+        definition = bytearray(_DEFINITION_HEADER.pack(0x40 | local_type, 0, 0, global_number, len(fields)))
+        for _, number, base_type, _ in fields:
+            definition += _FIELD_DEFINITION.pack(number, struct.calcsize(_BASE_TYPES[base_type][1]),
+                                                 _BASE_TYPES[base_type][0])
+        self.definition = bytes(definition)
+
+    def pack(self, values):
+        """Data message bytes of a dict of values, missing, None or out of range values are written as invalid."""
+        packed = []
+        for name, scale, invalid, limit in zip(self.names, self._scales, self._invalid, self._limits):
+            value = values.get(name)
+            if value is not None:
+                value = int(round(value * scale))
+                if not 0 <= value < limit or value == invalid:
+                    value = invalid
+            else:
+                value = invalid
+            packed.append(value)
+        return self._struct.pack(self.local_type, *packed)
+
+
+FILE_ID_MESSAGE = FitMessage(0, 0, (
+    ('type', 0, 'enum', 1),
+    ('manufacturer', 1, 'uint16', 1),
+    ('product', 2, 'uint16', 1),
+    ('serial_number', 3, 'uint32z', 1),
+    ('time_created', 4, 'uint32', 1),
+))
+
+RECORD_MESSAGE = FitMessage(1, 20, (
+    ('timestamp', 253, 'uint32', 1),
+    ('distance', 5, 'uint32', 100),
+    ('speed', 6, 'uint16', 1000),
+    ('power', 7, 'uint16', 1),
+    ('cadence', 4, 'uint8', 1),
+))
+
+LAP_MESSAGE = FitMessage(2, 19, (
+    ('timestamp', 253, 'uint32', 1),
+    ('message_index', 254, 'uint16', 1),
+    ('event', 0, 'enum', 1),
+    ('event_type', 1, 'enum', 1),
+    ('start_time', 2, 'uint32', 1),
+    ('total_elapsed_time', 7, 'uint32', 1000),
+    ('total_timer_time', 8, 'uint32', 1000),
+    ('total_distance', 9, 'uint32', 100),
+    ('avg_speed', 13, 'uint16', 1000),
+    ('max_speed', 14, 'uint16', 1000),
+    ('avg_power', 19, 'uint16', 1),
+    ('max_power', 20, 'uint16', 1),
+    ('max_cadence', 18, 'uint8', 1),
+    ('sport', 25, 'enum', 1),
+    ('sub_sport', 39, 'enum', 1),
+))
+
+SESSION_MESSAGE = FitMessage(3, 18, (
+    ('timestamp', 253, 'uint32', 1),
+    ('message_index', 254, 'uint16', 1),
+    ('event', 0, 'enum', 1),
+    ('event_type', 1, 'enum', 1),
+    ('start_time', 2, 'uint32', 1),
+    ('sport', 5, 'enum', 1),
+    ('sub_sport', 6, 'enum', 1),
+    ('total_elapsed_time', 7, 'uint32', 1000),
+    ('total_timer_time', 8, 'uint32', 1000),
+    ('total_distance', 9, 'uint32', 100),
+    ('avg_speed', 14, 'uint16', 1000),
+    ('max_speed', 15, 'uint16', 1000),
+    ('avg_cadence', 18, 'uint8', 1),
+    ('max_cadence', 19, 'uint8', 1),
+    ('avg_power', 20, 'uint16', 1),
+    ('max_power', 21, 'uint16', 1),
+    ('first_lap_index', 25, 'uint16', 1),
+    ('num_laps', 26, 'uint16', 1),
+))
+
+ACTIVITY_MESSAGE = FitMessage(4, 34, (
+    ('timestamp', 253, 'uint32', 1),
+    ('total_timer_time', 0, 'uint32', 1000),
+    ('num_sessions', 1, 'uint16', 1),
+    ('type', 2, 'enum', 1),
+    ('event', 3, 'enum', 1),
+    ('event_type', 4, 'enum', 1),
+    ('local_timestamp', 5, 'uint32', 1),
+))
+
+
+class _Maximum:
+    """Running maximum of a value, None values ignored."""
+
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = None
+
+    def add(self, value):
+        if value is not None and (self.value is None or value > self.value):
+            self.value = value
+
+
+class FitActivityEncoder:
+    """Write rower frames to a FIT activity file, as they arrive.
+
+    Frames are fed with add_frame(), or by subscribing to a Rower with start(my_rower). A record is a few dozen bytes
+    packed into the buffered file, cheap enough for the data provider thread. Laps follow the interval_number of the
+    frames, the session summary uses the derived metrics of the last frame.
+
+    :param path: FIT file to write.
+    :param product: product number written in the file_id message.
+    :param serial_number: serial number written in the file_id message, None if not known.
+    """
+
+    def __init__(self, path, product=0, serial_number=None):
+        self.path = path
+        self.product = product
+        self.serial_number = serial_number
+
+        self._file = None
+        self._source = None
+        self._lock = threading.Lock()
+        # size and running CRC of the data written after the header.
+        self._data_size = 0
+        self._data_crc = 0
+        # time.time() - time.monotonic(), to get the wall clock time of the frame timestamps.
+        self._clock_offset = None
+
+        self._first_frame = None
+        self._last_frame = None
+        self._max_power = _Maximum()
+        self._max_speed = _Maximum()
+        self._max_cadence = _Maximum()
+        self._lap_count = 0
+        self._lap_first_frame = None
+        self._lap_last_frame = None
+        self._lap_max_power = _Maximum()
+        self._lap_max_speed = _Maximum()
+        self._lap_max_cadence = _Maximum()
+
+    def start(self, source=None):
+        """Create the file, write the header and the definitions, subscribe to source (a Rower) if given."""
+        self._clock_offset = time.time() - time.monotonic()
+        self._file = open(self.path, 'wb')
+        # placeholder, the data size is not known yet, patched at finish.
+        self._file.write(bytes(_FILE_HEADER_SIZE))
+        self._write(FILE_ID_MESSAGE.definition)
+        self._write(FILE_ID_MESSAGE.pack({
+            'type': File.Identifier.ACTIVITY,
+            'manufacturer': MANUFACTURER_DEVELOPMENT,
+            'product': self.product,
+            'serial_number': self.serial_number,
+            'time_created': self._fit_time(time.monotonic()),
+        }))
+        for message in (RECORD_MESSAGE, LAP_MESSAGE, SESSION_MESSAGE, ACTIVITY_MESSAGE):
+            self._write(message.definition)
+
+        if source is not None:
+            self._source = source
+            source.subscribe(self.add_frame)
+
+    def add_frame(self, frame):
+        """Write the record message of a RowerFrame, and the lap message if a new interval started."""
+        with self._lock:
+            if self._file is None:
+                return
+            if self._lap_last_frame is not None and frame.interval_number != self._lap_last_frame.interval_number:
+                self._write_lap()
+
+            self._write(RECORD_MESSAGE.pack({
+                'timestamp': self._fit_time(frame.timestamp),
+                'distance': frame.total_distance_traveled,
+                'speed': frame.instantaneous_speed,
+                'power': frame.instantaneous_power,
+                'cadence': frame.strokes_per_minute,
+            }))
+
+            if self._first_frame is None:
+                self._first_frame = frame
+            if self._lap_first_frame is None:
+                self._lap_first_frame = frame
+            self._last_frame = frame
+            self._lap_last_frame = frame
+            for session_maximum, lap_maximum, value in (
+                    (self._max_power, self._lap_max_power, frame.instantaneous_power),
+                    (self._max_speed, self._lap_max_speed, frame.instantaneous_speed),
+                    (self._max_cadence, self._lap_max_cadence, frame.strokes_per_minute)):
+                session_maximum.add(value)
+                lap_maximum.add(value)
+
+    def finish(self):
+        """Write the last lap, the session and activity messages, patch the header, write the CRC, close the file."""
+        if self._source is not None:
+            self._source.unsubscribe(self.add_frame)
+            self._source = None
+
+        with self._lock:
+            if self._file is None:
+                return
+            if self._lap_last_frame is not None:
+                self._write_lap()
+            self._write_summary()
+
+            header = _FILE_HEADER.pack(_FILE_HEADER_SIZE, PROTOCOL_VERSION, PROFILE_VERSION, self._data_size, b'.FIT')
+            header += _CRC.pack(fit_crc(header))
+            self._file.seek(0)
+            self._file.write(header)
+            self._file.seek(0, 2)
+            self._file.write(_CRC.pack(crc_combine(fit_crc(header), self._data_crc, self._data_size)))
+            self._file.close()
+            self._file = None
+
+    # below, the caller holds the lock, or the encoder isn't shared yet.
+
+    def _write(self, data):
+        self._file.write(data)
+        self._data_crc = fit_crc(data, self._data_crc)
+        self._data_size += len(data)
+
+    def _fit_time(self, timestamp):
+        # time.monotonic() timestamp to FIT time.
+        return int(self._clock_offset + timestamp) - FIT_EPOCH
+
+    def _write_lap(self):
+        first = self._lap_first_frame
+        last = self._lap_last_frame
+        elapsed_time = last.interval_elapsed_time
+        distance = last.interval_distance
+        self._write(LAP_MESSAGE.pack({
+            'timestamp': self._fit_time(last.timestamp),
+            'message_index': self._lap_count,
+            'event': EVENT_LAP,
+            'event_type': EVENT_TYPE_STOP,
+            'start_time': self._fit_time(first.timestamp),
+            'total_elapsed_time': elapsed_time,
+            'total_timer_time': elapsed_time,
+            'total_distance': distance,
+            'avg_speed': distance / elapsed_time if elapsed_time else None,
+            'max_speed': self._lap_max_speed.value,
+            'avg_power': last.interval_average_power,
+            'max_power': self._lap_max_power.value,
+            'max_cadence': self._lap_max_cadence.value,
+            'sport': SPORT_ROWING,
+            'sub_sport': SUB_SPORT_INDOOR_ROWING,
+        }))
+        self._lap_count += 1
+        self._lap_first_frame = None
+        self._lap_last_frame = None
+        self._lap_max_power = _Maximum()
+        self._lap_max_speed = _Maximum()
+        self._lap_max_cadence = _Maximum()
+
+    def _write_summary(self):
+        first = self._first_frame
+        last = self._last_frame
+        if last is None:
+            # no frame, an empty activity.
+            end_time = self._fit_time(time.monotonic())
+            self._write(ACTIVITY_MESSAGE.pack({
+                'timestamp': end_time, 'total_timer_time': 0, 'num_sessions': 0, 'type': ACTIVITY_TYPE_MANUAL,
+                'event': EVENT_ACTIVITY, 'event_type': EVENT_TYPE_STOP}))
+            return
+
+        end_time = self._fit_time(last.timestamp)
+        self._write(SESSION_MESSAGE.pack({
+            'timestamp': end_time,
+            'message_index': 0,
+            'event': EVENT_SESSION,
+            'event_type': EVENT_TYPE_STOP,
+            'start_time': self._fit_time(first.timestamp),
+            'sport': SPORT_ROWING,
+            'sub_sport': SUB_SPORT_INDOOR_ROWING,
+            'total_elapsed_time': last.total_elapsed_time,
+            'total_timer_time': last.total_elapsed_time,
+            'total_distance': last.total_distance_traveled,
+            'avg_speed': last.average_speed,
+            'max_speed': self._max_speed.value,
+            'avg_cadence': last.average_strokes_per_minute,
+            'max_cadence': self._max_cadence.value,
+            'avg_power': last.average_power,
+            'max_power': self._max_power.value,
+            'first_lap_index': 0,
+            'num_laps': self._lap_count,
+        }))
+        self._write(ACTIVITY_MESSAGE.pack({
+            'timestamp': end_time,
+            'total_timer_time': last.total_elapsed_time,
+            'num_sessions': 1,
+            'type': ACTIVITY_TYPE_MANUAL,
+            'event': EVENT_ACTIVITY,
+            'event_type': EVENT_TYPE_STOP,
+            # local time, offset from UTC by the time zone of this machine.
+            'local_timestamp': end_time - (time.altzone if time.localtime().tm_isdst > 0 else time.timezone),
+        }))
@@ -0,0 +1,105 @@
+"""Predictive interpolation of rower frames between source updates
+
+The FDF head unit sends about one frame per second, but an ant+ FE channel sends a page 4 times a second, so 3 of
+4 pages would repeat a stale distance and elapsed time, and the display shows stair-step distance.
+
+FrameExtrapolator sits between a Rower and its consumer, it has the same get_current_frame() interface as a Rower.
+Each call projects the total distance and total elapsed time of the newest source frame forward, to now:
+    distance = source distance + instantaneous_speed * (now - source frame timestamp)
+    time = source time + (now - source frame timestamp)
+
+When the next source frame arrives, the projection made until then is a bit off. The error is not applied at once,
+it fades out over correction_time seconds, and while it fades the output doesn't go backwards, so the display moves
+smoothly. The source is always right in the end: once the fade is over, or when the rower stopped, an overshoot is
+taken back, the output is never held above the source for longer than correction_time.
+
+The projection stops after max_horizon seconds without a new source frame (rower stopped, cable out), and when the
+rower is not moving. Large errors (like a head unit reset) are applied at once.
+
+Usage:
+    ant_broadcaster = AntRower(FrameExtrapolator(my_rower), ANT_CONFIG)
+
+"""
+
+import time
+
+
+class _ProjectedValue:
+    """One projected field, with its fading correction."""
+
+    __slots__ = ('snap_error', 'error', 'error_time', 'last_output')
+
+    def __init__(self, snap_error):
+        # errors bigger than this are applied at once, not faded out.
+        self.snap_error = snap_error
+        self.error = 0.0
+        self.error_time = 0.0
+        self.last_output = None
+
+    def on_new_source(self, target, now):
+        """A new source frame arrived, target is the new projection, now."""
+        if self.last_output is None:
+            self.error = 0.0
+            return
+        error = self.last_output - target
+        if abs(error) > self.snap_error:
+            # way off, like a reset of the head unit, no smoothing.
+            self.error = 0.0
+            self.last_output = None
+        else:
+            self.error = error
+            self.error_time = now
+
+    def output(self, target, now, correction_time, moving):
+        remaining = 1.0 - (now - self.error_time) / correction_time
+        if remaining > 0:
+            value = target + self.error * remaining
+            # while moving, don't go backwards during the fade, a display should count up.
+            # stopped, the overshoot fades back down to the source value instead of being held.
+            if moving and self.last_output is not None and value < self.last_output:
+                value = self.last_output
+        else:
+            # fade over, the source value, even if it is below the last output.
+            value = target
+        self.last_output = value
+        return value
+
+
+class FrameExtrapolator:
+    """Project the frames of a source Rower forward in time, between the source updates.
+
+    :param source: the Rower (or anything with get_current_frame() returning a RowerFrame).
+    :param max_horizon: seconds to project at most after a source frame.
+    :param correction_time: seconds to fade out the projection error when a new source frame arrives.
+    :param clock: monotonic clock, same time base as the frame timestamps.
+    """
+
+    def __init__(self, source, max_horizon=2.0, correction_time=1.0, clock=time.monotonic):
+        self.source = source
+        self.max_horizon = max_horizon
+        self.correction_time = correction_time
+        self.clock = clock
+
+        self._source_seq = None
+        self._distance = _ProjectedValue(snap_error=20)
+        self._elapsed_time = _ProjectedValue(snap_error=5)
+
+    def get_current_frame(self):
+        frame = self.source.get_current_frame()
+        now = self.clock()
+
+        # not moving, the head unit clock stands still too, nothing to project.
+        speed = frame.instantaneous_speed or 0
+        moving = speed > 0
+        ahead = min(max(now - frame.timestamp, 0.0), self.max_horizon) if moving else 0.0
+        distance_target = frame.total_distance_traveled + speed * ahead
+        time_target = frame.total_elapsed_time + ahead
+
+        if frame.seq != self._source_seq:
+            self._source_seq = frame.seq
+            self._distance.on_new_source(distance_target, now)
+            self._elapsed_time.on_new_source(time_target, now)
+
+        return frame.replace(
+            total_distance_traveled=self._distance.output(distance_target, now, self.correction_time, moving),
+            total_elapsed_time=self._elapsed_time.output(time_target, now, self.correction_time, moving))
@@ -0,0 +1,145 @@
+"""Fixed-memory history of rower frames
+
+FrameHistory keeps the last N frames of a Rower in a preallocated ring buffer, stored by columns: one typed
+array.array per field, plus the seq and timestamp of each frame. The memory is allocated once at start, so it stays
+flat however long the session is, the oldest frames are overwritten when it's full.
+
+Queries return the columns, as array copies in time order, ready for windowed stats:
+    history.columns_since_seq(seq)  # frames with seq > given seq
+    history.last(60)                # frames of the last 60 seconds, up to now
+
+Missing values (a field the data source didn't provide) are stored as -1 in integer columns and NaN in float
+columns, all the rower fields are non-negative, so these never collide with a real value.
+
+"""
+
+import array
+import math
+import threading
+import time
+
+# what a missing value is stored as, per column typecode.
+MISSING_VALUES = {
+    'q': -1,
+    'd': math.nan,
+}
+
+
+class FrameHistory:
+    """Columnar ring buffer of frames.
+
+    :param capacity: number of frames to keep.
+    :param fields: sequence of (field_name, typecode), typecode is 'q' for integer fields, 'd' for float fields.
+    """
+
+    def __init__(self, capacity, fields):
+        assert capacity > 0
+        self.capacity = capacity
+        self.field_names = tuple(name for name, _ in fields)
+
+        # preallocate all the columns, no allocation on append.
+        self._seq = array.array('q', [-1]) * capacity
+        self._timestamp = array.array('d', [0.0]) * capacity
+        self._columns = {}
+        for name, typecode in fields:
+            self._columns[name] = array.array(typecode, [MISSING_VALUES[typecode]]) * capacity
+        # (column, missing value, type) in field order, for the append loop.
+        # integer fields may come as float with no fraction part, an integer column only takes int.
+        self._column_list = tuple((self._columns[name], MISSING_VALUES[typecode], int if typecode == 'q' else float)
+                                  for name, typecode in fields)
+
+        # index to write the next frame at, and how many frames are stored.
+        self._head = 0
+        self._count = 0
+        # appends come from the data provider thread, queries from the consumers.
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, frame):
+        """Store a frame, it should have .seq, .timestamp, and an attribute for each field (None if missing)."""
+        with self._lock:
+            head = self._head
+            self._seq[head] = frame.seq
+            self._timestamp[head] = frame.timestamp
+            for name, (column, missing, value_type) in zip(self.field_names, self._column_list):
+                value = getattr(frame, name)
+                column[head] = missing if value is None else value_type(value)
+
+            self._head = (head + 1) % self.capacity
+            if self._count < self.capacity:
+                self._count += 1
+
+    def clear(self):
+        with self._lock:
+            self._head = 0
+            self._count = 0
+
+    def first_seq(self):
+        """seq of the oldest stored frame, None if empty."""
+        with self._lock:
+            if self._count == 0:
+                return None
+            return self._seq[self._physical_index(0)]
+
+    def last_seq(self):
+        """seq of the newest stored frame, None if empty."""
+        with self._lock:
+            if self._count == 0:
+                return None
+            return self._seq[self._physical_index(self._count - 1)]
+
+    def columns_since_seq(self, seq):
+        """Columns of the frames with seq greater than the given seq."""
+        with self._lock:
+            start = self._bisect(self._seq, seq)
+            return self._slice(start)
+
+    def columns_since_time(self, timestamp):
+        """Columns of the frames with timestamp greater than the given time.monotonic() timestamp."""
+        with self._lock:
+            start = self._bisect(self._timestamp, timestamp)
+            return self._slice(start)
+
+    def last(self, seconds, now=None):
+        """Columns of the frames in the last N seconds, counted back from now, time.monotonic() if not given.
+
+        Counted from the clock, not from the newest frame, so nothing is returned once the data source went quiet.
+        """
+        if now is None:
+            now = time.monotonic()
+        return self.columns_since_time(now - seconds)
+
+    # below, the caller holds the lock.
+
+    def _physical_index(self, logical_index):
+        # logical index 0 is the oldest frame.
+        return (self._head - self._count + logical_index) % self.capacity
+
+    def _bisect(self, column, value):
+        """Logical index of the first frame whose column value is greater than value, the column is ascending."""
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if column[self._physical_index(middle)] <= value:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _slice(self, start):
+        """Copy the columns from logical index start to the newest frame, in time order."""
+        result = {'seq': self._copy(self._seq, start), 'timestamp': self._copy(self._timestamp, start)}
+        for name in self.field_names:
+            result[name] = self._copy(self._columns[name], start)
+        return result
+
+    def _copy(self, column, start):
+        count = self._count - start
+        begin = self._physical_index(start)
+        end = begin + count
+        if end <= self.capacity:
+            return column[begin:end]
+        # wrapped around the end of the buffer.
+        return column[begin:] + column[:end - self.capacity]
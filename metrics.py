@@ -0,0 +1,294 @@
+"""Derived rower metrics, updated incrementally
+
+The MetricsEngine is fed with each frame the Rower accepts, and keeps running sums of the session, so each update is
+O(1), no matter how long the session is. Its results are published as extra fields of the RowerFrame, so consumers
+(ant+ pages, web app) read them like any other field, without scanning the history.
+
+Derived fields:
+    'average_speed':                # session average speed, in meter/second, float
+    'average_pace':                 # session average pace, in seconds per 500m, float
+    'average_power':                # time weighted average power, in watts, float
+    'average_strokes_per_minute':   # time weighted average spm, float
+    'split_pace':                   # pace of the current 500m split, in seconds per 500m, float
+    'interval_number':              # 1 for the first interval, increased on each new interval, int
+    'interval_elapsed_time':        # time of the current interval, in seconds, int
+    'interval_distance':            # distance of the current interval, in meter, int
+    'interval_average_power':       # time weighted average power of the current interval, in watts, float
+
+    'best_500m_time':               # fastest 500m of the session, in seconds, float
+    'best_1000m_time':              # fastest 1000m of the session, in seconds, float
+    'best_2000m_time':              # fastest 2000m of the session, in seconds, float
+    'best_10s_power':               # best 10 seconds average power of the session, in watts, float
+    'best_60s_power':               # best 60 seconds average power of the session, in watts, float
+    'best_300s_power':              # best 5 minutes average power of the session, in watts, float
+
+A field is None when it can't be calculated yet, like the pace before any distance is rowed.
+
+A new interval starts when start_new_interval() is called, or when the totals of the data source go backwards,
+which is the head unit being reset.
+
+"""
+
+import collections
+
+# length of a split, in meter.
+SPLIT_DISTANCE = 500
+
+# best efforts tracked in a session, distance in meter, power duration in seconds.
+BEST_EFFORT_DISTANCES = (500, 1000, 2000)
+BEST_EFFORT_POWER_DURATIONS = (10, 60, 300)
+
+
+class _TimeWeightedMean:
+    """Mean of a value weighted by the time it lasted, with a running sum."""
+
+    __slots__ = ('weighted_sum', 'total_time')
+
+    def __init__(self):
+        self.weighted_sum = 0.0
+        self.total_time = 0.0
+
+    def add(self, value, duration):
+        self.weighted_sum += value * duration
+        self.total_time += duration
+
+    def mean(self):
+        if self.total_time <= 0:
+            return None
+        return self.weighted_sum / self.total_time
+
+
+class _BestDistanceTime:
+    """Fastest time to row a given distance, over a sliding window of (time, distance) samples.
+
+    The samples are kept in a deque, ascending in both time and distance. The fastest piece ending at the newest
+    sample starts at the latest sample which still leaves the full distance to it, the samples before that one can
+    never start a faster piece, as the distance only grows, so they are dropped from the front. Each sample is
+    pushed and popped once, O(1) per update no matter how long the session is.
+
+    """
+
+    __slots__ = ('distance', 'best', '_samples')
+
+    def __init__(self, distance):
+        self.distance = distance
+        self.best = None
+        self._samples = collections.deque()
+
+    def add(self, elapsed_time, distance):
+        samples = self._samples
+        samples.append((elapsed_time, distance))
+        # drop the front sample while the next one is far enough from the newest as well.
+        target = distance - self.distance
+        while len(samples) >= 2 and samples[1][1] <= target:
+            samples.popleft()
+
+        start_time, start_distance = samples[0]
+        if start_distance > target:
+            # not rowed the full distance yet.
+            return
+        # the piece starts between the front two samples, interpolate the time at the exact start distance.
+        if len(samples) >= 2:
+            next_time, next_distance = samples[1]
+            if next_distance > start_distance:
+                start_time += (next_time - start_time) * (target - start_distance) / (next_distance - start_distance)
+        effort = elapsed_time - start_time
+        if self.best is None or effort < self.best:
+            self.best = effort
+
+
+class _BestAveragePower:
+    """Best average power over a given duration, over a sliding window of (duration, power) samples.
+
+    Each sample is the power held for its duration. The deque keeps the samples of the last window, in time order,
+    with their running weighted sum, old samples are dropped from the front once the window is still full without
+    them. The first sample of the window may be only partly inside, the weighted sum is corrected for that part.
+
+    """
+
+    __slots__ = ('duration', 'best', '_samples', '_weighted_sum', '_total_time')
+
+    def __init__(self, duration):
+        self.duration = duration
+        self.best = None
+        self._samples = collections.deque()
+        self._weighted_sum = 0.0
+        self._total_time = 0.0
+
+    def add(self, power, duration):
+        samples = self._samples
+        samples.append((duration, power))
+        self._weighted_sum += power * duration
+        self._total_time += duration
+
+        while self._total_time - samples[0][0] >= self.duration:
+            front_duration, front_power = samples.popleft()
+            self._weighted_sum -= front_power * front_duration
+            self._total_time -= front_duration
+
+        if self._total_time < self.duration:
+            # not rowed the full duration yet.
+            return
+        front_duration, front_power = samples[0]
+        window_sum = self._weighted_sum - front_power * (self._total_time - self.duration)
+        average = window_sum / self.duration
+        if self.best is None or average > self.best:
+            self.best = average
+
+
+class BestEffortTracker:
+    """Best efforts of a session: fastest 500m / 1000m / 2000m, best 10s / 60s / 5min average power.
+
+    Updated per frame with sliding windows, O(1) amortized per update, no rescan of the session.
+    """
+
+    field_names = (tuple('best_%dm_time' % distance for distance in BEST_EFFORT_DISTANCES)
+                   + tuple('best_%ds_power' % duration for duration in BEST_EFFORT_POWER_DURATIONS))
+
+    def __init__(self, distances=BEST_EFFORT_DISTANCES, power_durations=BEST_EFFORT_POWER_DURATIONS):
+        self._distance_times = [_BestDistanceTime(distance) for distance in distances]
+        self._average_powers = [_BestAveragePower(duration) for duration in power_durations]
+
+    def add(self, elapsed_time, distance, power, duration):
+        """Add a frame.
+
+        :param elapsed_time: total elapsed time, in seconds.
+        :param distance: total distance, in meter.
+        :param power: power in watts, held since the last frame, None if not available.
+        :param duration: seconds since the last frame, 0 for the first frame.
+        """
+        for tracker in self._distance_times:
+            tracker.add(elapsed_time, distance)
+        if power is not None and duration > 0:
+            for tracker in self._average_powers:
+                tracker.add(power, duration)
+
+    def results(self) -> dict:
+        result = {}
+        for tracker in self._distance_times:
+            result['best_%dm_time' % tracker.distance] = tracker.best
+        for tracker in self._average_powers:
+            result['best_%ds_power' % tracker.duration] = tracker.best
+        return result
+
+
+class MetricsEngine:
+    """Incremental derived-metrics of a rower session.
+
+    Call update() with each new frame fields (dict or RowerFrame), it returns a dict of the derived fields.
+    """
+
+    # (field name, history column typecode) of the derived fields.
+    fields = (
+        ('average_speed', 'd'),
+        ('average_pace', 'd'),
+        ('average_power', 'd'),
+        ('average_strokes_per_minute', 'd'),
+        ('split_pace', 'd'),
+        ('interval_number', 'q'),
+        ('interval_elapsed_time', 'q'),
+        ('interval_distance', 'q'),
+        ('interval_average_power', 'd'),
+    ) + tuple((name, 'd') for name in BestEffortTracker.field_names)
+    field_names = tuple(name for name, _ in fields)
+
+    def __init__(self):
+        self.interval_number = 0
+        self._last_time = None
+        self._last_distance = None
+        self._reset_session()
+
+    def _reset_session(self):
+        self._power = _TimeWeightedMean()
+        self._spm = _TimeWeightedMean()
+        self._split_index = None
+        self._best_efforts = BestEffortTracker()
+        self._new_interval_pending = True
+
+    def start_new_interval(self):
+        """Start a new interval at the next frame, the session averages go on."""
+        self._new_interval_pending = True
+
+    def _start_interval(self, elapsed_time, distance):
+        self.interval_number += 1
+        self._interval_start_time = elapsed_time
+        self._interval_start_distance = distance
+        self._interval_power = _TimeWeightedMean()
+        self._new_interval_pending = False
+
+    def update(self, fields) -> dict:
+        elapsed_time = fields['total_elapsed_time']
+        distance = fields['total_distance_traveled']
+        power = fields.get('instantaneous_power')
+        spm = fields.get('strokes_per_minute')
+
+        if self._last_time is not None and (elapsed_time < self._last_time or distance < self._last_distance):
+            # totals went backwards, the head unit is reset, new session.
+            self._last_time = None
+            self._reset_session()
+
+        # weight the current values by the time since the last frame.
+        # the time before the first frame of an interval belongs to the interval before.
+        duration = 0
+        if self._last_time is not None:
+            duration = elapsed_time - self._last_time
+            if duration > 0:
+                if power is not None:
+                    self._power.add(power, duration)
+                    if not self._new_interval_pending:
+                        self._interval_power.add(power, duration)
+                if spm is not None:
+                    self._spm.add(spm, duration)
+
+        self._best_efforts.add(elapsed_time, distance, power, duration)
+
+        if self._new_interval_pending:
+            self._start_interval(elapsed_time, distance)
+
+        # the current split starts at the last multiple of the split distance, pace over the part rowed so far.
+        self._update_split(elapsed_time, distance)
+        split_distance = distance - self._split_start_distance
+        if split_distance > 0:
+            split_pace = SPLIT_DISTANCE * (elapsed_time - self._split_start_time) / split_distance
+        else:
+            split_pace = None
+
+        self._last_time = elapsed_time
+        self._last_distance = distance
+
+        if elapsed_time > 0 and distance > 0:
+            average_speed = distance / elapsed_time
+            average_pace = SPLIT_DISTANCE * elapsed_time / distance
+        else:
+            average_speed = None
+            average_pace = None
+
+        result = {
+            'average_speed': average_speed,
+            'average_pace': average_pace,
+            'average_power': self._power.mean(),
+            'average_strokes_per_minute': self._spm.mean(),
+            'split_pace': split_pace,
+            'interval_number': self.interval_number,
+            'interval_elapsed_time': int(elapsed_time - self._interval_start_time),
+            'interval_distance': int(distance - self._interval_start_distance),
+            'interval_average_power': self._interval_power.mean(),
+        }
+        result.update(self._best_efforts.results())
+        return result
+
+    def _update_split(self, elapsed_time, distance):
+        split_index = distance // SPLIT_DISTANCE
+        if split_index == self._split_index:
+            return
+        if self._split_index is None:
+            # first frame of the session, the split starts here.
+            self._split_start_time = elapsed_time
+            self._split_start_distance = distance
+        else:
+            # crossed into a new split, it starts at the boundary, time interpolated between the last two frames.
+            boundary = split_index * SPLIT_DISTANCE
+            self._split_start_time = (self._last_time + (elapsed_time - self._last_time)
+                                      * (boundary - self._last_distance) / (distance - self._last_distance))
+            self._split_start_distance = boundary
+        self._split_index = split_index
@@ -0,0 +1,153 @@
+"""One thread serving the serial readers of many rowers
+
+A BaseSerialReader started on its own runs a thread per rower, blocked in a read with a 1 second timeout. For a room
+of rowers on USB hubs, SerialReaderService serves all their serial ports from a single thread: the ports are opened
+non-blocking and registered to a selector (epoll on Linux), the thread sleeps until one of them has bytes to read,
+then the reader of that port frames, parses them and updates its own Rower. No timeout polling per port.
+
+The readers should read without blocking on a non-blocking port, and keep the partial lines for the next read, like
+the FDFReader with its LineFramer. Serial ports are selectable on POSIX systems only.
+
+Usage:
+    service = SerialReaderService()
+    service.add(FDFReader(rower_1, '/dev/ttyUSB0'))
+    service.add(FDFReader(rower_2, '/dev/ttyUSB1'))
+    service.start()
+    ...
+    service.close()
+
+"""
+
+import collections
+import logging
+import selectors
+import socket
+import threading
+
+import serial
+
+_logger = logging.getLogger("rowercast.reader_service")
+
+
+class SerialReaderService:
+    """Read the serial ports of many readers from one thread, multiplexed with a selector."""
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        # to wake the thread up from select(), when readers are added or removed, or on close.
+        self._wakeup_receiver, self._wakeup_sender = socket.socketpair()
+        self._wakeup_receiver.setblocking(False)
+        self._selector.register(self._wakeup_receiver, selectors.EVENT_READ, None)
+
+        # readers to add / remove, applied by the service thread, the selector is only touched by that thread.
+        self._changes = collections.deque()
+        self._lock = threading.Lock()
+        # reader: open serial port, of the readers being served, and the file descriptor it's registered with.
+        self.ports = {}
+        self._fds = {}
+        self._running = False
+        self.worker_thread = None
+
+    def add(self, reader):
+        """Open the port of the reader, send its connect commands, and serve it, from any thread.
+
+        The port open error (no such device, busy) is raised here, to the caller.
+        """
+        ser = reader._open_port(timeout=0)
+        reader._connect(ser)
+        self._change('add', reader, ser)
+
+    def remove(self, reader):
+        """Stop serving the reader and close its port, from any thread."""
+        self._change('remove', reader, None)
+
+    def start(self):
+        self._running = True
+        self.worker_thread = threading.Thread(target=self._thread_worker, name="rowercast.reader_service",
+                                              daemon=True)
+        self.worker_thread.start()
+
+    def close(self, timeout=None):
+        """Stop the thread, close all the ports, return True if the thread is stopped.
+
+        The ports and the selector are only touched by the thread while it runs, if it's still alive after timeout,
+        they are left open.
+        """
+        self._running = False
+        self._wakeup()
+        if self.worker_thread is not None:
+            self.worker_thread.join(timeout)
+            if self.worker_thread.is_alive():
+                _logger.warning("Reader service thread still running after %s seconds, ports left open", timeout)
+                return False
+        # the changes not applied by the thread, the ports are closed as well.
+        self._apply_changes()
+        for reader in list(self.ports):
+            self._drop(reader)
+        self._selector.close()
+        self._wakeup_receiver.close()
+        self._wakeup_sender.close()
+        return True
+
+    def _change(self, action, reader, ser):
+        with self._lock:
+            self._changes.append((action, reader, ser))
+        self._wakeup()
+
+    def _wakeup(self):
+        try:
+            self._wakeup_sender.send(b'\0')
+        except OSError:
+            # closed, or the socket buffer is full of wake ups already.
+            pass
+
+    def _thread_worker(self):
+        while self._running:
+            for key, _ in self._selector.select():
+                if key.data is None:
+                    self._drain_wakeup()
+                    self._apply_changes()
+                    continue
+                reader, ser = key.data
+                try:
+                    reader._handle_messages(reader._read_messages(ser))
+                except (serial.SerialException, OSError):
+                    # unplugged, the port is gone, the other rowers go on.
+                    _logger.exception("Serial port %s failed, removed from the service",
+                                      reader.serial_device_address)
+                    self._drop(reader)
+                except Exception:
+                    # a bad frame of one rower should not stop the others.
+                    _logger.exception("Serial reader of %s failed on a message", reader.serial_device_address)
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_receiver.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _apply_changes(self):
+        while True:
+            with self._lock:
+                if not self._changes:
+                    return
+                action, reader, ser = self._changes.popleft()
+            if action == 'add':
+                if reader in self.ports:
+                    ser.close()
+                    continue
+                self.ports[reader] = ser
+                self._fds[reader] = ser.fileno()
+                self._selector.register(self._fds[reader], selectors.EVENT_READ, (reader, ser))
+            else:
+                self._drop(reader)
+
+    def _drop(self, reader):
+        ser = self.ports.pop(reader, None)
+        if ser is None:
+            return
+        self._selector.unregister(self._fds.pop(reader))
+        ser.close()
+        # the link state of the reader, the commands waiting for a reply fail.
+        reader._disconnect()
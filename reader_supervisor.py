@@ -0,0 +1,129 @@
+"""Self-healing serial reader
+
+A serial reader started on its own dies with its thread when the USB-serial cable blips: the read raises out of the
+serial port block, and the Rower keeps the last frame forever. ReaderSupervisor runs the read loop of a reader
+instead, and when the port fails it reopens it, waiting with an exponential backoff between the tries, replays the
+connect sequence of the reader, and goes on, no process restart.
+
+The outages are logged, and counted in the supervisor: connected, outages, last_downtime, total_downtime.
+
+With discover, a function returning the device, the port is looked for before each open, a head unit switched off
+at start, or moved to another device name, is retried with the same backoff:
+    supervisor = ReaderSupervisor(FDFReader(my_rower, ''), discover=lambda: find_fdf_port(SERIAL_PORT_CACHE))
+
+Usage:
+    supervisor = ReaderSupervisor(FDFReader(my_rower, SERIAL_ADDRESS))
+    supervisor.start()
+    ...
+    supervisor.close(timeout=2)
+
+"""
+
+import logging
+import threading
+import time
+
+import serial
+
+from serial_discovery import SerialPortNotFoundError
+
+_logger = logging.getLogger("rowercast.reader_supervisor")
+
+
+class ReaderSupervisor:
+    """Run the read loop of a serial reader, reopen the port on failure, with exponential backoff.
+
+    :param reader: the BaseSerialReader to run, its own start() is not used.
+    :param initial_delay: seconds to wait before the first reopen.
+    :param max_delay: the wait doubles on each failed reopen, up to this.
+    :param clock: monotonic clock, for the downtime.
+    :param discover: function() -> device of the port, called before each open, None to keep the reader's address.
+    """
+
+    def __init__(self, reader, initial_delay=0.5, max_delay=30.0, clock=time.monotonic, discover=None):
+        self.reader = reader
+        self.discover = discover
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.clock = clock
+
+        self.connected = False
+        # number of outages, seconds of the last one, and of all of them.
+        self.outages = 0
+        self.last_downtime = None
+        self.total_downtime = 0.0
+        self._down_since = None
+
+        self._stop_event = threading.Event()
+        self.worker_thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        self.worker_thread = threading.Thread(target=self._thread_worker, name="rowercast.supervisor", daemon=True)
+        self.worker_thread.start()
+
+    def close(self, timeout=None):
+        """Stop reading, the port is closed by the thread within a read timeout, wait for it up to timeout seconds.
+
+        Return True if the thread is stopped, the capture file of the reader is closed then.
+        """
+        self._stop_event.set()
+        if self.worker_thread is not None:
+            self.worker_thread.join(timeout)
+            if self.worker_thread.is_alive():
+                return False
+        return self.reader.close(0)
+
+    def _wait(self, seconds):
+        # sleep, unless stopped, return True if stopped.
+        return self._stop_event.wait(seconds)
+
+    def _thread_worker(self):
+        delay = self.initial_delay
+        while not self._stop_event.is_set():
+            try:
+                if self.discover is not None:
+                    self.reader.serial_device_address = self.discover()
+                with self.reader._open_port() as ser:
+                    # the connect sequence again, on each reopen.
+                    self.reader._connect(ser)
+                    self._on_connected()
+                    delay = self.initial_delay
+                    self._read_loop(ser)
+            except (serial.SerialException, OSError, SerialPortNotFoundError) as e:
+                self._on_failure(e)
+            finally:
+                self.reader._disconnect()
+
+            if self._stop_event.is_set() or self._wait(delay):
+                break
+            delay = min(delay * 2, self.max_delay)
+
+    def _read_loop(self, ser):
+        reader = self.reader
+        while not self._stop_event.is_set():
+            messages = reader._read_messages(ser)
+            try:
+                reader._handle_messages(messages)
+            except Exception:
+                # a frame the Rower refused, not a port failure, go on reading.
+                _logger.exception("Serial reader of %s failed on a message", reader.serial_device_address)
+
+    def _on_connected(self):
+        self.connected = True
+        if self._down_since is not None:
+            self.last_downtime = self.clock() - self._down_since
+            self.total_downtime += self.last_downtime
+            self._down_since = None
+            _logger.warning("Serial port %s back after %.1f seconds", self.reader.serial_device_address,
+                            self.last_downtime)
+
+    def _on_failure(self, error):
+        if self._down_since is None:
+            # a new outage, the port was up, or never came up.
+            self._down_since = self.clock()
+            self.outages += 1
+            _logger.warning("Serial port %s failed: %s, reconnecting", self.reader.serial_device_address, error)
+        else:
+            _logger.debug("Serial port %s still down: %s", self.reader.serial_device_address, error)
+        self.connected = False
@@ -1,3 +1,15 @@
+import logging
+import math
+import threading
+import time
+from collections.abc import Mapping
+
+from frame_history import FrameHistory
+from metrics import MetricsEngine
+
+_logger = logging.getLogger("rowercast.rower")
+
+
 class IncomingRowerDictInvalidKeyError(Exception):
     pass
 
@@ -14,6 +26,222 @@ class IncomingRowerDictDuplicateError(Exception):
     pass
 
 
+class RowerField:
+    """Declaration of one field of the rower data frame.
+
+    name:       key of the field in the incoming dict.
+    mandatory:  the field must be present in every frame, and can't be None.
+    integer:    the value must be an integer (int, or a float with no fraction part).
+    negative:   negative value is allowed, by default all fields are non-negative.
+
+    """
+
+    __slots__ = ('name', 'mandatory', 'integer', 'negative')
+
+    def __init__(self, name, mandatory=False, integer=False, negative=False):
+        self.name = name
+        self.mandatory = mandatory
+        self.integer = integer
+        self.negative = negative
+
+    def compile_validator(self):
+        """Build the value check of this field into a single callable.
+
+        The returned function takes (key, value) and raises if the value is not acceptable, all the flags are
+        resolved here once, so checking a value is only the tests that apply to this very field.
+
+        """
+        mandatory = self.mandatory
+
+        def reject_none(key):
+            if mandatory:
+                # Mandatory keys should have value.
+                raise IncomingRowerDictInvalidKeyError("Incoming rower data dict has wrong key, data rejected. "
+                                                       + key)
+
+        def reject_value(key, value):
+            raise IncomingRowerDictInvalidValueError("Incoming rower data dict has wrong key, "
+                                                     "data rejected. " + key + ":" + str(value))
+
+        # pick the specialized check, so no flag is tested per value.
+        if self.integer and not self.negative:
+            # integer keys should be integer, non-negative keys should be non-negative
+            def validate(key, value):
+                if value is None:
+                    reject_none(key)
+                elif value < 0 or int(value) != value:
+                    reject_value(key, value)
+        elif self.integer:
+            def validate(key, value):
+                if value is None:
+                    reject_none(key)
+                elif int(value) != value:
+                    reject_value(key, value)
+        elif not self.negative:
+            def validate(key, value):
+                if value is None:
+                    reject_none(key)
+                elif value < 0:
+                    reject_value(key, value)
+        else:
+            def validate(key, value):
+                if value is None:
+                    reject_none(key)
+
+        return validate
+
+
+class RowerSchema:
+    """The field schema of a rower data frame, compiled once for fast frame checking.
+
+    Key sets are frozensets, and each key is mapped to its own validator callable, so checking a frame is set
+    compares and at most one call per key, no list scans.
+
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.names = tuple(field.name for field in self.fields)
+        self.valid_keys = frozenset(self.names)
+        self.mandatory_keys = frozenset(field.name for field in self.fields if field.mandatory)
+        self.integer_keys = frozenset(field.name for field in self.fields if field.integer)
+        self.integer_names = tuple(field.name for field in self.fields if field.integer)
+        self.negative_keys = frozenset(field.name for field in self.fields if field.negative)
+        self.validators = {field.name: field.compile_validator() for field in self.fields}
+
+
+# fields definitions, keys that are not recognized will be rejected.
+ROWER_FIELDS = (
+    RowerField('total_elapsed_time', mandatory=True, integer=True),         # total time
+    RowerField('total_distance_traveled', mandatory=True, integer=True),    # total distance
+    RowerField('instantaneous_speed', mandatory=True),                      # current speed
+    RowerField('strokes_per_minute', integer=True),                         # spm
+    RowerField('instantaneous_power', integer=True),                        # power
+    RowerField('calories_burn_rate'),                                       # kCal/hr
+    RowerField('resistance_level'),                                         # resistance, x%
+)
+
+ROWER_SCHEMA = RowerSchema(ROWER_FIELDS)
+
+# (name, typecode) of all the fields of a RowerFrame, for typed column storage, 'q' for integer, 'd' for float.
+FRAME_FIELD_TYPES = (tuple((field.name, 'q' if field.integer else 'd') for field in ROWER_FIELDS)
+                     + MetricsEngine.fields)
+
+
+class RowerFrame(Mapping):
+    """Immutable snapshot of the rower data at one update.
+
+    The fields are slots named after the schema fields, so a consumer reads frame.instantaneous_power directly,
+    without a string-keyed dict lookup. A field that the data source didn't provide is None.
+
+    Besides the schema fields, the frame carries the derived fields of the MetricsEngine (average_power, split_pace,
+    ...) as slots too, frame.average_power, None if not calculated, derived() gives them as a dict.
+
+    seq is the sequence number of the frame, increased by one on each update of the Rower, timestamp is the
+    time.monotonic() when the frame is accepted.
+
+    changed is the dirty-field mask of the schema fields, a bit of field_bits set for each field that differs from
+    the previous frame, all of them when there's no previous frame to compare with. A consumer sending the fields in
+    turn, as the ant+ pages, sends the changed ones first.
+
+    For compatibility, a frame is also a read-only Mapping of the provided schema fields, frame['total_elapsed_time']
+    and frame.get('resistance_level') work as they did on the dict, as_dict() gives a plain dict copy. The derived
+    fields are not part of the Mapping, so dict(frame) is a valid incoming dict again, for on_update_data().
+
+    """
+
+    field_names = ROWER_SCHEMA.names + MetricsEngine.field_names
+    # keys of the Mapping view, the schema fields only.
+    _mapping_keys = frozenset(ROWER_SCHEMA.names)
+    # schema field: its bit in the changed mask, and the mask of all of them.
+    field_bits = {name: 1 << i for i, name in enumerate(ROWER_SCHEMA.names)}
+    ALL_CHANGED = (1 << len(ROWER_SCHEMA.names)) - 1
+
+    __slots__ = ('seq', 'timestamp', 'changed') + field_names
+
+    def __init__(self, seq, timestamp, fields, derived=None, previous=None, changed=None):
+        """previous is the frame before, to set the changed mask, or give the mask as changed, all by default."""
+        set_slot = object.__setattr__
+        set_slot(self, 'seq', seq)
+        set_slot(self, 'timestamp', timestamp)
+        get = fields.get
+        if previous is None:
+            for name in ROWER_SCHEMA.names:
+                set_slot(self, name, get(name, None))
+        else:
+            changed = 0
+            for name, bit in self.field_bits.items():
+                value = get(name, None)
+                set_slot(self, name, value)
+                if value != getattr(previous, name):
+                    changed |= bit
+        set_slot(self, 'changed', self.ALL_CHANGED if changed is None else changed)
+        get = derived.get if derived is not None else fields.get
+        for name in MetricsEngine.field_names:
+            set_slot(self, name, get(name, None))
+
+    @classmethod
+    def from_mapping(cls, fields):
+        """Return fields as a frame, wrap it with seq 0 if it's a plain dict."""
+        if isinstance(fields, cls):
+            return fields
+        return cls(0, 0.0, fields)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("RowerFrame is immutable, create a new frame instead.")
+
+    def __delattr__(self, key):
+        raise AttributeError("RowerFrame is immutable, create a new frame instead.")
+
+    def __getitem__(self, key):
+        if key in self._mapping_keys:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self._mapping_keys:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        return default
+
+    def __iter__(self):
+        for name in ROWER_SCHEMA.names:
+            if getattr(self, name) is not None:
+                yield name
+
+    def __len__(self):
+        return sum(1 for name in ROWER_SCHEMA.names if getattr(self, name) is not None)
+
+    @classmethod
+    def field_mask(cls, names):
+        """The changed mask of the names, the ones not in the schema are left out."""
+        mask = 0
+        for name in names:
+            mask |= cls.field_bits.get(name, 0)
+        return mask
+
+    def replace(self, **changes):
+        """Return a new frame with the given fields changed, seq, timestamp and changed kept unless changed too."""
+        fields = {name: getattr(self, name) for name in self.field_names}
+        fields.update(changes)
+        return RowerFrame(fields.pop('seq', self.seq), fields.pop('timestamp', self.timestamp), fields,
+                          changed=fields.pop('changed', self.changed))
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in ROWER_SCHEMA.names if getattr(self, name) is not None}
+
+    def derived(self) -> dict:
+        """The calculated derived fields, as a dict."""
+        return {name: getattr(self, name) for name in MetricsEngine.field_names if getattr(self, name) is not None}
+
+    def __repr__(self):
+        return 'RowerFrame(seq=%d, timestamp=%.3f, %r, derived=%r)' % (self.seq, self.timestamp, self.as_dict(),
+                                                                       self.derived())
+
+
 class Rower:
     """A Data Model representing a generic rower.
 
@@ -22,47 +250,33 @@ class Rower:
 
     In this case, data source is the serialReader class, consumer is the signal senders/readers (ant+, BLE, web).
 
-    All the rower data is stored in a dict, upon each update, a new dict will be created and replace the old one,
-    so for the data reader/consumers, the read-consistency is assured, all the fields will match.
+    All the rower data is stored in an immutable RowerFrame, upon each update, a new frame will be created and
+    replace the old one, so for the data reader/consumers, the read-consistency is assured, all the fields will match.
 
-    Data provider should call: on_update_data()
-    Data consumer should call: get_current_frame()
+    Data provider should call: on_update_data(), pass trusted=True only if the frame is built by an in-tree parser.
+    Data consumer should call: get_current_frame(), or wait_for_update() / subscribe() to be told of new frames
+    instead of polling.
 
     """
 
     # todo: support status report
 
-    def __init__(self):
-        # fields definitions, keys that are not recognized will be rejected.
-        self.all_valid_keys = [
-            'total_elapsed_time',   # total time
-            'total_distance_traveled',  # total distance
-            'instantaneous_speed',  # current speed
-            'strokes_per_minute',   # spm
-            'instantaneous_power',  # power
-            'calories_burn_rate',   # kCal/hr
-            'resistance_level'      # resistance, x%
-        ]
+    # frames kept in history by default, 5 minutes of the 1 frame/second head unit, about 60 kB. A consumer of a
+    # longer history asks for it, Rower(history_capacity=...), the pipeline with config.HISTORY_CAPACITY.
+    DEFAULT_HISTORY_CAPACITY = 5 * 60
 
+    def __init__(self, history_capacity=DEFAULT_HISTORY_CAPACITY):
+        # fields definitions, compiled from ROWER_FIELDS, keys that are not recognized will be rejected.
+        self.schema = ROWER_SCHEMA
+        self.all_valid_keys = self.schema.valid_keys
         # required fields.
-        self.mandatory_keys = [
-            'total_elapsed_time',
-            'total_distance_traveled',
-            'instantaneous_speed'
-        ]
-
+        self.mandatory_keys = self.schema.mandatory_keys
         # keys that should have integer value.
-        self.integer_keys = [
-            'total_elapsed_time',
-            'total_distance_traveled',
-            'strokes_per_minute',
-            'instantaneous_power'
-        ]
-
+        self.integer_keys = self.schema.integer_keys
         # for now, no negative keys.
-        self.negative_keys = []
+        self.negative_keys = self.schema.negative_keys
         # not implemented, some keys should only add 0 or positive value, like distance.
-        self.incremental_keys = []
+        self.incremental_keys = frozenset()
 
         # set initial data frame. current frame is what "current" data of rower.
         init_data = {
@@ -74,31 +288,135 @@ class Rower:
             'calories_burn_rate': 0,
             'resistance_level': 0
         }
-        # Current frame is a dict that stores current rower's data.
+        # Current frame is a RowerFrame that stores current rower's data.
         # Upon each update, the old frame should be replaced by the new frame, not modified, for read-consistency.
-        self._current_frame = init_data
-        assert isinstance(self._current_frame, dict)
+        self._seq = 0
+        self._current_frame = RowerFrame(self._seq, time.monotonic(), init_data)
+        # last dict passed in by the data provider, to detect the provider re-sending the same dict object.
+        self._last_incoming_dict = init_data
+
+        # fixed-memory history of the accepted frames, 0 capacity to keep no history.
+        if history_capacity:
+            self.history = FrameHistory(history_capacity, FRAME_FIELD_TYPES)
+        else:
+            self.history = None
+
+        # derived metrics, published as extra fields of each frame.
+        self.metrics = MetricsEngine()
+
+        # notified on each new frame, for the consumers blocking in wait_for_update().
+        self._update_cond = threading.Condition()
+        # callbacks called with each new frame, replaced as a whole on (un)subscribe, so no lock is needed to call.
+        self._subscribers = ()
 
-    def on_update_data(self, new_frame: dict):
+    def on_update_data(self, new_frame: dict, trusted=False):
         # write a new Frame of new data
         # change current frame to this new frame, last frame is now discarded, and should be garbage collected.
         # this action is much more 'atomic', so read consistency is conserved.
-        if new_frame is self._current_frame:
+        if new_frame is self._last_incoming_dict:
             raise IncomingRowerDictDuplicateError("Incoming frame is the same dict object, each time you have to "
                                                   "pass a new dict object to have the read-consistency.")
         # Invalid data frame should be rejected, and notify the caller.
-        self._check_dict_validity(new_frame)
-        self._current_frame = new_frame
+        # trusted frames are built by the in-tree parsers, which always produce the schema fields, skip the check,
+        # but for an integer field not an int: the history stores it in an integer column, a float would be
+        # truncated there, so the full check rejects a fraction part.
+        if not trusted or not self._has_int_fields(new_frame):
+            self._check_dict_validity(new_frame)
+        with self._update_cond:
+            self._last_incoming_dict = new_frame
+            self._seq += 1
+            frame = RowerFrame(self._seq, time.monotonic(), new_frame, self.metrics.update(new_frame),
+                               previous=self._current_frame)
+            self._current_frame = frame
+            if self.history is not None:
+                self.history.append(frame)
+            self._update_cond.notify_all()
 
-    def get_current_frame(self) -> dict:
+        # call the subscribers outside the lock, a slow subscriber only delays the data provider.
+        for callback in self._subscribers:
+            try:
+                callback(frame)
+            except Exception:
+                # one broken consumer should not stop the data provider or the other consumers.
+                _logger.exception("Rower subscriber %r failed on frame %d", callback, frame.seq)
+
+    def get_current_frame(self) -> RowerFrame:
         # return current frame
         # even if where current frame points changes, reader still get reference to previous frame, consistency ensured.
-        print(self._current_frame)
         return self._current_frame
 
+    def wait_for_update(self, since_seq=None, timeout=None):
+        """Block until there's a frame newer than since_seq, return it.
+
+        :param since_seq: seq of the last frame the caller has seen, None means the current frame.
+        :param timeout: in seconds, None to wait forever.
+        :return: the current RowerFrame, or None if timed out with nothing new.
+        """
+        with self._update_cond:
+            if since_seq is None:
+                since_seq = self._current_frame.seq
+            if self._update_cond.wait_for(lambda: self._current_frame.seq > since_seq, timeout):
+                return self._current_frame
+            return None
+
+    def subscribe(self, callback):
+        """Call callback(frame) on each new frame, from the data provider's thread.
+
+        The callback should be quick, hand the frame over to its own thread/queue if it has slow work to do.
+        Return the callback, so it could be used as a decorator, and passed to unsubscribe() later.
+        """
+        with self._update_cond:
+            self._subscribers = self._subscribers + (callback,)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._update_cond:
+            self._subscribers = tuple(c for c in self._subscribers if c != callback)
+
+    def frames_since(self, seq):
+        """Frames in history with seq greater than the given seq, oldest first."""
+        if self.history is None:
+            return []
+        return self._frames_from_columns(self.history.columns_since_seq(seq))
+
+    def frames_in_last(self, seconds):
+        """Frames in history of the last N seconds up to now, oldest first."""
+        if self.history is None:
+            return []
+        return self._frames_from_columns(self.history.last(seconds))
+
+    @staticmethod
+    def _frames_from_columns(columns):
+        # turn the missing values of the columns back to None, -1 in integer columns, NaN in float columns.
+        # the sentinel is tested exactly, a negative field (allowed by the schema) is not taken as missing.
+        frames = []
+        for i, seq in enumerate(columns['seq']):
+            fields = {}
+            for name, typecode in FRAME_FIELD_TYPES:
+                value = columns[name][i]
+                if typecode == 'q':
+                    if value != -1:
+                        fields[name] = value
+                elif not math.isnan(value):
+                    fields[name] = value
+            frames.append(RowerFrame(seq, columns['timestamp'][i], fields))
+        return frames
+
+    def __getitem__(self, key):
+        # dict-style read of the current frame, rower['total_elapsed_time'].
+        return self._current_frame[key]
+
     def print_current_frame(self):
         print(self._current_frame)
 
+    def _has_int_fields(self, incoming_dict: dict):
+        """True if the integer fields of the dict are int or missing, the one check of a trusted frame."""
+        for key in self.schema.integer_names:
+            value = incoming_dict.get(key)
+            if value is not None and value.__class__ is not int:
+                return False
+        return True
+
     def _check_dict_validity(self, incoming_dict: dict):
         """Make sure the incoming dict is a valid rower data frame, so the out coming data is consistent.
 
@@ -109,37 +427,33 @@ class Rower:
             Raises: IncomingRowerDictInvalidError, indicates that the incoming dict did not pass the validity check.
 
         """
-        # check key error
-        # check value error
+        # the key checks are frozenset compares against the key view, no loop in python for a good frame.
+        # check invalid key.
+        if not incoming_dict.keys() <= self.all_valid_keys:
+            for key in incoming_dict:
+                if key not in self.all_valid_keys:
+                    raise IncomingRowerDictInvalidKeyError("Incoming rower data dict has unknown key, data rejected. "
+                                                           + key)
 
-        for key in incoming_dict.keys():
-            # check invalid key.
-            if key not in self.all_valid_keys:
-                raise IncomingRowerDictInvalidKeyError("Incoming rower data dict has unknown key, data rejected. "
-                                                       + key)
+        # make sure mandatory keys exists.
+        if not self.mandatory_keys <= incoming_dict.keys():
+            for m_key in self.schema.names:
+                if m_key in self.mandatory_keys and m_key not in incoming_dict:
+                    raise IncomingRowerDictMissingKeyError('Incoming rower data dict has insufficient keys, '
+                                                           'mandatory keys not found. '+m_key)
 
-            # check value if key is valid.
-            value = incoming_dict.get(key, None)
-            if value is None:
-                if key in self.mandatory_keys:
-                    # Mandatory keys should have value.
-                    raise IncomingRowerDictInvalidKeyError("Incoming rower data dict has wrong key, data rejected. "
-                                                           + key)
+        # common case first: no None, nothing negative, then only the integer fields left to check.
+        # min() and the None test run in C over the values, so a good frame never calls a validator.
+        values = incoming_dict.values()
+        if None not in values and not self.negative_keys and min(values) >= 0:
+            for key in self.schema.integer_names:
+                value = incoming_dict.get(key, 0)
+                if value.__class__ is not int and int(value) != value:
+                    break
             else:
-                # Got the value, check the value.
-                if key in self.integer_keys:
-                    # integer keys should be integer
-                    if int(value) != value:
-                        raise IncomingRowerDictInvalidValueError("Incoming rower data dict has wrong key, "
-                                                                 "data rejected. " + key + ":" + str(value))
-                if key not in self.negative_keys:
-                    # non-negative keys should be non-negative
-                    if value < 0:
-                        raise IncomingRowerDictInvalidValueError("Incoming rower data dict has wrong key, "
-                                                                 "data rejected. " + key + ":" + str(value))
+                return
 
-        # make sure mandatory keys exists.
-        for m_key in self.mandatory_keys:
-            if m_key not in incoming_dict.keys():
-                raise IncomingRowerDictMissingKeyError('Incoming rower data dict has insufficient keys, '
-                                                       'mandatory keys not found. '+m_key)
+        # something is wrong, check the value of each key with its own compiled validator to find out which.
+        validators = self.schema.validators
+        for key, value in incoming_dict.items():
+            validators[key](key, value)
@@ -6,36 +6,74 @@ This script starts the serial_reader and ant+ radio in separate threads.
 
 Whenever the SerialReader gets a new message, it will update the data model "AntRower".
 Whenever an Ant "TX_Event" (the TX "tick") happens, it will get a new message from "AntRower", and
-send it as a broadcast.
+send it as a broadcast. Between the rower frames, distance and time are projected forward by a "FrameExtrapolator".
+
+It runs until SIGINT (Ctrl-C) or SIGTERM. SIGHUP restarts the reader and the radio. Each shutdown takes at most
+config.SHUTDOWN_TIMEOUT seconds, the serial port and the ant+ USB stick are released.
 
 """
 
+import functools
+import logging
+import signal
+import threading
+import time
+
 from rower import Rower
 from ant_rower import AntRower
-from serial_reader import FDFReader
-from config import SERIAL_ADDRESS, ANT_CONFIG
+from frame_extrapolator import FrameExtrapolator
+from serial_reader import create_reader
+from serial_discovery import find_fdf_port
+from reader_supervisor import ReaderSupervisor
+from config import SERIAL_PROTOCOL, SERIAL_ADDRESS, SERIAL_PORT_CACHE, HISTORY_CAPACITY, ANT_CONFIG, SHUTDOWN_TIMEOUT
 
+_logger = logging.getLogger("rowercast.main")
 
-def main():
-    print('rowercast, start.')
+
+def run_pipeline(stop_event, restart_event):
+    """Read and broadcast until stop_event or restart_event is set, then shut down within SHUTDOWN_TIMEOUT."""
     # shared data object of a rower.
-    my_rower = Rower()
-    # serial data reader.
-    serial_reader = FDFReader(my_rower, SERIAL_ADDRESS)
-    # Ant+ FE rower broadcaster.
-    ant_broadcaster = AntRower(my_rower, ANT_CONFIG)
+    my_rower = Rower(history_capacity=HISTORY_CAPACITY)
+    # serial data reader of the console protocol, on the configured port, or the one the FDF head unit answers on.
+    serial_reader = create_reader(SERIAL_PROTOCOL, my_rower, SERIAL_ADDRESS)
+    discover = None
+    if not SERIAL_ADDRESS and SERIAL_PROTOCOL == 'fdf':
+        # looked for before each open, a head unit switched off at start is found once it's on.
+        discover = functools.partial(find_fdf_port, SERIAL_PORT_CACHE)
+    # reopens the port when the cable blips, the connect commands sent again.
+    reader_supervisor = ReaderSupervisor(serial_reader, discover=discover)
+    # Ant+ FE rower broadcaster, sends 4 pages a second, distance and time projected between the 1Hz frames.
+    ant_broadcaster = AntRower(FrameExtrapolator(my_rower), ANT_CONFIG)
 
     # start reading, start broadcasting.
     try:
         ant_broadcaster.start()
-        serial_reader.start()
-    # except:
-    #     # todo: how to deal with the exception?
-    #     pass
+        reader_supervisor.start()
+        while not (stop_event.wait(0.5) or restart_event.is_set()):
+            pass
     finally:
-        # todo: close the program, release the hardware.
-        serial_reader.close()
-        ant_broadcaster.close()
+        # close the program, release the hardware, both within the one time bound.
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        reader_stopped = reader_supervisor.close(SHUTDOWN_TIMEOUT)
+        ant_stopped = ant_broadcaster.close(max(0, deadline - time.monotonic()))
+        if not (reader_stopped and ant_stopped):
+            _logger.warning("Not stopped in %s seconds, serial reader: %s, ant+: %s",
+                            SHUTDOWN_TIMEOUT, reader_stopped, ant_stopped)
+
+
+def main():
+    print('rowercast, start.')
+    stop_event = threading.Event()
+    restart_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGHUP, lambda signum, frame: restart_event.set())
+
+    while not stop_event.is_set():
+        restart_event.clear()
+        run_pipeline(stop_event, restart_event)
+        if restart_event.is_set():
+            print('rowercast, restart.')
 
     print('rowercast, exit.')
 
@@ -0,0 +1,118 @@
+"""Auto detection of the serial port of the FDF head unit
+
+Instead of a hard coded config.SERIAL_ADDRESS, find_fdf_port() finds the head unit:
+1. The USB serial number of the adapter found last time is cached in a file. If a port with that serial number is
+   plugged in, it's the head unit, no scan at all, whatever its /dev name is this time.
+2. Otherwise every candidate port, /dev/ttyUSB* and /dev/ttyACM*, is probed in parallel, with a short timeout: the
+   FDF connect command 'C' is sent, the port is the head unit if a 'C' reply or a data frame comes back. The first
+   port to answer wins, and its serial number is cached for the next start.
+
+Usage:
+    address = SERIAL_ADDRESS or find_fdf_port(SERIAL_PORT_CACHE)
+
+"""
+
+import glob
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import serial
+from serial.tools import list_ports
+
+from serial_reader import FDF_CONNECT, LineFramer
+
+_logger = logging.getLogger("rowercast.serial_discovery")
+
+CANDIDATE_PATTERNS = ('/dev/ttyUSB*', '/dev/ttyACM*')
+
+
+class SerialPortNotFoundError(Exception):
+    pass
+
+
+def candidate_ports(patterns=CANDIDATE_PATTERNS):
+    """[(device, USB serial number or None)] of the candidate ports, sorted by device."""
+    serial_numbers = {port.device: port.serial_number for port in list_ports.comports()}
+    devices = sorted(set(device for pattern in patterns for device in glob.glob(pattern)))
+    return [(device, serial_numbers.get(device)) for device in devices]
+
+
+def probe_fdf_port(device, timeout=0.5):
+    """Send the connect command to device, return True if the FDF head unit answers within timeout seconds."""
+    try:
+        with serial.Serial(device, timeout=0.05) as ser:
+            ser.reset_input_buffer()
+            ser.write(FDF_CONNECT.encode())
+            framer = LineFramer()
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                framer.read_from(ser)
+                buffer = framer.buffer
+                for kind, start, _ in framer.drain():
+                    if kind is LineFramer.FRAME:
+                        return True
+                    if kind is LineFramer.RESPONSE and buffer[start:start + 1] == FDF_CONNECT.reply:
+                        return True
+    except (serial.SerialException, OSError) as e:
+        # busy, no permission, not a serial port, not this one anyway.
+        _logger.debug("Probe of %s failed: %s", device, e)
+    return False
+
+
+def _load_cache(cache_path):
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache_path, device, serial_number):
+    try:
+        with open(cache_path, 'w') as f:
+            json.dump({'device': device, 'serial_number': serial_number}, f)
+    except OSError as e:
+        _logger.warning("Can't cache the serial port in %s: %s", cache_path, e)
+
+
+def find_fdf_port(cache_path=None, timeout=0.5, candidates=None, probe=probe_fdf_port):
+    """Return the device of the FDF head unit, raise SerialPortNotFoundError if no port answers.
+
+    :param cache_path: json file to keep the found port in, config.SERIAL_PORT_CACHE, None for no cache.
+    :param timeout: seconds to wait for the reply of each probed port, they are all probed at once.
+    :param candidates: [(device, serial number)] to look at, the ttyUSB / ttyACM ports by default.
+    :param probe: function(device, timeout) -> bool, tells if the port is the head unit.
+    """
+    if candidates is None:
+        candidates = candidate_ports()
+
+    cached = _load_cache(cache_path) if cache_path else {}
+    if cached.get('serial_number'):
+        # the same adapter, whatever its device name is now.
+        for device, serial_number in candidates:
+            if serial_number == cached['serial_number']:
+                return device
+    elif cached.get('device') in [device for device, _ in candidates]:
+        # adapter without a serial number, try the same device first, alone.
+        if probe(cached['device'], timeout):
+            return cached['device']
+
+    if candidates:
+        executor = ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix="rowercast.probe")
+        try:
+            probes = {executor.submit(probe, device, timeout): (device, serial_number)
+                      for device, serial_number in candidates}
+            for done in as_completed(probes):
+                if done.result():
+                    device, serial_number = probes[done]
+                    _logger.info("FDF head unit found on %s", device)
+                    if cache_path:
+                        _save_cache(cache_path, device, serial_number)
+                    return device
+        finally:
+            # don't wait for the slower probes, they end on their own timeout.
+            executor.shutdown(wait=False)
+
+    raise SerialPortNotFoundError("No FDF head unit found on " + ', '.join(device for device, _ in candidates))
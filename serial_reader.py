@@ -37,12 +37,17 @@ self.total_elapsed_time = incoming_data.get('total_elapsed_time', -1)
 
 """
 
+import array
+import collections
+import importlib
+import struct
 import threading
 import serial
 import time
+from concurrent.futures import Future
 from abc import abstractmethod
 
-from rower import Rower
+from rower import ROWER_SCHEMA, Rower
 
 
 class BaseSerialReader:
@@ -52,60 +57,103 @@ class BaseSerialReader:
 
     For a specific rower, extend this class and implement the _parse() method.
 
+    Set trusted_source to True only if _parse() always builds frames that match the Rower schema, then the Rower
+    skips the validity check for the frames from this reader, but for the integer fields not given as int.
+
+    Give a capture_path to save every message read from the serial port, with its arrival time, to replay it later
+    with a ReplayReader.
+
     """
 
-    def __init__(self, outbound_rower, serial_device_address):
+    trusted_source = False
+
+    def __init__(self, outbound_rower, serial_device_address, capture_path=None):
         # When got new data frame, update which rower.
         assert isinstance(outbound_rower, Rower)
         self.receiver = outbound_rower
-        # Which TTY device are you going to read.   todo: auto detect, instead of hard code.
+        # Which TTY device are you going to read, serial_discovery.find_fdf_port() finds the FDF one.
         self.serial_device_address = serial_device_address
+        self.capture_path = capture_path
+        self._capture = None
         self.worker_thread = None
+        # set by close(), the worker thread checks it between two reads.
+        self._stop_event = threading.Event()
 
     def start(self):
-        self.worker_thread = threading.Thread(target=self._thread_worker)
+        self._stop_event.clear()
+        self.worker_thread = threading.Thread(target=self._thread_worker, name="rowercast.serial_reader",
+                                              daemon=True)
         self.worker_thread.start()
 
-    def close(self):
-        pass
-        # stop the thread, release the resource.
+    def close(self, timeout=None):
+        """Stop the thread, wait for it up to timeout seconds, release the serial port and the capture file.
+
+        The thread sees the stop within one read timeout, and closes the port on its way out.
+        Return True if the thread is stopped.
+        """
+        self._stop_event.set()
+        if self.worker_thread is not None:
+            self.worker_thread.join(timeout)
+        stopped = self.worker_thread is None or not self.worker_thread.is_alive()
+        if stopped and self._capture is not None:
+            self._capture.close()
+            self._capture = None
+        return stopped
+
+    def _open_port(self, timeout=1):
+        """Open the serial port, timeout is the read timeout in seconds, 0 for non-blocking reads."""
+        return serial.Serial(self.serial_device_address, timeout=timeout)
 
     def _thread_worker(self):
         """This method will run as a thread, to continuously read serial port and update rower object"""
-        with serial.Serial(self.serial_device_address, timeout=1) as ser:
+        with self._open_port() as ser:
             # Connect,
             self._connect(ser)
-            # continuously read the data
-            while True:
-                ser_bytes = self._read_message(ser)
-                if ser_bytes != '':
-                    # got something
-                    print('Got something from serial')
-                    print(ser_bytes)
-                    # parse incoming ser_bytes, return value should be a dict
-                    result_dict = self._parse(ser_bytes)
-                    # if result dict OK, update the receiver.
-                    if result_dict is not None:
-                        assert isinstance(result_dict, dict)
-                        self._send(result_dict)
-                else:
-                    # EOF or timeout
-                    print('No data, timeout.')
+            # continuously read the data, until closed
+            while not self._stop_event.is_set():
+                # no message on a timeout, the rower is idle, or on a partial line, the rest comes with the next read.
+                self._handle_messages(self._read_messages(ser))
+
+    def _handle_messages(self, messages):
+        """Capture, parse the messages read, and update the rower with the frames."""
+        if self.capture_path and self._capture is None:
+            self._capture = CaptureWriter(self.capture_path)
+        for ser_bytes in messages:
+            if self._capture is not None:
+                self._capture.write(ser_bytes)
+            # parse incoming ser_bytes, return value should be a dict
+            result_dict = self._parse(ser_bytes)
+            # if result dict OK, update the receiver.
+            if result_dict is not None:
+                assert isinstance(result_dict, dict)
+                self._send(result_dict)
 
     def _send(self, dict_to_send):
         assert isinstance(dict_to_send, dict)
-        self.receiver.on_update_data(dict_to_send)
+        self.receiver.on_update_data(dict_to_send, trusted=self.trusted_source)
 
     @abstractmethod
     def _connect(self, ser):
         """the connect command to send to establish a link"""
         pass
 
+    def _disconnect(self):
+        """the port is closed, or gone, forget the link state, before a reconnect"""
+        pass
+
     @abstractmethod
     def _read_message(self, ser):
         """send the read command (if any) and wait for the message"""
         pass
 
+    def _read_messages(self, ser):
+        """Read the messages available, a list of bytes, empty on timeout.
+
+        By default one _read_message() call, override it to read many messages at once.
+        """
+        message = self._read_message(ser)
+        return [message] if message else []
+
     @abstractmethod
     def _parse(self, ser_bytes):
         """Parse the bytes read from the serial port.
@@ -128,14 +176,186 @@ class BaseSerialReader:
         pass
 
 
+# protocol name: reader class, of the readers create_reader() can build, see register_reader().
+READERS = {}
+
+# modules of the built-in protocols, imported by create_reader() when first asked for, they register their reader.
+_BUILTIN_READER_MODULES = {
+    'waterrower_s4': 'waterrower_reader',
+    'csafe': 'csafe_reader',
+}
+
+
+def register_reader(protocol):
+    """Class decorator, register a BaseSerialReader subclass for the protocol name, for create_reader()."""
+    def register(cls):
+        READERS[protocol] = cls
+        return cls
+    return register
+
+
+def create_reader(protocol, outbound_rower, serial_device_address, **kwargs):
+    """Build the reader of the protocol, 'fdf', 'waterrower_s4', 'csafe', or a registered one, for the rower."""
+    if protocol not in READERS and protocol in _BUILTIN_READER_MODULES:
+        importlib.import_module(_BUILTIN_READER_MODULES[protocol])
+    try:
+        cls = READERS[protocol]
+    except KeyError:
+        raise ValueError("Unknown rower protocol %r, known: %s" % (protocol, ', '.join(
+            sorted(set(READERS) | set(_BUILTIN_READER_MODULES)))))
+    return cls(outbound_rower, serial_device_address, **kwargs)
+
+
+class PollScheduler:
+    """Pick the queries to send in each poll round, as many as fit in one request.
+
+    Each query is polled every `every` rounds. The queries due are packed oldest due first, up to max_size, the
+    sum of size(query) of the batch, the ones left out stay due, and go first in the next round.
+
+    :param queries: sequence of (query, every).
+    :param max_size: size limit of a batch, None for no limit.
+    :param size: function(query) -> its size in the batch, 1 by default, a count of queries.
+    """
+
+    def __init__(self, queries, max_size=None, size=None):
+        self.queries = list(queries)
+        self.max_size = max_size
+        self.size = size or (lambda query: 1)
+        self.round = 0
+        # round each query is due at, all due at the first round, and the number of times it was sent.
+        self._due = [1] * len(self.queries)
+        self._sent = [0] * len(self.queries)
+
+    def next_batch(self):
+        """Return the list of queries of the next round."""
+        self.round += 1
+        # the most overdue first, then the least sent.
+        due = sorted((due_round, self._sent[index], index) for index, due_round in enumerate(self._due)
+                     if due_round <= self.round)
+        picked = []
+        used = 0
+        for _, _, index in due:
+            size = self.size(self.queries[index][0])
+            if self.max_size is not None and used + size > self.max_size:
+                continue
+            used += size
+            picked.append(index)
+            self._due[index] = self.round + self.queries[index][1]
+            self._sent[index] += 1
+        # in the order of the queries, the same layout each round.
+        return [self.queries[index][0] for index in sorted(picked)]
+
+
+class PolledSerialReader(BaseSerialReader):
+    """Base class of the readers of the rowers that must be polled, they don't send their data on their own.
+
+    Each poll round, poll_interval seconds apart, the queries picked by a PollScheduler are sent in one request,
+    one round trip, and the reply is one message. _parse() merges the values of the reply into the latest values of
+    all the queries, and returns the frame once it has all the mandatory fields.
+
+    Subclasses set queries, (query, every n rounds), and implement:
+        _encode_queries(batch) -> bytes, the request.
+        _read_reply(ser, batch) -> bytes of the reply, b'' on timeout, reading with _read_before().
+        _decode_reply(reply) -> dict of the Rower fields in the reply.
+    """
+
+    # (query, poll every n rounds) of the reader.
+    queries = ()
+    # size limit of a batch, see PollScheduler.
+    max_batch_size = None
+    # seconds between two poll rounds, 4 a second, the ant+ broadcast rate.
+    POLL_INTERVAL = 0.25
+    # seconds to wait for a reply.
+    REPLY_TIMEOUT = 0.5
+
+    def __init__(self, outbound_rower, serial_device_address, capture_path=None, poll_interval=None,
+                 clock=time.monotonic):
+        super(PolledSerialReader, self).__init__(outbound_rower, serial_device_address, capture_path)
+        self.poll_interval = poll_interval if poll_interval is not None else self.POLL_INTERVAL
+        self.clock = clock
+        self.scheduler = PollScheduler(self.queries, self.max_batch_size, self._query_size)
+        # latest value of each field read.
+        self.values = {}
+        # poll rounds, and the ones with no reply.
+        self.rounds = 0
+        self.timeouts = 0
+        self._next_poll = None
+
+    def _query_size(self, query):
+        return 1
+
+    def _read_messages(self, ser):
+        now = self.clock()
+        if self._next_poll is None:
+            self._next_poll = now
+        delay = self._next_poll - now
+        if delay > 0 and self._stop_event.wait(delay):
+            return []
+        # the next round a poll interval after this one was due, no burst of rounds to catch up after a slow reply.
+        self._next_poll = max(self._next_poll + self.poll_interval, self.clock())
+
+        batch = self.scheduler.next_batch()
+        if not batch:
+            return []
+        ser.write(self._encode_queries(batch))
+        self.rounds += 1
+        reply = self._read_reply(ser, batch)
+        if not reply:
+            self.timeouts += 1
+            return []
+        return [reply]
+
+    def _read_before(self, ser, deadline):
+        """Read the bytes waiting, or wait for one up to the deadline, not the whole read timeout of the port.
+
+        A non-blocking port, timeout 0, is left as is.
+        """
+        waiting = ser.in_waiting
+        if waiting:
+            return ser.read(waiting)
+        remaining = deadline - self.clock()
+        if remaining <= 0:
+            return b''
+        if ser.timeout != 0:
+            ser.timeout = remaining
+        return ser.read(1)
+
+    def _parse(self, ser_bytes):
+        values = self._decode_reply(ser_bytes)
+        if not values:
+            return None
+        self.values.update(values)
+        if any(self.values.get(name) is None for name in ROWER_SCHEMA.mandatory_keys):
+            return None
+        return dict(self.values)
+
+    def _read_message(self, ser):
+        pass
+
+    @abstractmethod
+    def _encode_queries(self, batch):
+        pass
+
+    @abstractmethod
+    def _read_reply(self, ser, batch):
+        pass
+
+    @abstractmethod
+    def _decode_reply(self, reply):
+        pass
+
+
 class FakeRower(BaseSerialReader):
     """Fake Rower class
 
     Simulate a serial reader, Update the data once a second, send new data to Rower object.
     This class should be substitutable with a actual serial Reader.
+    For a stroke cycle model, workouts, higher rates and fleets of rowers, see simulator.RowingSimulator.
 
     """
 
+    trusted_source = True
+
     def __init__(self, out_rower):
         super(FakeRower, self).__init__(outbound_rower=out_rower, serial_device_address='')
         self.spd = 2.5
@@ -158,11 +378,11 @@ class FakeRower(BaseSerialReader):
     # fake rower class does't read actual data, it fabricate data instead.
     # override the original thread_worker method.
     def _thread_worker(self):
-        while True:
+        while not self._stop_event.is_set():
             result_dict = self.generate_fake_data()
             print(result_dict)
             self._send(result_dict)
-            time.sleep(1)
+            self._stop_event.wait(1)
 
     def generate_fake_data(self):
         new_dict = {
@@ -189,73 +409,499 @@ class FakeRower(BaseSerialReader):
         return new_dict
 
 
+class LineFramer:
+    """Split a serial byte stream into lines, incrementally, frames and command responses in one pass.
+
+    The bytes read are appended to one bytearray, drain() finds the line ends in it with bytearray.find() and gives
+    (kind, start, end) offsets into framer.buffer, end is after the b'\\n'. No bytes object is built per line, the
+    offsets are valid until the next feed(), which drops the consumed lines from the buffer.
+
+    Kinds:
+        FRAME:      a line of exactly frame_length bytes, with the \\r\\n, the data frame of the head unit.
+        RESPONSE:   any other line starting with a capital letter, a command echo or a command response, C1164.
+        GARBAGE:    anything else, noise, empty lines, a line cut by a reconnection, or max_line_length bytes
+                    without a line end, dropped to resync on the next line end.
+
+    A partial line stays in the buffer until the rest of it arrives.
+
+    """
+
+    FRAME = 'frame'
+    RESPONSE = 'response'
+    GARBAGE = 'garbage'
+
+    def __init__(self, frame_length=31, max_line_length=64):
+        self.frame_length = frame_length
+        self.max_line_length = max_line_length
+        self.buffer = bytearray()
+        # bytes at the start of the buffer already drained, dropped on the next feed().
+        self._consumed = 0
+
+    def feed(self, data):
+        if self._consumed:
+            del self.buffer[:self._consumed]
+            self._consumed = 0
+        self.buffer += data
+
+    def read_from(self, ser):
+        """Read all the bytes waiting in the serial port, or wait for one byte up to the port timeout.
+
+        One read() call, return the number of bytes read, 0 on timeout.
+        """
+        data = ser.read(ser.in_waiting or 1)
+        if data:
+            self.feed(data)
+        return len(data)
+
+    def drain(self):
+        """Generate (kind, start, end) of each complete line in the buffer."""
+        buffer = self.buffer
+        start = self._consumed
+        while True:
+            end = buffer.find(b'\n', start) + 1
+            if not end:
+                break
+            self._consumed = end
+            if end - start == self.frame_length and buffer[end - 2] == 13:
+                yield self.FRAME, start, end
+            elif 65 <= buffer[start] <= 90:
+                yield self.RESPONSE, start, end
+            else:
+                yield self.GARBAGE, start, end
+            start = end
+
+        if len(buffer) - start > self.max_line_length:
+            # no line end in sight, drop it all, the next line end starts clean.
+            self._consumed = len(buffer)
+            yield self.GARBAGE, start, len(buffer)
+
+
+class FDFCommandError(Exception):
+    pass
+
+
+class FDFCommandTimeoutError(FDFCommandError):
+    pass
+
+
+class FDFCommand:
+    """A command of the FDF head unit.
+
+    letter:     the command letter sent, followed by its argument digits, if any, and a line end.
+    reply:      the letter the reply line starts with, None if the head unit doesn't reply.
+    decode:     turns the reply text after the letter into the result, None for the text itself.
+
+    """
+
+    __slots__ = ('name', 'letter', 'reply', 'decode')
+
+    def __init__(self, name, letter, reply=None, decode=None):
+        self.name = name
+        self.letter = letter
+        self.reply = reply
+        self.decode = decode
+
+    def encode(self, argument=None):
+        if argument is None:
+            return self.letter + b'\n'
+        return self.letter + b'%d\n' % argument
+
+    def result(self, reply_line):
+        text = reply_line[len(self.reply):].decode('ascii', 'replace')
+        return self.decode(text) if self.decode is not None else text
+
+
+# the commands known to work, see the module doc.
+FDF_CONNECT = FDFCommand('connect', b'C', reply=b'C')
+FDF_RESET = FDFCommand('reset', b'R')
+FDF_VERSION = FDFCommand('version', b'V', reply=b'V')
+FDF_LEVEL = FDFCommand('level', b'L', reply=b'L', decode=int)
+FDF_HEART_RATE = FDFCommand('heart_rate', b'H', reply=b'H', decode=int)
+
+# resistance levels of the FDF rower.
+FDF_LEVELS = range(1, 5)
+
+
+@register_reader('fdf')
 class FDFReader(BaseSerialReader):
-    """Serial reader for FDF rower"""
+    """Serial reader for FDF rower
+
+    The port is read in chunks of whatever is waiting, split by a LineFramer, so a burst of lines costs one read()
+    call, and a partial line waits for its end instead of being lost on a readline() timeout.
+
+    Commands are sent with send_command(), or the helpers read_version(), set_level(), reset(), from any thread,
+    while the data frames keep coming. Each one returns a Future, the reply line is matched to the oldest pending
+    command with the same reply letter, by the reading thread, in the same pass as the frames. A command with no
+    reply in time fails with FDFCommandTimeoutError. The replies no command waits for go to responses.
+    """
+
+    # _parse() only returns a frame when all its number fields are plain digits and the pace isn't 0, the values
+    # are then non-negative integers, all the schema fields are there and valid, no check needed in the Rower.
+    trusted_source = True
+
+    # seconds to wait for a command reply, by default.
+    COMMAND_TIMEOUT = 2.0
+
+    def __init__(self, outbound_rower, serial_device_address, capture_path=None, clock=time.monotonic):
+        super(FDFReader, self).__init__(outbound_rower, serial_device_address, capture_path)
+        self.framer = LineFramer()
+        # lines seen, by kind of the framer, and the latest unsolicited command responses.
+        self.line_counts = {LineFramer.FRAME: 0, LineFramer.RESPONSE: 0, LineFramer.GARBAGE: 0}
+        self.responses = collections.deque(maxlen=16)
+
+        # the open port, to write the commands to, set on connect.
+        self.port = None
+        self.clock = clock
+        # (command, future, deadline) of the commands waiting for their reply, oldest first.
+        self._pending_commands = collections.deque()
+        self._command_lock = threading.Lock()
 
     def _connect(self, ser):
+        self.port = ser
         # Connect,
-        ser.write(b'C\n')
+        self.send_command(FDF_CONNECT)
         # Reset
-        ser.write(b'R\n')
+        self.send_command(FDF_RESET)
+
+    def _disconnect(self):
+        self.port = None
+        # a partial line of the old link, and the commands it won't reply to.
+        self.framer = LineFramer()
+        with self._command_lock:
+            pending, self._pending_commands = self._pending_commands, collections.deque()
+        for command, future, _ in pending:
+            future.set_exception(FDFCommandError("Disconnected before the reply to " + command.name))
+
+    def send_command(self, command, argument=None, timeout=None):
+        """Send a command to the head unit, return a Future of its decoded reply.
+
+        The command is written at once, it doesn't wait for the reply of the commands before it.
+        """
+        if self.port is None:
+            raise FDFCommandError("Not connected to the head unit, can't send " + command.name)
+        future = Future()
+        with self._command_lock:
+            self.port.write(command.encode(argument))
+            if command.reply is None:
+                future.set_result(None)
+            else:
+                deadline = self.clock() + (timeout if timeout is not None else self.COMMAND_TIMEOUT)
+                self._pending_commands.append((command, future, deadline))
+        return future
+
+    def read_version(self, timeout=None):
+        return self.send_command(FDF_VERSION, timeout=timeout)
+
+    def set_level(self, level, timeout=None):
+        """Set the resistance level, 1 to 4, one round trip, the Future gives the level the head unit is at."""
+        if level not in FDF_LEVELS:
+            raise ValueError("FDF resistance level is 1 to 4, not %r" % (level,))
+        return self.send_command(FDF_LEVEL, level, timeout=timeout)
+
+    def reset(self):
+        return self.send_command(FDF_RESET)
+
+    def _on_response(self, line):
+        """Complete the oldest pending command the reply line is for, and time out the expired ones."""
+        now = self.clock()
+        with self._command_lock:
+            self._expire_commands(now)
+            for index, (command, future, _) in enumerate(self._pending_commands):
+                if line.startswith(command.reply):
+                    del self._pending_commands[index]
+                    break
+            else:
+                self.responses.append(line)
+                return
+        try:
+            future.set_result(command.result(line))
+        except ValueError as e:
+            future.set_exception(FDFCommandError("Bad reply to %s: %r, %s" % (command.name, line, e)))
+
+    def _expire_commands(self, now):
+        # the caller holds the command lock.
+        pending = self._pending_commands
+        if any(deadline <= now for _, _, deadline in pending):
+            self._pending_commands = collections.deque(entry for entry in pending if entry[2] > now)
+            for command, future, deadline in pending:
+                if deadline <= now:
+                    future.set_exception(FDFCommandTimeoutError("No reply to " + command.name))
 
     def _read_message(self, ser):
         return ser.readline()
 
+    def _read_messages(self, ser):
+        framer = self.framer
+        messages = []
+        if framer.read_from(ser):
+            buffer = framer.buffer
+            for kind, start, end in framer.drain():
+                self.line_counts[kind] += 1
+                if kind is LineFramer.FRAME:
+                    messages.append(buffer[start:end])
+                elif kind is LineFramer.RESPONSE:
+                    self._on_response(bytes(buffer[start:end]).rstrip())
+        if self._pending_commands:
+            with self._command_lock:
+                self._expire_commands(self.clock())
+        return messages
+
     def _parse(self, ser_bytes):
-        if len(ser_bytes) == 31:
+        if len(ser_bytes) == FDF_FRAME_LENGTH:
             # this is the rower's valid frame data, decode and return a dict.
-            # get the raw data.
+            return parse_fdf_frame(ser_bytes)
+        else:
+            # not frame data, the command replies are matched to their commands by _read_messages().
+            return None
+
+
+# FDF data frame, 31 bytes, 'A80' then the digits, all numbers in decimal:
+#   [3:5] minutes, [5:7] seconds, [7:12] distance in meter, [12] separator,
+#   [13:15] minutes per 500m, [15:17] seconds per 500m, [17:20] spm, [20:23] watts, [23:27] cal/hr, [27:29] level
+#   [29:31] b'\r\n'
+FDF_FRAME_LENGTH = 31
+
+# the two digit runs of a frame, read in one unpack_from() from the buffer, no slicing of the line.
+_FDF_DIGITS = struct.Struct('3x9s1x16s2x')
 
-            # time
-            total_minutes = int(ser_bytes[3:5], 10)
-            total_seconds = int(ser_bytes[5:7], 10)
+# speed in meter/second by the 4 pace digits mmss, minutes and seconds per 500m, no pace (0000) is no frame.
+_SPEED_BY_PACE = (None,) + tuple(500 / (mmss // 100 * 60 + mmss % 100) for mmss in range(1, 10000))
+# resistance level, this rower have 4 levels. 1/4 to 4/4.
+_RESISTANCE_BY_LEVEL = tuple(level / 4 for level in range(100))
 
-            # distance, in meter
-            distance = int(ser_bytes[7:12], 10)
 
-            # pace
-            minutes_to_500m = int(ser_bytes[13:15], 10)
-            seconds_to_500m = int(ser_bytes[15:17], 10)
+def parse_fdf_frame(buffer, offset=0):
+    """Decode the FDF data frame at offset of a bytes-like buffer, return a dict, None if it's not a valid frame.
 
-            # spm
-            spm = int(ser_bytes[17:20], 10)
+    Each digit run is turned into one int, the fields are cut out of it with integer division, instead of an int()
+    call per field, the pace and the level go through lookup tables.
+    """
+    time_distance, pace_rest = _FDF_DIGITS.unpack_from(buffer, offset)
+    # int() would take a sign or spaces, only plain digits make a valid frame, a garbled line is dropped.
+    if not (time_distance.isdigit() and pace_rest.isdigit()):
+        return None
+
+    # mmsslllll: minutes, seconds, distance.
+    time_distance = int(time_distance)
+    minutes_seconds, distance = divmod(time_distance, 100000)
+    minutes, seconds = divmod(minutes_seconds, 100)
+    # mmsspppwwwccccll: pace minutes, pace seconds, spm, watts, cal/hr, level.
+    pace_rest = int(pace_rest)
+    pace, rest = divmod(pace_rest, 10 ** 12)
+    spm, rest = divmod(rest, 10 ** 9)
+    watt, rest = divmod(rest, 10 ** 6)
+    cal_per_hour, level = divmod(rest, 100)
+
+    # no pace, no speed.
+    speed = _SPEED_BY_PACE[pace]
+    if speed is None:
+        return None
+
+    return {
+        # in second
+        'total_elapsed_time': minutes * 60 + seconds,
+        # in meter
+        'total_distance_traveled': distance,
+        # in meter/second, calculate from 500m pace, float
+        'instantaneous_speed': speed,
+        # spm, stroke/minute, int
+        'strokes_per_minute': spm,
+        # power, in watts, int
+        'instantaneous_power': watt,
+        # caloric burn rate, in kCal/hour, int
+        'calories_burn_rate': cal_per_hour,
+        # resistance level, in percentage, float
+        'resistance_level': _RESISTANCE_BY_LEVEL[level]
+    }
+
+
+# columns of decode_fdf_frames(): (field, typecode, offset of the digits in the frame, number of digits, value of
+# the number), the value None makes the frame invalid.
+FDF_COLUMNS = (
+    ('total_elapsed_time', 'q', 3, 4, lambda mmss: mmss // 100 * 60 + mmss % 100),
+    ('total_distance_traveled', 'q', 7, 5, None),
+    ('instantaneous_speed', 'd', 13, 4, _SPEED_BY_PACE.__getitem__),
+    ('strokes_per_minute', 'q', 17, 3, None),
+    ('instantaneous_power', 'q', 20, 3, None),
+    ('calories_burn_rate', 'q', 23, 4, None),
+    ('resistance_level', 'd', 27, 2, _RESISTANCE_BY_LEVEL.__getitem__),
+)
+
+# array typecode and size of the slot a number of digits is copied to.
+_DIGIT_SLOTS = {2: ('H', 2), 3: ('I', 4), 4: ('I', 4), 5: ('Q', 8)}
+
+# lookup tables of the columns, built on first use: the digits of a slot read as one unsigned integer -> the value.
+_column_tables = {}
+
+
+def _column_table(name, digits, value_of):
+    table = _column_tables.get(name)
+    if table is None:
+        typecode, size = _DIGIT_SLOTS[digits]
+        unpack = struct.Struct('<' + typecode).unpack
+        table = {}
+        for number in range(10 ** digits):
+            value = value_of(number) if value_of is not None else number
+            if value is not None:
+                # the digits right aligned in the slot, left padded with '0'.
+                table[unpack(b'%0*d' % (size, number))[0]] = value
+        _column_tables[name] = table
+    return table
+
+
+def _decode_clean_fdf_frames(data, count):
+    """Columns of a stream of frames only, KeyError if a frame has a non-digit or no pace.
+
+    Column by column: the digits of the field in all the frames are gathered with one strided slice copy per digit,
+    into fixed size slots, read as an array of integers, and each integer is looked up in the column table. No
+    Python code runs per frame, only C loops.
+    """
+    columns = {}
+    for name, typecode, offset, digits, value_of in FDF_COLUMNS:
+        slot_typecode, size = _DIGIT_SLOTS[digits]
+        slots = bytearray(b'0') * (size * count)
+        for digit in range(digits):
+            slots[size - digits + digit::size] = data[offset + digit::FDF_FRAME_LENGTH]
+        raw = array.array(slot_typecode)
+        raw.frombytes(slots)
+        columns[name] = array.array(typecode, list(map(_column_table(name, digits, value_of).__getitem__, raw)))
+    return columns
+
+
+def decode_fdf_frames(data):
+    """Decode all the FDF frames of a raw byte stream (a capture, a serial dump) into columns, for offline work.
+
+    Return a dict of array.array per field (see FDF_COLUMNS), the lines that are not valid frames are skipped.
+
+    The frames are decoded column by column, with no per-frame Python code. The frame lines are picked out with a
+    LineFramer first if the stream has other lines, and the frames with a garbled number or no pace are dropped
+    with the checks of parse_fdf_frame() if there are any.
+    """
+    data = bytes(data)
+    count = len(data) // FDF_FRAME_LENGTH
+    if not (len(data) % FDF_FRAME_LENGTH == 0 and data[FDF_FRAME_LENGTH - 1::FDF_FRAME_LENGTH] == b'\n' * count
+            and data[FDF_FRAME_LENGTH - 2::FDF_FRAME_LENGTH] == b'\r' * count):
+        # not only frames, keep the frame lines.
+        framer = LineFramer(frame_length=FDF_FRAME_LENGTH)
+        framer.feed(data)
+        buffer = framer.buffer
+        frames = [buffer[start:end] for kind, start, end in framer.drain() if kind is LineFramer.FRAME]
+        data = b''.join(frames)
+        count = len(frames)
+
+    try:
+        return _decode_clean_fdf_frames(data, count)
+    except KeyError:
+        # a garbled frame, or a frame with no pace, drop them.
+        frames = [data[start:start + FDF_FRAME_LENGTH] for start in range(0, len(data), FDF_FRAME_LENGTH)
+                  if parse_fdf_frame(data, start) is not None]
+        return _decode_clean_fdf_frames(b''.join(frames), len(frames))
+
+
+def encode_fdf_frame(elapsed_time, distance, pace, spm=0, power=0, cal_per_hour=0, level=1):
+    """Build a raw 31-byte FDF frame, as sent by the head unit, the reverse of FDFReader._parse().
+
+    :param elapsed_time: total time in seconds.
+    :param distance: total distance in meter.
+    :param pace: seconds per 500m.
+    """
+    minutes, seconds = divmod(int(elapsed_time), 60)
+    pace_minutes, pace_seconds = divmod(int(pace), 60)
+    return b'A80%02d%02d%05d %02d%02d%03d%03d%04d%02d\r\n' % (minutes, seconds, distance, pace_minutes, pace_seconds,
+                                                            spm, power, cal_per_hour, level)
 
-            # power
-            watt = int(ser_bytes[20:23], 10)
 
-            # calorie per hour
-            cal_per_hour = int(ser_bytes[23:27], 10)
+class CaptureWriter:
+    """Write raw serial messages to a capture file, for a ReplayReader.
 
-            # level
-            level = int(ser_bytes[27:29], 10)
+    Capture file format, one message per line, text:
+        <seconds since the first message> <TAB> <message bytes, backslash escaped>
+    so a capture is readable and can be edited by hand to reproduce an issue.
 
-            # print('time: '+str(total_minutes)+':'+str(total_seconds)+' distance: '+str(distance))
-            # print('pace: '+str(minutes_to_500m)+':'+str(seconds_to_500m)+' spm: '+str(spm))
-            # print('power: '+str(watt)+' cal/hr: '+str(cal_per_hour)+' level: '+str(level))
+    """
 
-            # calculate to the standard fields.
+    def __init__(self, path, clock=time.monotonic):
+        self.clock = clock
+        self._file = open(path, 'w', encoding='ascii')
+        self._start = None
 
-            new_dict = {
-                # in second
-                'total_elapsed_time': total_minutes * 60 + total_seconds,
-                # in meter
-                'total_distance_traveled': distance,
-                # in meter/second, calculate from 500m pace, float
-                'instantaneous_speed': 500 / (minutes_to_500m * 60 + seconds_to_500m),
-                # spm, stroke/minute, int
-                'strokes_per_minute': spm,
-                # power, in watts, int
-                'instantaneous_power': watt,
-                # caloric burn rate, in kCal/hour, int
-                'calories_burn_rate': cal_per_hour,
-                # resistance level, in percentage, float
-                # this rower have 4 levels. 1/4 to 4/4
-                'resistance_level': level / 4
-            }
+    def write(self, message):
+        now = self.clock()
+        if self._start is None:
+            self._start = now
+        # latin-1 maps each byte to one char, unicode_escape then escapes the control and non-ascii chars.
+        escaped = message.decode('latin-1').encode('unicode_escape').decode('ascii')
+        self._file.write('%.3f\t%s\n' % (now - self._start, escaped))
+        self._file.flush()
 
-            return new_dict
+    def close(self):
+        self._file.close()
+
+
+def read_capture(path):
+    """Read a capture file, return a list of (seconds since the first message, message bytes)."""
+    messages = []
+    with open(path, encoding='ascii') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line:
+                continue
+            arrival, escaped = line.split('\t', 1)
+            messages.append((float(arrival), escaped.encode('ascii').decode('unicode_escape').encode('latin-1')))
+    return messages
+
+
+class ReplayReader(FDFReader):
+    """Replay captured raw FDF messages into a Rower, no rower attached.
+
+    The messages go through FDFReader._parse() and the Rower just like live ones, for load tests, benchmarks, and
+    to reproduce the issues of a field capture.
+
+    :param out_rower: the Rower to update.
+    :param capture: a capture file path (see CaptureWriter), or a sequence of (arrival time, message bytes).
+    :param speed: 1 for the original pace, N for N times faster, 0 for as fast as possible.
+    :param interval: None to replay at the captured arrival times, or seconds between messages, a virtual clock
+        which ignores the capture timing (a capture of bare lines has all its times at 0).
+    :param clock: monotonic clock for the pacing.
+    :param sleep: sleep function for the pacing, None to wait on the stop event, a close() ends a gap at once.
+    """
 
-        else:
-            # unexpected, not frame data.
-            # todo: handle the commands here, result with leading characters for command, is the result.
-            return None
+    def __init__(self, out_rower, capture, speed=1.0, interval=None, clock=time.monotonic, sleep=None):
+        super(ReplayReader, self).__init__(outbound_rower=out_rower, serial_device_address='')
+        self.messages = read_capture(capture) if isinstance(capture, str) else list(capture)
+        self.speed = speed
+        self.interval = interval
+        self.clock = clock
+        self.sleep = sleep
+
+        # replay stats: frames sent to the Rower, messages that are not a frame.
+        self.sent = 0
+        self.skipped = 0
+
+    def _thread_worker(self):
+        self.replay()
+
+    def replay(self):
+        """Replay all the messages in the calling thread, return the number of frames sent to the Rower."""
+        start = self.clock()
+        for index, (arrival, message) in enumerate(self.messages):
+            if self._stop_event.is_set():
+                break
+            if self.speed:
+                # due time from the start, not from the previous message, so the sleeps don't add up drift.
+                offset = index * self.interval if self.interval is not None else arrival
+                delay = start + offset / self.speed - self.clock()
+                if delay > 0:
+                    if self.sleep is None:
+                        if self._stop_event.wait(delay):
+                            break
+                    else:
+                        self.sleep(delay)
+
+            result_dict = self._parse(message)
+            if result_dict is None:
+                self.skipped += 1
+                continue
+            self._send(result_dict)
+            self.sent += 1
+        return self.sent
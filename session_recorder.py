@@ -0,0 +1,337 @@
+"""Binary session recorder
+
+SessionRecorder archives every frame of a Rower into an append-only binary file, SessionReader reads it back with
+random access by index, sequence number or time.
+
+File layout, all little-endian:
+    header:
+        magic           4s      b'RCSR'
+        version         H       1
+        record_size     H       size of one record in bytes
+        field_count     H       number of fields in a record, after seq and timestamp
+        run_id          8s      random id of the process that created the file
+        clock_offset    d       time.time() - time.monotonic() when the file is created, to get the wall clock time
+                                of a frame: clock_offset + timestamp
+        fields          field_count * (typecode 1s, name 31s), 'q' int64 or 'd' float64, name null padded
+    records, one per frame:
+        seq             q
+        timestamp       d       time.monotonic() of the frame
+        field values            in the header field order, missing values are -1 (int) or NaN (float)
+
+A file is only appended to by the process that created it (same run_id): the timestamps are time.monotonic() of
+that process, and the seq of its Rower, a file of another run is refused, as its records would no longer be sorted.
+
+The recorder subscribes to the Rower, the subscriber only puts the frame (immutable) into a queue, all the packing
+and the disk I/O is done in a background thread, in batches, so a slow SD card never stalls the serial thread.
+
+Usage:
+    recorder = SessionRecorder('session.rcs')
+    recorder.start(my_rower)
+    ...
+    recorder.close()
+
+    reader = SessionReader('session.rcs')
+    reader.frame_at(0), reader.find_seq(1234), reader.frames_between(t0, t1)
+
+"""
+
+import collections
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+from rower import FRAME_FIELD_TYPES, RowerFrame
+
+_logger = logging.getLogger("rowercast.session_recorder")
+
+MAGIC = b'RCSR'
+VERSION = 1
+
+# id of this process run, the time.monotonic() base and the Rower seq are only valid within one run.
+RUN_ID = os.urandom(8)
+
+_HEADER = struct.Struct('<4sHHH8sd')
+_FIELD = struct.Struct('<1s31s')
+
+# what a missing value is stored as, per typecode.
+_MISSING_VALUES = {
+    'q': -1,
+    'd': math.nan,
+}
+
+
+class SessionFileError(Exception):
+    pass
+
+
+def _record_struct(fields):
+    return struct.Struct('<qd' + ''.join(typecode for _, typecode in fields))
+
+
+def _is_missing(value, typecode):
+    if typecode == 'q':
+        return value == _MISSING_VALUES['q']
+    return math.isnan(value)
+
+
+def _read_header(f, path):
+    """Read the header of an open session file, return (run_id, clock_offset, record_size, fields, header size)."""
+    data = f.read(_HEADER.size)
+    if len(data) < _HEADER.size:
+        raise SessionFileError("Not a session file: " + path)
+    magic, version, record_size, field_count, run_id, clock_offset = _HEADER.unpack(data)
+    if magic != MAGIC or version != VERSION:
+        raise SessionFileError("Not a session file: " + path)
+    table = f.read(field_count * _FIELD.size)
+    if len(table) < field_count * _FIELD.size:
+        raise SessionFileError("Truncated session file header: " + path)
+    fields = []
+    for offset in range(0, len(table), _FIELD.size):
+        typecode, name = _FIELD.unpack_from(table, offset)
+        fields.append((name.rstrip(b'\0').decode('ascii'), typecode.decode('ascii')))
+    if _record_struct(fields).size != record_size:
+        raise SessionFileError("Session file record size doesn't match its fields: " + path)
+    return run_id, clock_offset, record_size, tuple(fields), _HEADER.size + len(table)
+
+
+class SessionRecorder:
+    """Append rower frames to a binary session file, from a background thread.
+
+    :param path: file to write, a new file is created, an existing file with the same fields is appended to.
+    :param fields: (name, typecode) of the recorded frame fields.
+    :param batch_size: frames packed and written at once.
+    :param flush_interval: seconds at most between a frame arriving and it being written.
+    :param fsync: also fsync() after each batch, for power loss safety, at the cost of SD card wear.
+    """
+
+    def __init__(self, path, fields=FRAME_FIELD_TYPES, batch_size=64, flush_interval=1.0, fsync=False):
+        self.path = path
+        self.fields = tuple(fields)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+
+        self._record = _record_struct(self.fields)
+        self._pending = collections.deque()
+        self._pending_cond = threading.Condition()
+        self._running = False
+        self._source = None
+        self._file = None
+        self.worker_thread = None
+        # number of frames written to the file by this recorder.
+        self.written = 0
+        # the exception that stopped the writer thread, None if fine.
+        self.error = None
+        # seq of the last frame in the file, frames must come after it.
+        self._last_seq = None
+
+    def start(self, source=None):
+        """Open the file and start the writer thread, subscribe to source (a Rower) if given."""
+        self._file = self._open()
+        if source is not None and self._last_seq is not None and source.get_current_frame().seq < self._last_seq:
+            self._file.close()
+            raise SessionFileError("Session file has frames after the current frame of the source: " + self.path)
+        self._running = True
+        self.worker_thread = threading.Thread(target=self._thread_worker, name="rowercast.recorder", daemon=True)
+        self.worker_thread.start()
+        if source is not None:
+            self._source = source
+            source.subscribe(self.add_frame)
+
+    def add_frame(self, frame):
+        """Queue a frame to be written, called from the data provider thread, never blocks on I/O."""
+        with self._pending_cond:
+            if not self._running:
+                # writer is closed or dead, drop the frame instead of queueing it forever.
+                return
+            self._pending.append(frame)
+            if len(self._pending) >= self.batch_size:
+                self._pending_cond.notify()
+
+    def close(self, timeout=None):
+        """Stop recording, write the queued frames, close the file."""
+        self._unsubscribe()
+        with self._pending_cond:
+            self._running = False
+            self._pending_cond.notify()
+        if self.worker_thread is not None:
+            self.worker_thread.join(timeout)
+
+    def _unsubscribe(self):
+        source = self._source
+        self._source = None
+        if source is not None:
+            source.unsubscribe(self.add_frame)
+
+    def _open(self):
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, 'rb') as f:
+                run_id, _, record_size, fields, header_size = _read_header(f, self.path)
+                # same run and same layout only, keep appending, the clock offset of the file is kept.
+                if run_id != RUN_ID:
+                    raise SessionFileError("Session file is from another run, not appending: " + self.path)
+                if record_size != self._record.size or fields != self.fields:
+                    raise SessionFileError("Existing session file has another layout: " + self.path)
+                size = os.path.getsize(self.path)
+                if (size - header_size) % record_size:
+                    raise SessionFileError("Existing session file has a partial record: " + self.path)
+                if size > header_size:
+                    f.seek(size - record_size)
+                    self._last_seq = self._record.unpack(f.read(record_size))[0]
+            return open(self.path, 'ab')
+        header = self._header()
+        f = open(self.path, 'wb')
+        f.write(header)
+        f.flush()
+        return f
+
+    def _header(self):
+        header = bytearray(_HEADER.pack(MAGIC, VERSION, self._record.size, len(self.fields), RUN_ID,
+                                        time.time() - time.monotonic()))
+        for name, typecode in self.fields:
+            header += _FIELD.pack(typecode.encode('ascii'), name.encode('ascii'))
+        return bytes(header)
+
+    def _thread_worker(self):
+        """Wait for a batch of frames, or the flush interval, pack and write them."""
+        buffer = bytearray()
+        try:
+            while True:
+                with self._pending_cond:
+                    if self._running and len(self._pending) < self.batch_size:
+                        self._pending_cond.wait(self.flush_interval)
+                    frames = self._pending
+                    self._pending = collections.deque()
+                    running = self._running
+
+                if frames:
+                    self._write(frames, buffer)
+                if not running:
+                    break
+        except Exception as e:
+            # full SD card, I/O error, ... stop recording, and say so, the frames from now on are dropped.
+            _logger.exception("Session recorder failed writing %s, recording stopped", self.path)
+            self.error = e
+            with self._pending_cond:
+                self._running = False
+                self._pending.clear()
+            self._unsubscribe()
+        finally:
+            self._file.close()
+
+    def _write(self, frames, buffer):
+        record = self._record
+        names = [name for name, _ in self.fields]
+        missing = [_MISSING_VALUES[typecode] for _, typecode in self.fields]
+        integer = [typecode == 'q' for _, typecode in self.fields]
+
+        # pack all the records into one buffer, one write() call per batch.
+        del buffer[:]
+        buffer.extend(bytes(record.size * len(frames)))
+        offset = 0
+        for frame in frames:
+            values = []
+            for name, missing_value, is_integer in zip(names, missing, integer):
+                value = getattr(frame, name)
+                if value is None:
+                    value = missing_value
+                elif is_integer:
+                    value = int(value)
+                values.append(value)
+            record.pack_into(buffer, offset, frame.seq, frame.timestamp, *values)
+            offset += record.size
+
+        self._file.write(buffer)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.written += len(frames)
+
+
+class SessionReader:
+    """Random access to a session file, memory-mapped, no read of the whole file.
+
+    Frames are found by index (0 is the first record), by seq and by time with binary search, both are ascending
+    in a recording.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise SessionFileError("Empty session file: " + path)
+
+        try:
+            self.run_id, self.clock_offset, record_size, self.fields, offset = _read_header(self._file, path)
+        except SessionFileError:
+            self.close()
+            raise
+        self._record = _record_struct(self.fields)
+        self._data_offset = offset
+        # a record being written at the moment of opening is ignored.
+        self._count = (len(self._map) - offset) // record_size
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def record_at(self, index):
+        """Raw record tuple: (seq, timestamp, field values...)."""
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return self._record.unpack_from(self._map, self._data_offset + index * self._record.size)
+
+    def frame_at(self, index):
+        record = self.record_at(index)
+        fields = {}
+        for (name, typecode), value in zip(self.fields, record[2:]):
+            # missing values, -1 or NaN, back to None.
+            if not _is_missing(value, typecode):
+                fields[name] = value
+        return RowerFrame(record[0], record[1], fields)
+
+    def wall_time_at(self, index):
+        """time.time() of the frame at index."""
+        return self.clock_offset + self.record_at(index)[1]
+
+    def find_seq(self, seq):
+        """Index of the frame with the given seq, None if not recorded."""
+        index = self._bisect(0, seq)
+        if index < self._count and self.record_at(index)[0] == seq:
+            return index
+        return None
+
+    def find_time(self, timestamp):
+        """Index of the first frame at or after the time.monotonic() timestamp."""
+        return self._bisect(1, timestamp)
+
+    def frames_between(self, start_time, end_time):
+        """Frames with start_time <= timestamp < end_time."""
+        return [self.frame_at(i) for i in range(self._bisect(1, start_time), self._bisect(1, end_time))]
+
+    def _bisect(self, column, value):
+        """Index of the first record whose column value is not less than value."""
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self.record_at(middle)[column] < value:
+                low = middle + 1
+            else:
+                high = middle
+        return low
@@ -0,0 +1,240 @@
+"""Physics based rower simulator
+
+Replaces the FakeRower for load tests: RowingSimulator models the stroke cycle of a rower, and sends frames to its
+Rower at any rate, up to kHz, on a drift-free schedule. SimulatorFleet runs many simulated rowers from one thread.
+
+The model, per stroke, at the strokes per minute and the 500m pace of the current interval:
+    - the average speed is 500 / pace, the average power is 2.8 * speed^3 watts, the Concept2 relation.
+    - the drive is the first DRIVE_RATIO of the stroke, the handle power follows the drive curve, sin() by default,
+      scaled to the average power over the stroke, the recovery has no power.
+    - the boat speed swings SPEED_SWING around the average, fastest at the end of the drive.
+    - the distance is the integral of that speed, exact over each step, whatever the frame rate.
+    - the caloric burn rate is 4 * 0.8604 * power + 300 kCal/hour, the Concept2 one.
+
+The spm and the pace of an interval can be numbers, or functions of the seconds into the interval, for curves.
+
+The frame time is the scheduled time, n / rate seconds since the start, so a late wake up delays a frame but doesn't
+skew the model, and the schedule doesn't drift: each due time is counted from the start, not from the last frame.
+
+Usage:
+    workout = [Interval(600, spm=20, pace=150), Interval(60, rest=True), Interval(240, spm=30, pace=105)]
+    simulator = RowingSimulator(my_rower, workout, rate=100)
+    simulator.start()
+
+    fleet = SimulatorFleet([RowingSimulator(Rower(), workout) for _ in range(32)], rate=1000)
+    fleet.start()
+
+"""
+
+import math
+import threading
+import time
+
+from serial_reader import BaseSerialReader
+
+# part of the stroke the drive takes, the rest is the recovery.
+DRIVE_RATIO = 1 / 3
+# boat speed swing around its average, over a stroke, +-10%.
+SPEED_SWING = 0.1
+# samples to average the drive curve over.
+_CURVE_SAMPLES = 1000
+
+
+def sine_drive_curve(x):
+    """Handle force over the drive, x from 0 to 1, a smooth rise and fall."""
+    return math.sin(math.pi * x)
+
+
+def run_schedule(rate, step, stop_event, clock=time.monotonic):
+    """Call step(seconds since the start) rate times a second, until stop_event is set or step() returns False.
+
+    Each due time is start + n / rate, a late call doesn't delay the next ones. Return the number of late calls.
+    """
+    late = 0
+    start = clock()
+    n = 0
+    while not stop_event.is_set():
+        n += 1
+        delay = start + n / rate - clock()
+        if delay > 0:
+            if stop_event.wait(delay):
+                break
+        else:
+            late += 1
+        if step(n / rate) is False:
+            break
+    return late
+
+
+class Interval:
+    """A part of a workout: duration in seconds, None for no end, strokes per minute and 500m pace in seconds.
+
+    spm and pace can be numbers, or functions of the seconds into the interval. A rest interval has no strokes.
+    """
+
+    def __init__(self, duration=None, spm=24, pace=120, rest=False):
+        self.duration = duration
+        self.spm = spm if callable(spm) else (lambda t, value=spm: value)
+        self.pace = pace if callable(pace) else (lambda t, value=pace: value)
+        self.rest = rest
+
+
+class RowingSimulator(BaseSerialReader):
+    """Simulated rower, substitutable with a serial reader, sends rate frames a second to the Rower.
+
+    :param out_rower: the Rower to update.
+    :param intervals: the workout, a list of Interval, one steady endless interval by default.
+    :param rate: frames a second.
+    :param drive_curve: handle force over the drive, function of 0 to 1.
+    :param resistance_level: sent as is, 0 to 1.
+    """
+
+    # the frames are built here, from numbers, all the schema fields are there and valid.
+    trusted_source = True
+
+    def __init__(self, out_rower, intervals=None, rate=1.0, drive_curve=sine_drive_curve, resistance_level=0.5,
+                 clock=time.monotonic):
+        super(RowingSimulator, self).__init__(outbound_rower=out_rower, serial_device_address='')
+        self.intervals = list(intervals) if intervals else [Interval()]
+        self.rate = rate
+        self.drive_curve = drive_curve
+        self.resistance_level = resistance_level
+        self.clock = clock
+        # handle power is the average power * drive_curve() / _power_norm, the mean of the curve over a stroke.
+        self._power_norm = DRIVE_RATIO * sum(drive_curve((i + 0.5) / _CURVE_SAMPLES)
+                                             for i in range(_CURVE_SAMPLES)) / _CURVE_SAMPLES
+
+        # model state: simulated seconds, meters, stroke phase 0 to 1, current interval and its start time.
+        self.time = 0.0
+        self.distance = 0.0
+        self.phase = 0.0
+        self.interval_index = 0
+        self.interval_start = 0.0
+        self.finished = False
+
+        # frames sent, and the ones sent late, behind the schedule.
+        self.frames = 0
+        self.late = 0
+
+    def _connect(self, ser):
+        pass
+
+    def _read_message(self, ser):
+        pass
+
+    def _parse(self, ser_bytes):
+        pass
+
+    def _thread_worker(self):
+        self.late += run_schedule(self.rate, self.step, self._stop_event, self.clock)
+
+    def step(self, seconds):
+        """Move the model to seconds since the start and send its frame, return False once the workout is over."""
+        frame = self.advance(seconds)
+        if frame is None:
+            return False
+        self._send(frame)
+        self.frames += 1
+        return True
+
+    def advance(self, seconds):
+        """Move the model to seconds since the start, return its frame dict, None once the workout is over."""
+        if self.finished:
+            return None
+        interval = self.intervals[self.interval_index]
+        while interval.duration is not None and seconds - self.interval_start >= interval.duration:
+            # up to the end of the interval, then the next one, its frames start a new interval in the metrics.
+            self._integrate(self.interval_start + interval.duration)
+            self.interval_start += interval.duration
+            self.interval_index += 1
+            if self.interval_index == len(self.intervals):
+                self.finished = True
+                return None
+            interval = self.intervals[self.interval_index]
+            self.receiver.metrics.start_new_interval()
+        return self._integrate(seconds)
+
+    def _integrate(self, seconds):
+        interval = self.intervals[self.interval_index]
+        dt = seconds - self.time
+        if interval.rest:
+            spm = 0
+            average_speed = 0.0
+            speed = 0.0
+            average_power = 0.0
+            power = 0.0
+        else:
+            # the curves at the middle of the step.
+            t = (self.time + seconds) / 2 - self.interval_start
+            spm = interval.spm(t)
+            average_speed = 500 / interval.pace(t)
+            average_power = 2.8 * average_speed ** 3
+            phase = self.phase + spm / 60 * dt
+            # speed = average * (1 + swing * cos(2pi (phase - DRIVE_RATIO))), integrated over the step.
+            swing = 0.0
+            if spm:
+                swing = (math.sin(2 * math.pi * (phase - DRIVE_RATIO)) -
+                         math.sin(2 * math.pi * (self.phase - DRIVE_RATIO))) * 60 / (2 * math.pi * spm)
+            self.distance += average_speed * (dt + SPEED_SWING * swing)
+            self.phase = phase % 1.0
+            speed = average_speed * (1 + SPEED_SWING * math.cos(2 * math.pi * (self.phase - DRIVE_RATIO)))
+            if self.phase < DRIVE_RATIO:
+                power = average_power * self.drive_curve(self.phase / DRIVE_RATIO) / self._power_norm
+            else:
+                power = 0.0
+        self.time = seconds
+
+        return {
+            'total_elapsed_time': int(seconds),
+            'total_distance_traveled': int(self.distance),
+            'instantaneous_speed': speed,
+            'strokes_per_minute': int(round(spm)),
+            'instantaneous_power': int(power),
+            'calories_burn_rate': int(4 * 0.8604 * average_power + 300),
+            'resistance_level': self.resistance_level
+        }
+
+
+class SimulatorFleet:
+    """Run many RowingSimulator from one thread, all their frames on one schedule of rate ticks a second.
+
+    The rate of each simulator is not used. The fleet stops when all the workouts are over, or on close().
+    """
+
+    def __init__(self, simulators, rate=1.0, clock=time.monotonic):
+        self.simulators = list(simulators)
+        self.rate = rate
+        self.clock = clock
+        # ticks behind the schedule.
+        self.late = 0
+        self._stop_event = threading.Event()
+        self.worker_thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        self.worker_thread = threading.Thread(target=self._thread_worker, name="rowercast.simulator_fleet",
+                                              daemon=True)
+        self.worker_thread.start()
+
+    def close(self, timeout=None):
+        """Stop the thread, wait for it up to timeout seconds, return True if it's stopped."""
+        self._stop_event.set()
+        if self.worker_thread is not None:
+            self.worker_thread.join(timeout)
+            return not self.worker_thread.is_alive()
+        return True
+
+    @property
+    def frames(self):
+        return sum(simulator.frames for simulator in self.simulators)
+
+    def _thread_worker(self):
+        self.late += run_schedule(self.rate, self.step, self._stop_event, self.clock)
+
+    def step(self, seconds):
+        """Step all the simulators to seconds since the start, return False once all their workouts are over."""
+        running = False
+        for simulator in self.simulators:
+            if simulator.step(seconds):
+                running = True
+        return running
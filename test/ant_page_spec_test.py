@@ -0,0 +1,95 @@
+"""Unittest for the declarative ant+ data pages"""
+import unittest
+from collections import OrderedDict
+from types import MappingProxyType
+
+from ant_page_spec import *
+from rower import RowerFrame
+
+
+class PageSpecTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fields = {
+            'total_elapsed_time': 1255,
+            'total_distance_traveled': 2789,
+            'instantaneous_speed': 4.047,
+            'strokes_per_minute': 32,
+            'instantaneous_power': 652,
+            'calories_burn_rate': 673,
+            'resistance_level': 0.15
+        }
+
+    def test_encode(self):
+        self.assertEqual(PAGE_16.encode(self.fields),
+                         bytes([16, 176, (1255 % 64) * 4, 2789 % 256, 4047 & 0xFF, 4047 >> 8, 0xFF, 38]))
+        self.assertEqual(PAGE_17.encode(self.fields), bytes([17, 0xFF, 0xFF, 0xFF, 0x7F, 0xFF, 30, 6]))
+        self.assertEqual(PAGE_18.encode(self.fields), bytes([18, 0xFF, 0xFF, 0xFF, 6730 & 0xFF, 6730 >> 8, 0, 6]))
+        self.assertEqual(PAGE_22.encode(self.fields), bytes([22, 0xFF, 0xFF, 0, 32, 652 & 0xFF, 652 >> 8, 6]))
+        self.assertEqual(PAGE_80.encode(), bytes([80, 0xFF, 0xFF, 10, 0xFF, 0, 1, 0]))
+        self.assertEqual(PAGE_81.encode(), bytes([81, 0xFF, 0xFF, 1, 0xFF, 0xFF, 0xFF, 0xFF]))
+
+    def test_frame_source(self):
+        # a frame reads as the dict, the missing fields are invalid or their default.
+        frame = RowerFrame.from_mapping({'total_elapsed_time': 10, 'total_distance_traveled': 300,
+                                         'instantaneous_speed': 4.0})
+        self.assertEqual(PAGE_22.encode(frame), bytes([22, 0xFF, 0xFF, 0, 0xFF, 0xFF, 0xFF, 6]))
+        self.assertEqual(PAGE_17.encode(frame)[6], 200)
+        self.assertEqual(PAGE_16.encode(frame)[2:4], bytes([40, 300 % 256]))
+
+    def test_mapping_source(self):
+        # any Mapping is read by key, a dict subclass or a read-only view, not by attribute.
+        payload = PAGE_22.encode(self.fields)
+        self.assertEqual(PAGE_22.encode(OrderedDict(self.fields)), payload)
+        self.assertEqual(PAGE_22.encode(MappingProxyType(self.fields)), payload)
+        self.assertEqual(PAGE_22.encode(MappingProxyType({})), bytes([22, 0xFF, 0xFF, 0, 0xFF, 0xFF, 0xFF, 6]))
+
+    def test_decode(self):
+        self.assertEqual(decode_page(PAGE_22.encode(self.fields)),
+                         (22, {'stroke_count': 0, 'strokes_per_minute': 32, 'instantaneous_power': 652,
+                               'capabilities_fe_state': 6}))
+        _, fields = decode_page(PAGE_16.encode(self.fields))
+        # rolled over.
+        self.assertEqual(fields['total_elapsed_time'], 1255 % 64)
+        self.assertEqual(fields['total_distance_traveled'], 2789 % 256)
+        self.assertEqual(fields['instantaneous_speed'], 4.047)
+        self.assertIsNone(fields['heart_rate'])
+        self.assertEqual(decode_page(PAGE_18.encode({}))[1]['calories_burn_rate'], None)
+        with self.assertRaises(PageSpecError):
+            decode_page(bytes([99, 0, 0, 0, 0, 0, 0, 0]))
+        with self.assertRaises(PageSpecError):
+            PAGE_16.decode(PAGE_22.encode(self.fields))
+
+    def test_page_54(self):
+        payload = PAGE_54.encode({'maximum_resistance': 400, 'capabilities': 0x01})
+        self.assertEqual(payload, bytes([54, 0xFF, 0xFF, 0xFF, 0xFF, 400 & 0xFF, 400 >> 8, 0x01]))
+        self.assertEqual(PAGE_54.decode(payload), {'maximum_resistance': 400, 'capabilities': 1})
+        self.assertEqual(PAGE_54.encode({}), bytes([54, 0xFF, 0xFF, 0xFF, 0xFF, 0, 0, 0]))
+
+    def test_page_71(self):
+        self.assertEqual(PAGE_71.encode(), bytes([71] + [0xFF] * 7))
+        payload = PAGE_71.encode({'last_command': 48, 'sequence_number': 3, 'command_status': 0,
+                                  'response_data': 0xFFFFFF28})
+        self.assertEqual(payload, bytes([71, 48, 3, 0, 0x28, 0xFF, 0xFF, 0xFF]))
+        self.assertEqual(PAGE_71.decode(payload)['sequence_number'], 3)
+
+    def test_out_of_range(self):
+        with self.assertRaises(PageSpecError):
+            PAGE_22.encode({'strokes_per_minute': 255})
+        with self.assertRaises(PageSpecError):
+            PAGE_17.encode({'resistance_level': 1.5})
+        with self.assertRaises(PageSpecError):
+            # no invalid value for the time.
+            PAGE_16.encode({'total_distance_traveled': 10, 'instantaneous_speed': 1.0})
+
+    def test_bad_specs(self):
+        with self.assertRaises(PageSpecError):
+            PageField('three_bytes', 1, width=3)
+        with self.assertRaises(PageSpecError):
+            PageField('past_the_end', 7, width=2)
+        with self.assertRaises(PageSpecError):
+            PageSpec(99, [PageField('a', 2, width=2), PageField('b', 3)])
+
+
+if __name__ == '__main__':
+    unittest.main()
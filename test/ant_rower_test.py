@@ -1,7 +1,11 @@
 """Unittest for ant+ FE broadcasting"""
+import array
 import unittest
 
 from ant_rower import *
+from ant.base.ant import TxFrame
+from ant.base.message import Message
+from frame_extrapolator import FrameExtrapolator
 
 
 class DataPageTestGood(unittest.TestCase):
@@ -232,3 +236,224 @@ class DataPageTestMinimum(unittest.TestCase):
         # msb, should be 0x00
         self.assertEqual(page_bytes[6], 0xFF)
         self.assertEqual(page_bytes[7], 6)
+
+
+class _FakeNode:
+
+    def __init__(self):
+        self.stop_timeouts = []
+
+    def stop(self, timeout=None):
+        self.stop_timeouts.append(timeout)
+        return True
+
+
+class AntRowerCloseTest(unittest.TestCase):
+
+    def test_close(self):
+        ant_rower = AntRower(Rower(), {})
+        # never started.
+        self.assertTrue(ant_rower.close(timeout=1))
+        ant_rower.node = _FakeNode()
+        self.assertTrue(ant_rower.close(timeout=1))
+        self.assertEqual(ant_rower.node.stop_timeouts, [1])
+        self.assertTrue(ant_rower._stop_event.is_set())
+
+
+class AntRowerPageCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rower = Rower(history_capacity=0)
+        self.rower.on_update_data({'total_elapsed_time': 10, 'total_distance_traveled': 40,
+                                   'instantaneous_speed': 4.0, 'strokes_per_minute': 24, 'instantaneous_power': 200})
+
+    def test_pages_built_once_per_frame(self):
+        ant_rower = AntRower(self.rower, {'TRANSMISSION_TYPE': 'c'})
+        pages = [ant_rower._get_next_page() for _ in range(8)]
+        # 16 16 22 17 16 16 18 22, one page object of each kind for the frame.
+        self.assertIs(pages[0], pages[1])
+        self.assertIs(pages[0], pages[4])
+        self.assertIs(pages[2], pages[7])
+        self.assertEqual(pages[2].to_payload()[4], 24)
+
+        self.rower.on_update_data({'total_elapsed_time': 11, 'total_distance_traveled': 44,
+                                   'instantaneous_speed': 4.0, 'strokes_per_minute': 26, 'instantaneous_power': 210})
+        page = ant_rower._get_next_page()
+        self.assertIsNot(page, pages[0])
+        self.assertEqual(page.to_payload()[3], 44)
+
+    def test_projected_frames(self):
+        ant_rower = AntRower(FrameExtrapolator(self.rower), {'TRANSMISSION_TYPE': 'b'})
+        pages = [ant_rower._get_next_page() for _ in range(4)]
+        # a new projected frame for each page 16, the page 22 of the same frame seq is kept.
+        self.assertIsNot(pages[0], pages[1])
+        self.assertIs(pages[2], pages[3])
+
+
+class TransmissionPatternTest(unittest.TestCase):
+
+    def test_builtin_patterns(self):
+        self.assertEqual(len(TRANSMISSION_PATTERNS['a']), 132)
+        self.assertEqual(len(TRANSMISSION_PATTERNS['b']), 132)
+        self.assertEqual(len(TRANSMISSION_PATTERNS['c']), 132)
+        # the 20 page sequence goes on over the common pages, 5 cycles to come back to its start.
+        self.assertEqual(len(TRANSMISSION_PATTERNS['d']), 660)
+        for schedule in TRANSMISSION_PATTERNS.values():
+            validate_pattern(schedule)
+
+        schedule = TRANSMISSION_PATTERNS['c']
+        self.assertEqual(schedule[:8], (16, 16, 22, 17, 16, 16, 18, 22))
+        self.assertEqual(schedule[62:68], (18, 22, 80, 80, 16, 16))
+        self.assertEqual(schedule[66:74], (16, 16, 17, 22, 16, 16, 22, 18))
+        self.assertEqual(schedule[128:132], (22, 18, 81, 81))
+
+    def test_pattern_d_resumes(self):
+        schedule = TRANSMISSION_PATTERNS['d']
+        sequence = (16, 22, 22, 22, 22, 16, 22, 22, 22, 18, 16, 22, 22, 22, 22, 16, 22, 22, 22, 17)
+        data_pages = [page_id for page_id in schedule if page_id not in (80, 81)]
+        self.assertEqual(data_pages, list(sequence) * 32)
+        # 64 data pages, the sequence is at its 5th page after the page 80.
+        self.assertEqual(schedule[64:67], (80, 80, sequence[4]))
+
+    def test_get_next_page(self):
+        ant_rower = AntRower(Rower(history_capacity=0), {'TRANSMISSION_TYPE': 'b'})
+        pages = [ant_rower._get_next_page() for _ in range(134)]
+        self.assertEqual([page.to_payload()[0] for page in pages[:4]], [16, 16, 22, 22])
+        self.assertIs(pages[64], ant_rower.page_80)
+        self.assertIs(pages[65], ant_rower.page_80)
+        self.assertIs(pages[131], ant_rower.page_81)
+        # rolled over.
+        self.assertEqual(pages[132].to_payload()[0], 16)
+
+    def test_unknown_pattern(self):
+        with self.assertRaises(TransmissionPatternError):
+            AntRower(Rower(history_capacity=0), {'TRANSMISSION_TYPE': 'z'})
+
+    def test_weighted_pattern(self):
+        sequence = weighted_data_pages({16: 2, 22: 1, 18: 1})
+        self.assertEqual(sorted(sequence), [16, 16, 18, 22])
+        # the two 16 are apart.
+        self.assertNotEqual(sequence.index(16) + 1, sequence.index(16, sequence.index(16) + 1))
+
+        try:
+            schedule = register_transmission_pattern('weighted', build_pattern(sequence))
+            ant_rower = AntRower(Rower(history_capacity=0), {'TRANSMISSION_TYPE': 'weighted'})
+            self.assertEqual([ant_rower._get_next_page().to_payload()[0] for _ in range(4)], list(schedule[:4]))
+        finally:
+            TRANSMISSION_PATTERNS.pop('weighted', None)
+
+    def test_invalid_patterns(self):
+        good = list(TRANSMISSION_PATTERNS['b'])
+        with self.assertRaises(TransmissionPatternError):
+            register_transmission_pattern('short', good[:-1])
+        with self.assertRaises(TransmissionPatternError):
+            register_transmission_pattern('no_80', good[:64] + [16, 16] + good[66:])
+        with self.assertRaises(TransmissionPatternError):
+            register_transmission_pattern('unknown_page', [25] + good[1:])
+        with self.assertRaises(TransmissionPatternError):
+            # no page 16 in the second half.
+            register_transmission_pattern('no_16', build_pattern([16] * 64 + [22] * 64))
+        with self.assertRaises(TransmissionPatternError):
+            build_pattern([])
+        self.assertNotIn('short', TRANSMISSION_PATTERNS)
+
+
+class _FakeChannel:
+
+    def __init__(self):
+        self.tx_frame = TxFrame(0)
+        self.sent = []
+
+    def get_tx_frame(self):
+        return self.tx_frame
+
+    def send_tx_frame(self, tx_frame):
+        self.sent.append(bytes(tx_frame.buffer))
+
+
+class AntRowerTxFrameTest(unittest.TestCase):
+
+    def test_on_tx_event(self):
+        my_rower = Rower(history_capacity=0)
+        my_rower.on_update_data({'total_elapsed_time': 10, 'total_distance_traveled': 40,
+                                 'instantaneous_speed': 4.0, 'strokes_per_minute': 24, 'instantaneous_power': 200})
+        ant_rower = AntRower(my_rower, {'TRANSMISSION_TYPE': 'b'})
+        ant_rower.channel = _FakeChannel()
+        ant_rower._tx_frame = ant_rower.channel.get_tx_frame()
+        for _ in range(4):
+            ant_rower.on_tx_event(None)
+        self.assertEqual([message[4] for message in ant_rower.channel.sent], [16, 16, 22, 22])
+        for message in ant_rower.channel.sent:
+            Message.parse(array.array('B', message))
+        # the page packed in place is its payload.
+        page = DataPage22(my_rower.get_current_frame())
+        self.assertEqual(ant_rower.channel.sent[-1][4:12], bytes(page.to_payload()))
+
+
+class AdaptivePagesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rower = Rower(history_capacity=0)
+        self.fields = {'total_elapsed_time': 10, 'total_distance_traveled': 40, 'instantaneous_speed': 4.0,
+                       'strokes_per_minute': 24, 'instantaneous_power': 200, 'calories_burn_rate': 900,
+                       'resistance_level': 0.5}
+        self.rower.on_update_data(dict(self.fields))
+
+    def _page_ids(self, ant_rower, count):
+        return [ant_rower._get_next_page().to_payload()[0] for _ in range(count)]
+
+    def test_changed_page_first(self):
+        ant_rower = AntRower(self.rower, {'TRANSMISSION_TYPE': 'c', 'ADAPTIVE_PAGES': True})
+        # the first frame, all fresh, then the pattern.
+        self.assertEqual(self._page_ids(ant_rower, 16), [16, 16, 22, 17, 16, 16, 18, 22] * 2)
+
+        # the resistance changed, page 17 is sent in the next data slot, the one of page 22, which takes the slot of
+        # page 17 back.
+        self.rower.on_update_data(dict(self.fields, total_elapsed_time=11, resistance_level=0.75))
+        self.assertEqual(self._page_ids(ant_rower, 8), [16, 16, 17, 22, 16, 16, 18, 22])
+        # the power changed too, page 22 keeps its slot on a tie.
+        self.rower.on_update_data(dict(self.fields, total_elapsed_time=12, resistance_level=1.0,
+                                       instantaneous_power=210))
+        self.assertEqual(self._page_ids(ant_rower, 8), [16, 16, 22, 17, 16, 16, 18, 22])
+        self.assertFalse(ant_rower._owed_pages or ant_rower._early_pages)
+
+    def test_one_frame_per_tick(self):
+        # the frame is fetched once per tick, a FrameExtrapolator projects a new one on each call.
+        calls = []
+        get_current_frame = self.rower.get_current_frame
+
+        def counted():
+            calls.append(1)
+            return get_current_frame()
+
+        self.rower.get_current_frame = counted
+        ant_rower = AntRower(self.rower, {'TRANSMISSION_TYPE': 'c', 'ADAPTIVE_PAGES': True})
+        self._page_ids(ant_rower, 8)
+        self.assertEqual(len(calls), 8)
+
+    def test_fixed_pattern(self):
+        ant_rower = AntRower(self.rower, {'TRANSMISSION_TYPE': 'c'})
+        self._page_ids(ant_rower, 8)
+        self.rower.on_update_data(dict(self.fields, total_elapsed_time=11, resistance_level=0.75))
+        self.assertEqual(self._page_ids(ant_rower, 4), [16, 16, 22, 17])
+
+    def test_no_starvation(self):
+        ant_rower = AntRower(self.rower, {'TRANSMISSION_TYPE': 'c', 'ADAPTIVE_PAGES': True})
+        page_ids = []
+        # power and calories change on each frame, a frame every 4 pages.
+        for second in range(1, 9):
+            self.rower.on_update_data(dict(self.fields, total_elapsed_time=10 + second,
+                                           instantaneous_power=200 + second, calories_burn_rate=900 + second))
+            page_ids += self._page_ids(ant_rower, 4)
+        # page 17 keeps a slot of its own, every other one at least.
+        self.assertGreaterEqual(page_ids.count(17), 2)
+        self.assertEqual(page_ids.count(16), 16)
+        self.assertEqual(page_ids[:8], [16, 16, 22, 17, 16, 16, 18, 22])
+
+    def test_pattern_pages_only(self):
+        ant_rower = AntRower(self.rower, {'TRANSMISSION_TYPE': 'b', 'ADAPTIVE_PAGES': True})
+        self._page_ids(ant_rower, 8)
+        self.rower.on_update_data(dict(self.fields, total_elapsed_time=11, resistance_level=0.75))
+        # page 17 isn't in the pattern b, nothing changes, the common pages included.
+        schedule = TRANSMISSION_PATTERNS['b']
+        self.assertEqual(self._page_ids(ant_rower, 132), list(schedule[8:] + schedule[:8]))
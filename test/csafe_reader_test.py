@@ -0,0 +1,118 @@
+import unittest
+
+import rower
+from csafe_reader import (GET_HORIZONTAL, GET_PACE, GET_POWER, CSAFEFrameError, CSAFEReader, csafe_frame,
+                          csafe_unframe, decode_csafe_response)
+
+
+class _FakeMonitor:
+    """A CSAFE console on a serial port, each request frame gets its response frame."""
+
+    # code: data of the reply, 12:34, 2500 m, 120 s/km, 28 spm, 241 W.
+    DATA = {
+        0xA0: bytes([0, 12, 34]),
+        0xA1: (2500).to_bytes(2, 'little') + b'\x24',
+        0xA6: (120).to_bytes(2, 'little') + b'\x39',
+        0xA7: (28).to_bytes(2, 'little') + b'\x54',
+        0xB4: (241).to_bytes(2, 'little') + b'\x58',
+    }
+
+    def __init__(self):
+        # read timeout of the port, and the function told of the seconds a read is blocked for, None for no block.
+        self.timeout = 1
+        self.on_wait = None
+        self.requests = []
+        self._output = b''
+
+    def write(self, data):
+        self.requests.append(csafe_unframe(data))
+        contents = bytearray([0x01])
+        for code in self.requests[-1]:
+            contents += bytes([code, len(self.DATA[code])]) + self.DATA[code]
+        # noise before the frame, dropped by the reader.
+        self._output += b'\x00' + csafe_frame(contents)
+
+    @property
+    def in_waiting(self):
+        return len(self._output)
+
+    def read(self, size=1):
+        if not self._output and self.on_wait is not None:
+            # nothing to read, blocked for the read timeout.
+            self.on_wait(self.timeout)
+        data, self._output = self._output[:size], self._output[size:]
+        return data
+
+
+class CSAFEFrameTestCase(unittest.TestCase):
+
+    def test_stuffing(self):
+        contents = bytes([0xA1, 0xF0, 0xF1, 0xF2, 0xF3, 0x00])
+        frame = csafe_frame(contents)
+        # no frame byte inside the frame.
+        self.assertNotIn(0xF1, frame[1:])
+        self.assertNotIn(0xF2, frame[:-1])
+        self.assertEqual(csafe_unframe(frame), contents)
+
+    def test_bad_frames(self):
+        frame = bytearray(csafe_frame(b'\xa1\xa6'))
+        frame[1] ^= 0x01
+        with self.assertRaises(CSAFEFrameError):
+            csafe_unframe(bytes(frame))
+        with self.assertRaises(CSAFEFrameError):
+            csafe_unframe(b'\xf1\xa1')
+        with self.assertRaises(CSAFEFrameError):
+            decode_csafe_response(b'\x01\xa1\x03\x00')
+
+
+class CSAFEReaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.rower = rower.Rower(history_capacity=0)
+        self.reader = CSAFEReader(self.rower, '', clock=lambda: self.now)
+        self.monitor = _FakeMonitor()
+
+    def _round(self):
+        self.reader._handle_messages(self.reader._read_messages(self.monitor))
+        self.now += self.reader.poll_interval
+
+    def _wait(self, seconds):
+        self.now += seconds
+
+    def test_reply_timeout(self):
+        # no reply, the reads wait up to the reply deadline, not for the 1 second timeout of the port.
+        self.monitor.write = lambda data: None
+        self.monitor.on_wait = self._wait
+        self.assertEqual(self.reader._read_messages(self.monitor), [])
+        self.assertEqual(self.reader.timeouts, 1)
+        self.assertAlmostEqual(self.now, self.reader.REPLY_TIMEOUT)
+
+    def test_batched_polling(self):
+        self._round()
+        # all the queries of the round in one frame, one round trip.
+        self.assertEqual(self.monitor.requests, [bytes([0xA0, 0xA1, 0xA6, 0xA7, 0xB4])])
+        frame = self.rower.get_current_frame()
+        self.assertEqual(frame['total_elapsed_time'], 754)
+        self.assertEqual(frame['total_distance_traveled'], 2500)
+        self.assertAlmostEqual(frame['instantaneous_speed'], 1000 / 120)
+        self.assertEqual(frame['strokes_per_minute'], 28)
+        self.assertEqual(frame['instantaneous_power'], 241)
+
+        # the stroke rate and power every other round, their last values in the frames between.
+        self._round()
+        self.assertEqual(self.monitor.requests[1], bytes([0xA0, 0xA1, 0xA6]))
+        self.assertEqual(self.rower.get_current_frame()['instantaneous_power'], 241)
+        self.assertEqual(self.reader.rounds, 2)
+
+    def test_batch_size(self):
+        reader = CSAFEReader(self.rower, '')
+        sizes = [reader._query_size(command) for command, _ in reader.queries]
+        self.assertLessEqual(sum(sizes) + 4, 120)
+        self.assertEqual(reader._query_size(GET_HORIZONTAL), 5)
+        self.assertEqual(GET_PACE.decode(b'\x00\x00\x39'), {'instantaneous_speed': 0.0})
+        self.assertEqual(GET_POWER.decode(b'\x10\x01\x58'), {'instantaneous_power': 272})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import time
+import unittest
+
+import rower
+from fdf_emulator import FDFEmulator
+from serial_discovery import probe_fdf_port
+from serial_reader import FDFReader
+from simulator import Interval, RowingSimulator
+
+
+def _wait_for_frame(my_rower, condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    frame = my_rower.get_current_frame()
+    while not condition(frame):
+        frame = my_rower.wait_for_update(frame.seq, max(0, deadline - time.monotonic()))
+        if frame is None:
+            raise AssertionError("Timed out")
+    return frame
+
+
+class FDFEmulatorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.rower = rower.Rower(history_capacity=0)
+
+    def test_reader(self):
+        with FDFEmulator(rate=20) as emulator:
+            reader = FDFReader(self.rower, emulator.device)
+            reader.start()
+            try:
+                frame = _wait_for_frame(self.rower, lambda frame: frame['strokes_per_minute'] == 24)
+                self.assertEqual(frame['instantaneous_power'], 200)
+                self.assertEqual(frame['resistance_level'], 0.25)
+
+                # the commands, with the frames still coming.
+                self.assertEqual(reader.set_level(3).result(timeout=2), 3)
+                self.assertEqual(reader.read_version().result(timeout=2), '1161016')
+                _wait_for_frame(self.rower, lambda frame: frame['resistance_level'] == 0.75)
+            finally:
+                self.assertTrue(reader.close(timeout=2))
+            self.assertEqual(emulator.commands[:2], [b'C', b'R'])
+            self.assertIn(b'L3', emulator.commands)
+
+    def test_source(self):
+        simulator = RowingSimulator(rower.Rower(history_capacity=0), [Interval(spm=30, pace=100)])
+        with FDFEmulator(rate=50, source=simulator.advance) as emulator:
+            reader = FDFReader(self.rower, emulator.device)
+            reader.start()
+            try:
+                frame = _wait_for_frame(self.rower, lambda frame: frame['total_distance_traveled'] >= 2)
+                self.assertEqual(frame['strokes_per_minute'], 30)
+            finally:
+                reader.close(timeout=2)
+        self.assertGreater(emulator.frames, 0)
+
+    def test_probe(self):
+        with FDFEmulator() as emulator:
+            self.assertTrue(probe_fdf_port(emulator.device, timeout=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import rower
+import fit_encoder
+from fit_encoder import FitActivityEncoder, crc_combine, fit_crc
+
+
+def _reference_crc(data):
+    # the nibble table algorithm of the FIT SDK.
+    table = [0x0000, 0xCC01, 0xD801, 0x1400, 0xF001, 0x3C00, 0x2800, 0xE401,
+             0xA001, 0x6C00, 0x7800, 0xB401, 0x5000, 0x9C01, 0x8801, 0x4400]
+    crc = 0
+    for byte in data:
+        tmp = table[crc & 0xF]
+        crc = (crc >> 4) & 0x0FFF
+        crc = crc ^ tmp ^ table[byte & 0xF]
+        tmp = table[crc & 0xF]
+        crc = (crc >> 4) & 0x0FFF
+        crc = crc ^ tmp ^ table[(byte >> 4) & 0xF]
+    return crc
+
+
+def _decode(data):
+    """Decode the data messages of a FIT file, [(global number, {field number: value})]."""
+    header_size = data[0]
+    data_size = struct.unpack_from('<I', data, 4)[0]
+    offset = header_size
+    definitions = {}
+    messages = []
+    while offset < header_size + data_size:
+        record_header = data[offset]
+        offset += 1
+        local_type = record_header & 0x0F
+        if record_header & 0x40:
+            global_number, field_count = struct.unpack_from('<HB', data, offset + 2)
+            offset += 5
+            fields = []
+            for _ in range(field_count):
+                number, size, _ = struct.unpack_from('<BBB', data, offset)
+                offset += 3
+                fields.append((number, {1: 'B', 2: 'H', 4: 'I'}[size]))
+            definitions[local_type] = (global_number, fields)
+        else:
+            global_number, fields = definitions[local_type]
+            values = {}
+            for number, fmt in fields:
+                values[number] = struct.unpack_from('<' + fmt, data, offset)[0]
+                offset += struct.calcsize(fmt)
+            messages.append((global_number, values))
+    return messages
+
+
+class FitEncoderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'session.fit')
+        self.rower = rower.Rower(history_capacity=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _row(self, start, count):
+        for i in range(start, start + count):
+            self.rower.on_update_data({
+                'total_elapsed_time': i,
+                'total_distance_traveled': i * 3,
+                'instantaneous_speed': 3.0,
+                'instantaneous_power': 150 + i,
+                'strokes_per_minute': 28
+            })
+
+    def test_crc(self):
+        data = bytes(range(256)) * 3
+        self.assertEqual(fit_crc(data), _reference_crc(data))
+        # continued and combined CRC are the same as in one go.
+        self.assertEqual(fit_crc(data[100:], fit_crc(data[:100])), fit_crc(data))
+        self.assertEqual(crc_combine(fit_crc(data[:100]), fit_crc(data[100:]), len(data) - 100), fit_crc(data))
+
+    def test_activity_file(self):
+        encoder = FitActivityEncoder(self.path)
+        encoder.start(self.rower)
+        self._row(0, 10)
+        self.rower.metrics.start_new_interval()
+        self._row(10, 5)
+        encoder.finish()
+
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        # header, its CRC, and the file CRC over everything.
+        self.assertEqual(data[8:12], b'.FIT')
+        self.assertEqual(struct.unpack_from('<I', data, 4)[0], len(data) - 14 - 2)
+        self.assertEqual(fit_crc(data[:12]), struct.unpack_from('<H', data, 12)[0])
+        self.assertEqual(fit_crc(data), 0)
+
+        messages = _decode(data)
+        self.assertEqual(messages[0][0], 0)
+        self.assertEqual(messages[0][1][0], fit_encoder.File.Identifier.ACTIVITY)
+
+        records = [values for number, values in messages if number == 20]
+        self.assertEqual(len(records), 15)
+        # distance in cm, speed in mm/s.
+        self.assertEqual(records[-1][5], 42 * 100)
+        self.assertEqual(records[-1][6], 3000)
+        self.assertEqual(records[-1][7], 164)
+
+        laps = [values for number, values in messages if number == 19]
+        self.assertEqual(len(laps), 2)
+        # second interval: 10s to 14s, 30m to 42m.
+        self.assertEqual(laps[1][7], 4 * 1000)
+        self.assertEqual(laps[1][9], 12 * 100)
+        self.assertEqual(laps[1][20], 164)
+
+        sessions = [values for number, values in messages if number == 18]
+        self.assertEqual(len(sessions), 1)
+        self.assertEqual(sessions[0][9], 42 * 100)
+        self.assertEqual(sessions[0][26], 2)
+        self.assertEqual(sessions[0][5], fit_encoder.SPORT_ROWING)
+        self.assertEqual(messages[-1][0], 34)
+
+        # no more frames after finish.
+        self.assertEqual(self.rower._subscribers, ())
+
+    def test_missing_values(self):
+        message = fit_encoder.RECORD_MESSAGE
+        packed = message.pack({'timestamp': 10, 'distance': 1.5, 'power': None, 'cadence': 300})
+        header, timestamp, distance, speed, power, cadence = struct.unpack('<BIIHHB', packed)
+        self.assertEqual(distance, 150)
+        # missing and out of range values are invalid.
+        self.assertEqual(speed, 0xFFFF)
+        self.assertEqual(power, 0xFFFF)
+        self.assertEqual(cadence, 0xFF)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+
+import rower
+from frame_extrapolator import FrameExtrapolator
+
+
+class _FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class _FakeSource:
+    """Serve hand-made frames, with timestamps on the fake clock."""
+
+    def __init__(self):
+        self.frame = None
+        self.seq = 0
+
+    def update(self, timestamp, elapsed_time, distance, speed):
+        self.seq += 1
+        self.frame = rower.RowerFrame(self.seq, timestamp, {
+            'total_elapsed_time': elapsed_time,
+            'total_distance_traveled': distance,
+            'instantaneous_speed': speed
+        })
+
+    def get_current_frame(self):
+        return self.frame
+
+
+class FrameExtrapolatorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = _FakeClock()
+        self.source = _FakeSource()
+        self.extrapolator = FrameExtrapolator(self.source, max_horizon=2.0, correction_time=1.0, clock=self.clock)
+
+    def tearDown(self):
+        self.extrapolator = None
+
+    def test_projection(self):
+        self.source.update(10.0, 100, 250, 2.5)
+        self.clock.now = 10.0
+        frame = self.extrapolator.get_current_frame()
+        self.assertEqual(frame.total_distance_traveled, 250)
+        self.assertEqual(frame.seq, 1)
+
+        self.clock.now = 10.5
+        frame = self.extrapolator.get_current_frame()
+        self.assertAlmostEqual(frame.total_distance_traveled, 251.25)
+        self.assertAlmostEqual(frame.total_elapsed_time, 100.5)
+
+        # no projection beyond the horizon.
+        self.clock.now = 20.0
+        frame = self.extrapolator.get_current_frame()
+        self.assertAlmostEqual(frame.total_distance_traveled, 255)
+        self.assertAlmostEqual(frame.total_elapsed_time, 102)
+
+    def test_smooth_correction(self):
+        self.source.update(10.0, 100, 250, 2.5)
+        self.clock.now = 10.75
+        before = self.extrapolator.get_current_frame().total_distance_traveled
+        self.assertAlmostEqual(before, 251.875)
+
+        # the real frame says it's a bit behind the projection, 251m at 11s.
+        self.source.update(11.0, 101, 251, 2.5)
+        self.clock.now = 11.0
+        frame = self.extrapolator.get_current_frame()
+        # the error fades out, no jump back.
+        self.assertGreaterEqual(frame.total_distance_traveled, before)
+        self.clock.now = 11.5
+        middle = self.extrapolator.get_current_frame().total_distance_traveled
+        self.assertGreaterEqual(middle, frame.total_distance_traveled)
+        # corrected after correction_time.
+        self.clock.now = 12.5
+        self.assertAlmostEqual(self.extrapolator.get_current_frame().total_distance_traveled, 251 + 2.5 * 1.5)
+
+    def test_reset_and_stopped(self):
+        self.source.update(10.0, 100, 250, 2.5)
+        self.clock.now = 10.5
+        self.extrapolator.get_current_frame()
+
+        # head unit reset, applied at once.
+        self.source.update(11.0, 0, 0, 0)
+        self.clock.now = 11.5
+        frame = self.extrapolator.get_current_frame()
+        self.assertEqual(frame.total_distance_traveled, 0)
+        # not moving, no projection.
+        self.assertEqual(frame.total_elapsed_time, 0)
+
+    def test_overshoot_taken_back(self):
+        self.source.update(10.0, 100, 250, 2.5)
+        self.clock.now = 11.9
+        self.assertAlmostEqual(self.extrapolator.get_current_frame().total_distance_traveled, 254.75)
+
+        # the rower stopped, the projection went too far, it fades back to the source value.
+        self.source.update(12.0, 101, 251, 0)
+        self.clock.now = 12.0
+        self.assertAlmostEqual(self.extrapolator.get_current_frame().total_distance_traveled, 254.75)
+        self.clock.now = 12.5
+        self.assertAlmostEqual(self.extrapolator.get_current_frame().total_distance_traveled, 252.875)
+        self.clock.now = 13.0
+        self.assertEqual(self.extrapolator.get_current_frame().total_distance_traveled, 251)
+
+    def test_overshoot_while_moving(self):
+        self.source.update(10.0, 100, 250, 2.5)
+        self.clock.now = 11.9
+        self.extrapolator.get_current_frame()
+
+        # slowed down a lot, held during the fade, then the source value, not held forever.
+        self.source.update(12.0, 101, 251, 0.5)
+        self.clock.now = 12.5
+        self.assertAlmostEqual(self.extrapolator.get_current_frame().total_distance_traveled, 254.75)
+        self.clock.now = 13.5
+        self.assertAlmostEqual(self.extrapolator.get_current_frame().total_distance_traveled, 251.75)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import math
+import unittest
+
+import rower
+from frame_history import FrameHistory
+
+
+class _Frame:
+    """Any object with seq, timestamp and the field attributes can be stored."""
+
+    def __init__(self, seq, timestamp, **fields):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.__dict__.update(fields)
+
+
+class FrameHistoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.history = FrameHistory(4, [('total_distance_traveled', 'q'), ('instantaneous_speed', 'd')])
+
+    def tearDown(self):
+        self.history = None
+
+    def _append(self, seq, timestamp, distance, speed=None):
+        self.history.append(rower.RowerFrame(seq, timestamp, {
+            'total_distance_traveled': distance,
+            'instantaneous_speed': speed
+        }))
+
+    def test_ring_buffer(self):
+        self.assertEqual(len(self.history), 0)
+        self.assertIsNone(self.history.last_seq())
+
+        for seq in range(1, 7):
+            self._append(seq, seq * 1.0, seq * 10, 2.5)
+
+        # capacity is 4, the oldest 2 are overwritten.
+        self.assertEqual(len(self.history), 4)
+        self.assertEqual(self.history.first_seq(), 3)
+        self.assertEqual(self.history.last_seq(), 6)
+
+        columns = self.history.columns_since_seq(0)
+        self.assertEqual(list(columns['seq']), [3, 4, 5, 6])
+        self.assertEqual(list(columns['total_distance_traveled']), [30, 40, 50, 60])
+
+    def test_range_queries(self):
+        for seq in range(1, 5):
+            self._append(seq, seq * 10.0, seq * 10)
+
+        self.assertEqual(list(self.history.columns_since_seq(2)['seq']), [3, 4])
+        self.assertEqual(list(self.history.columns_since_seq(4)['seq']), [])
+        self.assertEqual(list(self.history.columns_since_time(15.0)['seq']), [2, 3, 4])
+        # last 15 seconds at 40s, so frames after 25s.
+        self.assertEqual(list(self.history.last(15, now=40.0)['seq']), [3, 4])
+        # the source went quiet, the window moves on with the clock.
+        self.assertEqual(list(self.history.last(15, now=50.0)['seq']), [4])
+        self.assertEqual(list(self.history.last(15, now=60.0)['seq']), [])
+
+    def test_negative_values(self):
+        history = FrameHistory(4, [('offset', 'q'), ('slope', 'd')])
+        history.append(_Frame(1, 1.0, offset=-5, slope=-0.5))
+        history.append(_Frame(2, 2.0, offset=None, slope=None))
+        columns = history.columns_since_seq(0)
+        self.assertEqual(list(columns['offset']), [-5, -1])
+        self.assertEqual(columns['slope'][0], -0.5)
+        self.assertTrue(math.isnan(columns['slope'][1]))
+
+    def test_missing_values(self):
+        self._append(1, 1.0, 10)
+        columns = self.history.columns_since_seq(0)
+        self.assertTrue(math.isnan(columns['instantaneous_speed'][0]))
+
+    def test_rower_history(self):
+        my_rower = rower.Rower(history_capacity=10)
+        for i in range(3):
+            my_rower.on_update_data({
+                'total_elapsed_time': i,
+                'total_distance_traveled': i * 3,
+                'instantaneous_speed': 3.0
+            })
+
+        frames = my_rower.frames_since(1)
+        self.assertEqual([frame.seq for frame in frames], [2, 3])
+        self.assertEqual(frames[-1].total_distance_traveled, 6)
+        # missing fields are None again.
+        self.assertIsNone(frames[-1].strokes_per_minute)
+        self.assertEqual(len(my_rower.frames_in_last(60)), 3)
+
+        self.assertIsNone(rower.Rower(history_capacity=0).history)
+
+    def test_rower_history_missing_values(self):
+        my_rower = rower.Rower(history_capacity=10)
+        my_rower.on_update_data({
+            'total_elapsed_time': 0,
+            'total_distance_traveled': 0,
+            'instantaneous_speed': 0.0,
+            'resistance_level': 0.0
+        })
+        frame = my_rower.frames_since(0)[0]
+        # zero is a value, not missing.
+        self.assertEqual(frame.resistance_level, 0.0)
+        self.assertEqual(frame.interval_distance, 0)
+        self.assertIsNone(frame.calories_burn_rate)
+        self.assertIsNone(frame.average_pace)
+
+
+if __name__ == '__main__':
+    unittest.main()
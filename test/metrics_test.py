@@ -0,0 +1,121 @@
+import unittest
+
+import rower
+from metrics import BestEffortTracker, MetricsEngine
+
+
+class MetricsEngineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = MetricsEngine()
+
+    def tearDown(self):
+        self.engine = None
+
+    def _update(self, elapsed_time, distance, power=None, spm=None):
+        fields = {
+            'total_elapsed_time': elapsed_time,
+            'total_distance_traveled': distance,
+            'instantaneous_speed': 2.5
+        }
+        if power is not None:
+            fields['instantaneous_power'] = power
+        if spm is not None:
+            fields['strokes_per_minute'] = spm
+        return self.engine.update(fields)
+
+    def test_averages(self):
+        result = self._update(0, 0, 100, 20)
+        # nothing rowed yet.
+        self.assertIsNone(result['average_speed'])
+        self.assertIsNone(result['average_pace'])
+        self.assertIsNone(result['average_power'])
+
+        self._update(1, 2, 100, 20)
+        result = self._update(4, 10, 200, 30)
+
+        self.assertAlmostEqual(result['average_speed'], 2.5)
+        self.assertAlmostEqual(result['average_pace'], 200)
+        # weighted by time: 100w for 1s, 200w for 3s.
+        self.assertAlmostEqual(result['average_power'], 175)
+        self.assertAlmostEqual(result['average_strokes_per_minute'], 27.5)
+
+    def test_split_pace(self):
+        self._update(100, 490)
+        # crossed 500m at 102s (interpolated), 10m of the new split in 2s.
+        result = self._update(104, 510)
+        self.assertAlmostEqual(result['split_pace'], 100)
+
+    def test_intervals(self):
+        self._update(10, 30, 150)
+        result = self._update(20, 60, 150)
+        self.assertEqual(result['interval_number'], 1)
+        self.assertEqual(result['interval_distance'], 30)
+
+        self.engine.start_new_interval()
+        self._update(30, 90, 100)
+        result = self._update(40, 120, 200)
+        self.assertEqual(result['interval_number'], 2)
+        self.assertEqual(result['interval_elapsed_time'], 10)
+        self.assertEqual(result['interval_distance'], 30)
+        self.assertAlmostEqual(result['interval_average_power'], 200)
+
+        # head unit reset, a new session and interval.
+        result = self._update(0, 0)
+        self.assertEqual(result['interval_number'], 3)
+        self.assertIsNone(result['average_power'])
+
+    def test_best_efforts(self):
+        tracker = BestEffortTracker(distances=(100,), power_durations=(3,))
+        # 100m at 4m/s, then 100m at 5m/s.
+        samples = [(0, 0), (10, 40), (20, 80), (25, 100), (30, 125), (40, 175), (44, 195), (45, 200)]
+        last_time = 0
+        for elapsed_time, distance in samples:
+            tracker.add(elapsed_time, distance, 100 + distance, elapsed_time - last_time)
+            last_time = elapsed_time
+        results = tracker.results()
+        self.assertAlmostEqual(results['best_100m_time'], 20)
+        # last 3 seconds: 300w for 1s, 295w for 4s of which 2s in window.
+        self.assertAlmostEqual(results['best_3s_power'], (300 + 295 * 2) / 3)
+
+    def test_best_efforts_against_rescan(self):
+        # compare with the naive O(n^2) rescan on a session of varying speed.
+        times = list(range(0, 400, 2))
+        distances = [int(t * (3 + (t // 50) % 3 * 0.5)) for t in times]
+        distances = [max(distances[:i + 1]) for i in range(len(distances))]
+        powers = [100 + (t * 37) % 150 for t in times]
+
+        tracker = BestEffortTracker(distances=(500,), power_durations=(10,))
+        for i, elapsed_time in enumerate(times):
+            tracker.add(elapsed_time, distances[i], powers[i], elapsed_time - times[i - 1] if i else 0)
+
+        best_time = None
+        best_power = None
+        for j in range(len(times)):
+            for i in range(j):
+                if distances[j] - distances[i] >= 500 and distances[j] - distances[i + 1] < 500:
+                    # interpolate the start like the tracker does.
+                    target = distances[j] - 500
+                    start = times[i] + (times[i + 1] - times[i]) * (target - distances[i]) / (distances[i + 1] - distances[i])
+                    if best_time is None or times[j] - start < best_time:
+                        best_time = times[j] - start
+            if times[j] >= 10:
+                # samples are 2s each, the last 5 make 10s.
+                average = sum(powers[j - 4:j + 1]) / 5
+                if best_power is None or average > best_power:
+                    best_power = average
+
+        results = tracker.results()
+        self.assertAlmostEqual(results['best_500m_time'], best_time)
+        self.assertAlmostEqual(results['best_10s_power'], best_power)
+
+    def test_rower_frame_fields(self):
+        my_rower = rower.Rower(history_capacity=0)
+        my_rower.on_update_data({'total_elapsed_time': 10, 'total_distance_traveled': 25, 'instantaneous_speed': 2.5})
+        frame = my_rower.get_current_frame()
+        self.assertAlmostEqual(frame.average_speed, 2.5)
+        self.assertAlmostEqual(frame.derived()['average_pace'], 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import time
+import unittest
+
+import rower
+from reader_service import SerialReaderService
+from serial_reader import FDFReader, encode_fdf_frame
+
+
+class SerialReaderServiceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # a pseudo terminal per rower, the test writes to the master side, as the head unit.
+        self.masters = []
+        self.readers = []
+        for _ in range(3):
+            master, slave = os.openpty()
+            self.masters.append(master)
+            self.readers.append(FDFReader(rower.Rower(history_capacity=0), os.ttyname(slave)))
+            os.close(slave)
+        self.service = SerialReaderService()
+
+    def tearDown(self):
+        self.service.close(timeout=5)
+        for master in self.masters:
+            os.close(master)
+
+    def _wait_for_ports(self, count):
+        # the ports are added and removed by the service thread.
+        deadline = time.monotonic() + 5
+        while len(self.service.ports) != count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_many_rowers(self):
+        for reader in self.readers:
+            self.service.add(reader)
+        self.service.start()
+        # the connect commands are sent to each head unit.
+        self.assertEqual(os.read(self.masters[0], 64), b'C\nR\n')
+
+        for i, master in enumerate(self.masters):
+            # a frame in two writes, the partial line waits for the rest.
+            frame = encode_fdf_frame(60 + i, 100 * i, 120)
+            os.write(master, frame[:10])
+            os.write(master, frame[10:])
+        for i, reader in enumerate(self.readers):
+            frame = reader.receiver.wait_for_update(since_seq=0, timeout=5)
+            self.assertIsNotNone(frame)
+            self.assertEqual(frame.total_elapsed_time, 60 + i)
+            self.assertEqual(frame.total_distance_traveled, 100 * i)
+        self.assertEqual(len(self.service.ports), 3)
+
+    def test_remove(self):
+        self.service.start()
+        self.service.add(self.readers[0])
+        self.service.add(self.readers[1])
+        self.service.remove(self.readers[0])
+
+        os.write(self.masters[1], encode_fdf_frame(5, 10, 120))
+        self.assertIsNotNone(self.readers[1].receiver.wait_for_update(since_seq=0, timeout=5))
+        self.assertEqual(list(self.service.ports), [self.readers[1]])
+        # disconnected, the reader forgot the removed port.
+        self.assertIsNone(self.readers[0].port)
+
+    def test_close(self):
+        self.service.add(self.readers[0])
+        self.service.start()
+        self._wait_for_ports(1)
+        self.assertTrue(self.service.close(timeout=5))
+        self.assertEqual(self.service.ports, {})
+        self.assertIsNone(self.readers[0].port)
+
+    def test_unplugged(self):
+        self.service.add(self.readers[0])
+        self.service.add(self.readers[1])
+        self.service.start()
+        self._wait_for_ports(2)
+
+        # the head unit is gone, its port is dropped, the other rower goes on.
+        with self.assertLogs('rowercast.reader_service'):
+            os.close(self.masters.pop(0))
+            self._wait_for_ports(1)
+        self.assertEqual(list(self.service.ports), [self.readers[1]])
+        os.write(self.masters[0], encode_fdf_frame(5, 10, 120))
+        self.assertIsNotNone(self.readers[1].receiver.wait_for_update(since_seq=0, timeout=5))
+
+
+if __name__ == '__main__':
+    unittest.main()
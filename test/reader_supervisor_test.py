@@ -0,0 +1,137 @@
+import time
+import unittest
+
+import serial
+
+import rower
+from reader_supervisor import ReaderSupervisor
+from serial_discovery import SerialPortNotFoundError
+from serial_reader import FDF_VERSION, FDFCommandError, FDFReader, encode_fdf_frame
+
+
+class _FlakyPort:
+    """A serial port reading its chunks, then failing like an unplugged cable, or timing out if it's not flaky."""
+
+    def __init__(self, chunks, fails=True):
+        self.chunks = list(chunks)
+        self.fails = fails
+        self.written = b''
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.closed = True
+
+    def write(self, data):
+        self.written += data
+
+    @property
+    def in_waiting(self):
+        return len(self.chunks[0]) if self.chunks else 0
+
+    def read(self, size=1):
+        if self.chunks:
+            return self.chunks.pop(0)
+        if self.fails:
+            raise serial.SerialException("device reports readiness to read but returned no data")
+        time.sleep(0.01)
+        return b''
+
+
+def _wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+
+class ReaderSupervisorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.rower = rower.Rower(history_capacity=0)
+        self.reader = FDFReader(self.rower, '/dev/ttyFDF')
+        # port open results, in order, an exception is raised.
+        self.opens = []
+        self.reader._open_port = self._open_port
+
+    def _open_port(self, timeout=1):
+        result = self.opens.pop(0) if self.opens else serial.SerialException("No such device")
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def test_reconnect(self):
+        first = _FlakyPort([encode_fdf_frame(10, 40, 200)])
+        second = _FlakyPort([encode_fdf_frame(12, 48, 200)], fails=False)
+        self.opens = [serial.SerialException("No such device"), first, second]
+        supervisor = ReaderSupervisor(self.reader, initial_delay=0.01)
+        supervisor.start()
+        try:
+            _wait_until(lambda: self.rower.get_current_frame()['total_elapsed_time'] == 12)
+            self.assertTrue(supervisor.connected)
+        finally:
+            self.assertTrue(supervisor.close(timeout=2))
+        self.assertFalse(supervisor.worker_thread.is_alive())
+
+        # the port closed on failure, the connect sequence sent again on the new port.
+        self.assertTrue(first.closed)
+        self.assertTrue(second.closed)
+        self.assertEqual(first.written, b'C\nR\n')
+        self.assertEqual(second.written, b'C\nR\n')
+        # down at start, then the blip.
+        self.assertEqual(supervisor.outages, 2)
+        self.assertGreater(supervisor.last_downtime, 0)
+        self.assertGreaterEqual(supervisor.total_downtime, supervisor.last_downtime)
+
+    def test_backoff(self):
+        supervisor = ReaderSupervisor(self.reader, initial_delay=1, max_delay=5)
+        delays = []
+
+        def wait(seconds):
+            delays.append(seconds)
+            if len(delays) == 3:
+                # back after 3 failures, then the port fails again.
+                self.opens = [_FlakyPort([])]
+            return len(delays) == 7
+
+        supervisor._wait = wait
+        supervisor._thread_worker()
+        # reset to the initial delay after a good connect.
+        self.assertEqual(delays, [1, 2, 4, 1, 2, 4, 5])
+        self.assertEqual(supervisor.outages, 2)
+        self.assertFalse(supervisor.connected)
+
+    def test_discover(self):
+        # the head unit is off at start, found once it's on, the discovery retried with the backoff.
+        found = [SerialPortNotFoundError("No FDF head unit"), '/dev/ttyUSB1']
+
+        def discover():
+            result = found.pop(0) if found else '/dev/ttyUSB1'
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        self.opens = [_FlakyPort([encode_fdf_frame(10, 40, 200)], fails=False)]
+        supervisor = ReaderSupervisor(self.reader, initial_delay=0.01, discover=discover)
+        supervisor.start()
+        try:
+            _wait_until(lambda: self.rower.get_current_frame()['total_elapsed_time'] == 10)
+        finally:
+            self.assertTrue(supervisor.close(timeout=2))
+        self.assertEqual(self.reader.serial_device_address, '/dev/ttyUSB1')
+        self.assertEqual(supervisor.outages, 1)
+
+    def test_pending_commands_fail_on_disconnect(self):
+        self.reader._connect(_FlakyPort([]))
+        future = self.reader.send_command(FDF_VERSION)
+        self.reader._disconnect()
+        self.assertIsNone(self.reader.port)
+        with self.assertRaises(FDFCommandError):
+            future.result(timeout=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
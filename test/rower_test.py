@@ -110,6 +110,163 @@ class RowerTestCase(unittest.TestCase):
         with self.assertRaises(rower.IncomingRowerDictDuplicateError) as cm:
             self.rower.on_update_data(another_good_data)
 
+    def test_rower_update_trusted(self):
+        # trusted frames skip the validity check, frames from in-tree parsers are always good.
+        unchecked_data = {
+            'total_elapsed_time': 12,
+            'total_distance_traveled': 150,
+            'instantaneous_speed': -2.35
+        }
+        self.rower.on_update_data(unchecked_data, trusted=True)
+        self.assertEqual(self.rower.get_current_frame()['instantaneous_speed'], -2.35)
+
+        # untrusted frames are still checked.
+        with self.assertRaises(rower.IncomingRowerDictInvalidValueError) as cm:
+            self.rower.on_update_data(dict(unchecked_data))
+
+    def test_rower_update_trusted_float_distance(self):
+        # a float in an integer field of a trusted frame is checked, not truncated by the integer history column.
+        data = {
+            'total_elapsed_time': 12,
+            'total_distance_traveled': 150.5,
+            'instantaneous_speed': 2.35
+        }
+        with self.assertRaises(rower.IncomingRowerDictInvalidValueError):
+            self.rower.on_update_data(data, trusted=True)
+        self.assertEqual(self.rower.get_current_frame().seq, 0)
+        self.assertEqual(len(self.rower.history), 0)
+
+        # a whole float is a valid integer value.
+        self.rower.on_update_data(dict(data, total_distance_traveled=150.0), trusted=True)
+        self.assertEqual(self.rower.history.columns_since_seq(0)['total_distance_traveled'].tolist(), [150])
+
+    def test_schema_compiled(self):
+        schema = rower.RowerSchema([
+            rower.RowerField('a', mandatory=True, integer=True),
+            rower.RowerField('b', negative=True),
+        ])
+        self.assertEqual(schema.valid_keys, frozenset(['a', 'b']))
+        self.assertEqual(schema.mandatory_keys, frozenset(['a']))
+        self.assertEqual(schema.integer_keys, frozenset(['a']))
+
+        # each key has its own validator.
+        schema.validators['a']('a', 3)
+        schema.validators['b']('b', -2.5)
+        schema.validators['b']('b', None)
+        with self.assertRaises(rower.IncomingRowerDictInvalidValueError) as cm:
+            schema.validators['a']('a', 3.5)
+        with self.assertRaises(rower.IncomingRowerDictInvalidValueError) as cm:
+            schema.validators['a']('a', -3)
+        with self.assertRaises(rower.IncomingRowerDictInvalidKeyError) as cm:
+            schema.validators['a']('a', None)
+
+    def test_rower_frame(self):
+        good_data = {
+            'total_elapsed_time': 12,
+            'total_distance_traveled': 150,
+            'instantaneous_speed': 2.35,
+            'instantaneous_power': 125
+        }
+        first_seq = self.rower.get_current_frame().seq
+        self.rower.on_update_data(good_data)
+        frame = self.rower.get_current_frame()
+
+        self.assertIsInstance(frame, rower.RowerFrame)
+        self.assertEqual(frame.seq, first_seq + 1)
+        self.assertGreaterEqual(frame.timestamp, 0)
+        # fields as slots, missing fields are None.
+        self.assertEqual(frame.instantaneous_power, 125)
+        self.assertIsNone(frame.strokes_per_minute)
+
+        # dict view, only the provided fields.
+        self.assertEqual(frame.as_dict(), good_data)
+        self.assertEqual(dict(frame), good_data)
+        # derived fields are slots, not in the dict view.
+        self.assertEqual(frame.interval_number, 1)
+        self.assertEqual(frame.derived()['interval_number'], 1)
+        self.assertNotIn('interval_number', frame)
+        self.assertIsNone(frame.get('interval_number'))
+        # a frame can be fed to a Rower again.
+        self.rower.on_update_data(dict(frame.replace(total_elapsed_time=11)))
+        self.assertEqual(frame.get('strokes_per_minute', 0xFF), 0xFF)
+        with self.assertRaises(KeyError) as cm:
+            frame['strokes_per_minute']
+
+        # immutable.
+        with self.assertRaises(AttributeError) as cm:
+            frame.instantaneous_power = 100
+        with self.assertRaises(AttributeError) as cm:
+            frame.other = 1
+
+    def test_wait_for_update(self):
+        seq = self.rower.get_current_frame().seq
+        # nothing new, timed out.
+        self.assertIsNone(self.rower.wait_for_update(seq, timeout=0.01))
+
+        good_data = {
+            'total_elapsed_time': 12,
+            'total_distance_traveled': 150,
+            'instantaneous_speed': 2.35
+        }
+        updater = threading.Timer(0.05, self.rower.on_update_data, args=(good_data,))
+        updater.start()
+        frame = self.rower.wait_for_update(seq, timeout=5)
+        updater.join()
+
+        self.assertIsNotNone(frame)
+        self.assertEqual(frame.seq, seq + 1)
+        self.assertEqual(frame.total_distance_traveled, 150)
+        # already newer than seq, return immediately.
+        self.assertIs(self.rower.wait_for_update(seq, timeout=0), frame)
+
+    def test_subscribe(self):
+        received = []
+
+        def broken_subscriber(frame):
+            raise ValueError('broken consumer')
+
+        self.rower.subscribe(broken_subscriber)
+        self.rower.subscribe(received.append)
+
+        good_data = {
+            'total_elapsed_time': 12,
+            'total_distance_traveled': 150,
+            'instantaneous_speed': 2.35
+        }
+        # a broken subscriber doesn't stop the update, or the other subscribers.
+        self.rower.on_update_data(good_data)
+        self.assertEqual(received, [self.rower.get_current_frame()])
+
+        self.rower.unsubscribe(received.append)
+        self.rower.on_update_data(dict(good_data))
+        self.assertEqual(len(received), 1)
+
+    def test_changed_mask(self):
+        bits = rower.RowerFrame.field_bits
+        # no frame before the first one, all changed.
+        self.assertEqual(self.rower.get_current_frame().changed, rower.RowerFrame.ALL_CHANGED)
+
+        good_data = {
+            'total_elapsed_time': 0,
+            'total_distance_traveled': 0,
+            'instantaneous_speed': 0,
+            'strokes_per_minute': 0,
+            'instantaneous_power': 0,
+            'calories_burn_rate': 0,
+            'resistance_level': 0.5
+        }
+        self.rower.on_update_data(good_data)
+        frame = self.rower.get_current_frame()
+        self.assertEqual(frame.changed, bits['resistance_level'])
+
+        self.rower.on_update_data(dict(good_data, total_elapsed_time=1, strokes_per_minute=None))
+        frame = self.rower.get_current_frame()
+        self.assertEqual(frame.changed, bits['total_elapsed_time'] | bits['strokes_per_minute'])
+        # kept by replace(), the same update.
+        self.assertEqual(frame.replace(total_distance_traveled=3).changed, frame.changed)
+        self.assertEqual(rower.RowerFrame.field_mask(['resistance_level', 'stroke_length']),
+                         bits['resistance_level'])
+
 if __name__=='__main__':
     unittest.main()
 
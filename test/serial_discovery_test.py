@@ -0,0 +1,77 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from serial_discovery import SerialPortNotFoundError, find_fdf_port, probe_fdf_port
+
+
+class _FakeHeadUnit:
+    """The master side of a pseudo terminal, answers the connect command like the FDF head unit."""
+
+    def __init__(self):
+        # the slave side is kept open, so the master doesn't get an I/O error between the probes.
+        self.master, self.slave = os.openpty()
+        self.device = os.ttyname(self.slave)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                if b'C' in os.read(self.master, 64):
+                    os.write(self.master, b'C1164\r\n')
+        except OSError:
+            # closed.
+            pass
+
+    def close(self):
+        os.close(self.slave)
+        os.close(self.master)
+
+
+class SerialDiscoveryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.directory, 'serial.json')
+        self.head_unit = _FakeHeadUnit()
+        # a port that never answers.
+        self.silent_master, slave = os.openpty()
+        self.silent_device = os.ttyname(slave)
+        os.close(slave)
+
+    def tearDown(self):
+        self.head_unit.close()
+        os.close(self.silent_master)
+        shutil.rmtree(self.directory)
+
+    def test_probe(self):
+        self.assertTrue(probe_fdf_port(self.head_unit.device, timeout=1))
+        self.assertFalse(probe_fdf_port(self.silent_device, timeout=0.1))
+        self.assertFalse(probe_fdf_port(os.path.join(self.directory, 'no_such_port'), timeout=0.1))
+
+    def test_find_and_cache(self):
+        candidates = [(self.silent_device, 'A1'), (self.head_unit.device, 'B2')]
+        self.assertEqual(find_fdf_port(self.cache_path, timeout=1, candidates=candidates), self.head_unit.device)
+        with open(self.cache_path) as f:
+            self.assertEqual(json.load(f)['serial_number'], 'B2')
+
+        # next start, the adapter is on another device name, found by its serial number, no probe.
+        def no_probe(device, timeout):
+            raise AssertionError('probed ' + device)
+
+        candidates = [(self.silent_device, 'A1'), ('/dev/ttyUSB7', 'B2')]
+        self.assertEqual(find_fdf_port(self.cache_path, candidates=candidates, probe=no_probe), '/dev/ttyUSB7')
+
+    def test_not_found(self):
+        with self.assertRaises(SerialPortNotFoundError):
+            find_fdf_port(None, timeout=0.1, candidates=[(self.silent_device, None)])
+        with self.assertRaises(SerialPortNotFoundError):
+            find_fdf_port(None, candidates=[])
+
+
+if __name__ == '__main__':
+    unittest.main()
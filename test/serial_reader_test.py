@@ -0,0 +1,356 @@
+import os
+import pty
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import rower
+from serial_reader import (CaptureWriter, FakeRower, FDFCommandError, FDFCommandTimeoutError, FDFReader, LineFramer,
+                           PollScheduler, ReplayReader, create_reader, decode_fdf_frames, encode_fdf_frame,
+                           parse_fdf_frame, read_capture)
+
+
+# a frame as sent by the head unit: 12:34, 1500m, 2:05 /500m, 28 spm, 150 W, 900 cal/hr, level 2.
+GOOD_FRAME = b'A80123401500 0205028150090002\r\n'
+
+
+class FDFReaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.rower = rower.Rower(history_capacity=0)
+        self.reader = FDFReader(self.rower, '')
+
+    def tearDown(self):
+        self.rower = None
+        self.reader = None
+
+    def test_parse(self):
+        result = self.reader._parse(GOOD_FRAME)
+        self.assertEqual(result['total_elapsed_time'], 754)
+        self.assertEqual(result['total_distance_traveled'], 1500)
+        self.assertEqual(result['instantaneous_speed'], 4)
+        self.assertEqual(result['strokes_per_minute'], 28)
+        self.assertEqual(result['instantaneous_power'], 150)
+        self.assertEqual(result['calories_burn_rate'], 900)
+        self.assertEqual(result['resistance_level'], 0.5)
+        # a trusted frame should pass the full check too.
+        self.rower._check_dict_validity(result)
+
+    def test_parse_garbled(self):
+        self.assertEqual(len(GOOD_FRAME), 31)
+        # a sign or a space is accepted by int(), not by the parser.
+        self.assertIsNone(self.reader._parse(GOOD_FRAME[:7] + b'-1500' + GOOD_FRAME[12:]))
+        self.assertIsNone(self.reader._parse(GOOD_FRAME[:20] + b' 15' + GOOD_FRAME[23:]))
+        # no pace.
+        self.assertIsNone(self.reader._parse(GOOD_FRAME[:13] + b'0000' + GOOD_FRAME[17:]))
+        # not a frame.
+        self.assertIsNone(self.reader._parse(b'C1164\r\n'))
+
+    def test_parse_at_offset(self):
+        # decoded in place, in a bigger buffer.
+        buffer = bytearray(b'C1164\r\n' + GOOD_FRAME)
+        self.assertEqual(parse_fdf_frame(buffer, 7), self.reader._parse(GOOD_FRAME))
+        # pace digits out of the clock range are still a pace, 0:75.
+        self.assertEqual(parse_fdf_frame(encode_fdf_frame(0, 0, 0)[:13] + b'0075' + GOOD_FRAME[17:])
+                         ['instantaneous_speed'], 500 / 75)
+
+    def test_decode_frames(self):
+        frames = [encode_fdf_frame(i, i * 4, 100 + i, spm=20 + i, power=i, cal_per_hour=600, level=3)
+                  for i in range(5)]
+        # frames only, and with a response and noise in between.
+        for data in (b''.join(frames), b'C1164\r\n' + b''.join(frames[:2]) + b'\x00\n' + b''.join(frames[2:])):
+            columns = decode_fdf_frames(data)
+            self.assertEqual(list(columns['total_elapsed_time']), [0, 1, 2, 3, 4])
+            self.assertEqual(list(columns['total_distance_traveled']), [0, 4, 8, 12, 16])
+            self.assertEqual(list(columns['strokes_per_minute']), [20, 21, 22, 23, 24])
+            self.assertEqual(list(columns['instantaneous_power']), [0, 1, 2, 3, 4])
+            self.assertEqual(columns['instantaneous_speed'][3], 500 / 103)
+            self.assertEqual(columns['resistance_level'][0], 0.75)
+        # garbled and no pace frames are dropped, in a clean stream too.
+        garbled = GOOD_FRAME[:7] + b'-1500' + GOOD_FRAME[12:]
+        no_pace = GOOD_FRAME[:13] + b'0000' + GOOD_FRAME[17:]
+        for data in (garbled + b''.join(frames) + no_pace, b'C\r\n' + garbled + b''.join(frames) + no_pace):
+            self.assertEqual(list(decode_fdf_frames(data)['total_distance_traveled']), [0, 4, 8, 12, 16])
+        self.assertEqual(len(decode_fdf_frames(b'')['total_elapsed_time']), 0)
+        # the same values as the frame parser.
+        self.assertEqual({name: column[0] for name, column in decode_fdf_frames(GOOD_FRAME).items()},
+                         self.reader._parse(GOOD_FRAME))
+
+
+class _FakeSerial:
+    """A serial port with a queue of chunks, each read() returns at most one chunk."""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.reads = 0
+        self.written = b''
+
+    def write(self, data):
+        self.written += data
+
+    @property
+    def in_waiting(self):
+        return len(self.chunks[0]) if self.chunks else 0
+
+    def read(self, size=1):
+        self.reads += 1
+        if not self.chunks:
+            return b''
+        chunk = self.chunks.pop(0)
+        if len(chunk) > size:
+            self.chunks.insert(0, chunk[size:])
+        return chunk[:size]
+
+
+class LineFramerTestCase(unittest.TestCase):
+
+    def _lines(self, framer):
+        return [(kind, bytes(framer.buffer[start:end])) for kind, start, end in framer.drain()]
+
+    def test_partial_lines(self):
+        framer = LineFramer()
+        framer.feed(GOOD_FRAME[:10])
+        self.assertEqual(self._lines(framer), [])
+        framer.feed(GOOD_FRAME[10:] + b'C1164\r\n' + GOOD_FRAME[:5])
+        self.assertEqual(self._lines(framer), [(LineFramer.FRAME, GOOD_FRAME), (LineFramer.RESPONSE, b'C1164\r\n')])
+        framer.feed(GOOD_FRAME[5:])
+        self.assertEqual(self._lines(framer), [(LineFramer.FRAME, GOOD_FRAME)])
+        # the drained lines are dropped from the buffer.
+        framer.feed(b'')
+        self.assertEqual(len(framer.buffer), 0)
+
+    def test_garbage(self):
+        framer = LineFramer(max_line_length=40)
+        # a frame cut by a reconnection, noise, then a good frame.
+        framer.feed(GOOD_FRAME[12:] + b'\x00\xff\n' + GOOD_FRAME)
+        self.assertEqual([kind for kind, _ in self._lines(framer)],
+                         [LineFramer.GARBAGE, LineFramer.GARBAGE, LineFramer.FRAME])
+        # too long without a line end, dropped, resync on the next line.
+        framer.feed(b'1' * 50)
+        self.assertEqual([kind for kind, _ in self._lines(framer)], [LineFramer.GARBAGE])
+        framer.feed(b'23\n' + GOOD_FRAME)
+        self.assertEqual([kind for kind, _ in self._lines(framer)], [LineFramer.GARBAGE, LineFramer.FRAME])
+
+    def test_fdf_reader_chunks(self):
+        my_rower = rower.Rower(history_capacity=0)
+        reader = FDFReader(my_rower, '')
+        stream = b'V1161016\r\n' + GOOD_FRAME + encode_fdf_frame(755, 1504, 125) + b'\x00' + GOOD_FRAME[:7]
+        ser = _FakeSerial([stream, GOOD_FRAME[7:]])
+        # all the waiting lines in one read() call.
+        messages = reader._read_messages(ser)
+        self.assertEqual(ser.reads, 1)
+        self.assertEqual([bytes(message) for message in messages], [GOOD_FRAME, encode_fdf_frame(755, 1504, 125)])
+        self.assertEqual(reader._parse(messages[1])['total_distance_traveled'], 1504)
+        self.assertEqual(list(reader.responses), [b'V1161016'])
+        # the partial frame, and the noise byte before it, completed by the next read.
+        messages = reader._read_messages(ser)
+        self.assertEqual(messages, [])
+        self.assertEqual(reader.line_counts[LineFramer.GARBAGE], 1)
+        self.assertEqual(reader._read_messages(_FakeSerial([])), [])
+
+
+class FDFCommandTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.reader = FDFReader(rower.Rower(history_capacity=0), '', clock=lambda: self.now)
+        self.ser = _FakeSerial([])
+
+    def tearDown(self):
+        self.reader = None
+
+    def _receive(self, data):
+        self.ser.chunks.append(data)
+        return self.reader._read_messages(self.ser)
+
+    def test_not_connected(self):
+        with self.assertRaises(FDFCommandError):
+            self.reader.read_version()
+
+    def test_commands(self):
+        self.reader._connect(self.ser)
+        self.assertEqual(self.ser.written, b'C\nR\n')
+        self._receive(b'C1164\r\n')
+        # the connect reply was waited for, not unsolicited.
+        self.assertEqual(list(self.reader.responses), [])
+
+        # several commands queued, the replies come in any order, between the frames.
+        version = self.reader.read_version()
+        level = self.reader.set_level(3)
+        self.assertEqual(self.ser.written, b'C\nR\nV\nL3\n')
+        self.assertFalse(version.done())
+        messages = self._receive(GOOD_FRAME + b'L3\r\n' + GOOD_FRAME + b'V1161016\r\n')
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(level.result(0), 3)
+        self.assertEqual(version.result(0), '1161016')
+
+        # no reply for reset.
+        self.assertIsNone(self.reader.reset().result(0))
+        with self.assertRaises(ValueError):
+            self.reader.set_level(5)
+
+    def test_timeout(self):
+        self.reader._connect(self.ser)
+        self._receive(b'C1164\r\n')
+        level = self.reader.set_level(2, timeout=1.0)
+        self.now = 2.0
+        # the frames keep coming, the command expires on the next read.
+        self._receive(GOOD_FRAME)
+        with self.assertRaises(FDFCommandTimeoutError):
+            level.result(0)
+        # a late reply, no command waits for it.
+        self._receive(b'L2\r\n')
+        self.assertEqual(list(self.reader.responses), [b'L2'])
+
+    def test_bad_reply(self):
+        self.reader._connect(self.ser)
+        level = self.reader.set_level(2)
+        self._receive(b'Lxx\r\n')
+        with self.assertRaises(FDFCommandError):
+            level.result(0)
+
+
+class _FakeClock:
+    """Clock and sleep of a replay, sleeping moves the clock."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class ReplayReaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.rower = rower.Rower(history_capacity=0)
+        self.clock = _FakeClock()
+        self.messages = [
+            (0.0, encode_fdf_frame(0, 0, 125)),
+            (0.1, b'C1164\r\n'),
+            (1.0, encode_fdf_frame(1, 4, 125)),
+            # the head unit repeats a frame when idle.
+            (2.0, encode_fdf_frame(1, 4, 125)),
+            (3.0, encode_fdf_frame(3, 12, 125, spm=28)),
+        ]
+
+    def tearDown(self):
+        self.rower = None
+
+    def test_encode_frame(self):
+        self.assertEqual(encode_fdf_frame(754, 1500, 125, 28, 150, 900, 2), GOOD_FRAME)
+
+    def test_replay_original_timing(self):
+        reader = ReplayReader(self.rower, self.messages, speed=2, clock=self.clock, sleep=self.clock.sleep)
+        self.assertEqual(reader.replay(), 4)
+        self.assertEqual((reader.sent, reader.skipped), (4, 1))
+        self.assertEqual(self.rower.get_current_frame().total_distance_traveled, 12)
+        self.assertEqual(self.rower.get_current_frame().strokes_per_minute, 28)
+        # twice the original pace.
+        self.assertAlmostEqual(self.clock.now, 1.5)
+
+    def test_replay_virtual_clock(self):
+        reader = ReplayReader(self.rower, self.messages, interval=0.5, clock=self.clock, sleep=self.clock.sleep)
+        reader.replay()
+        self.assertAlmostEqual(self.clock.now, 2.0)
+
+        # as fast as possible, no sleep.
+        clock = _FakeClock()
+        reader = ReplayReader(rower.Rower(history_capacity=0), self.messages, speed=0, clock=clock,
+                              sleep=clock.sleep)
+        self.assertEqual(reader.replay(), 4)
+        self.assertEqual(clock.sleeps, [])
+
+    def test_stop_in_a_gap(self):
+        # the gap is waited on the stop event, the replay stops at once, not after the gap.
+        messages = [(0.0, encode_fdf_frame(0, 0, 125)), (60.0, encode_fdf_frame(60, 250, 125))]
+        reader = ReplayReader(self.rower, messages)
+        threading.Timer(0.05, reader._stop_event.set).start()
+        start = time.monotonic()
+        self.assertEqual(reader.replay(), 1)
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_capture_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'capture.txt')
+            clock = _FakeClock()
+            writer = CaptureWriter(path, clock=clock)
+            for arrival, message in self.messages + [(4.0, b'\x00\xff\tgarbage\\\n')]:
+                clock.now = 100 + arrival
+                writer.write(message)
+            writer.close()
+
+            messages = read_capture(path)
+            self.assertEqual([message for _, message in messages[:-1]], [message for _, message in self.messages])
+            self.assertEqual(messages[-1], (4.0, b'\x00\xff\tgarbage\\\n'))
+            self.assertEqual(ReplayReader(self.rower, path, speed=0).replay(), 4)
+        finally:
+            shutil.rmtree(directory)
+
+
+class ReaderCloseTestCase(unittest.TestCase):
+
+    def test_close_fdf_reader(self):
+        master, slave = pty.openpty()
+        try:
+            reader = FDFReader(rower.Rower(history_capacity=0), os.ttyname(slave))
+            reader.start()
+            # the port is open once the connect commands come, the frame isn't flushed by the open then.
+            received = b''
+            while not received.endswith(b'R\n'):
+                received += os.read(master, 16)
+            os.write(master, GOOD_FRAME)
+            deadline = time.monotonic() + 5
+            while reader.receiver.get_current_frame()['total_elapsed_time'] != 754:
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.01)
+            # within one read timeout, the port closed by the thread.
+            start = time.monotonic()
+            self.assertTrue(reader.close(timeout=2))
+            self.assertLess(time.monotonic() - start, 2)
+            self.assertFalse(reader.worker_thread.is_alive())
+        finally:
+            os.close(master)
+            os.close(slave)
+
+    def test_close_fake_rower(self):
+        reader = FakeRower(rower.Rower(history_capacity=0))
+        reader.start()
+        # no wait for the end of its 1 second sleep.
+        self.assertTrue(reader.close(timeout=0.5))
+
+
+class PollScheduleTestCase(unittest.TestCase):
+
+    def test_every(self):
+        scheduler = PollScheduler([('time', 1), ('power', 2), ('calories', 4)])
+        batches = [scheduler.next_batch() for _ in range(5)]
+        self.assertEqual(batches, [['time', 'power', 'calories'], ['time'], ['time', 'power'], ['time'],
+                                   ['time', 'power', 'calories']])
+
+    def test_max_size(self):
+        scheduler = PollScheduler([('a', 1), ('b', 1), ('c', 1)], max_size=2)
+        # the query left out goes first in the next round, none starves.
+        self.assertEqual(scheduler.next_batch(), ['a', 'b'])
+        self.assertEqual(scheduler.next_batch(), ['a', 'c'])
+        batches = [scheduler.next_batch() for _ in range(28)]
+        self.assertEqual([sum(batch.count(query) for batch in batches) for query in 'abc'], [18, 19, 19])
+
+    def test_registry(self):
+        my_rower = rower.Rower(history_capacity=0)
+        self.assertIsInstance(create_reader('fdf', my_rower, '/dev/ttyUSB0'), FDFReader)
+        self.assertEqual(type(create_reader('csafe', my_rower, '/dev/ttyUSB0')).__name__, 'CSAFEReader')
+        with self.assertRaises(ValueError):
+            create_reader('no_such_rower', my_rower, '/dev/ttyUSB0')
+
+
+if __name__ == '__main__':
+    unittest.main()
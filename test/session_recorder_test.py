@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import rower
+import session_recorder
+from session_recorder import SessionFileError, SessionReader, SessionRecorder
+
+
+class SessionRecorderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'session.rcs')
+        self.rower = rower.Rower(history_capacity=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _row(self, count, start=0):
+        for i in range(start, start + count):
+            self.rower.on_update_data({
+                'total_elapsed_time': i,
+                'total_distance_traveled': i * 3,
+                'instantaneous_speed': 3.0,
+                'instantaneous_power': 150
+            })
+
+    def test_record_and_read(self):
+        recorder = SessionRecorder(self.path, batch_size=4, flush_interval=0.05)
+        recorder.start(self.rower)
+        self._row(10)
+        recorder.close(timeout=5)
+        self.assertEqual(recorder.written, 10)
+
+        with SessionReader(self.path) as reader:
+            self.assertEqual(len(reader), 10)
+            frame = reader.frame_at(3)
+            self.assertEqual(frame.seq, 4)
+            self.assertEqual(frame.total_distance_traveled, 9)
+            self.assertEqual(frame.instantaneous_power, 150)
+            # missing field is None again.
+            self.assertIsNone(frame.strokes_per_minute)
+
+            self.assertEqual(reader.find_seq(7), 6)
+            self.assertIsNone(reader.find_seq(100))
+            last = reader.frame_at(9)
+            self.assertEqual(reader.find_time(last.timestamp), 9)
+            self.assertEqual(len(reader.frames_between(reader.frame_at(2).timestamp, last.timestamp)), 7)
+
+    def test_append(self):
+        recorder = SessionRecorder(self.path, flush_interval=0.05)
+        recorder.start(self.rower)
+        self._row(3)
+        recorder.close(timeout=5)
+
+        recorder = SessionRecorder(self.path, flush_interval=0.05)
+        recorder.start(self.rower)
+        self._row(2, start=3)
+        recorder.close(timeout=5)
+
+        with SessionReader(self.path) as reader:
+            self.assertEqual([reader.frame_at(i).seq for i in range(len(reader))], [1, 2, 3, 4, 5])
+
+        # another layout is not appended to.
+        with self.assertRaises(SessionFileError):
+            SessionRecorder(self.path, fields=[('total_elapsed_time', 'q')]).start()
+        # a Rower behind the file (seq restarted) is not appended to.
+        with self.assertRaises(SessionFileError):
+            SessionRecorder(self.path).start(rower.Rower(history_capacity=0))
+
+    def test_other_run(self):
+        recorder = SessionRecorder(self.path)
+        recorder.start()
+        recorder.close(timeout=5)
+
+        # a file of another process run is not appended to, its seq and timestamps don't follow this run.
+        run_id = session_recorder.RUN_ID
+        session_recorder.RUN_ID = b'\0' * 8
+        try:
+            with self.assertRaises(SessionFileError):
+                SessionRecorder(self.path).start()
+        finally:
+            session_recorder.RUN_ID = run_id
+
+    def test_write_failure(self):
+        recorder = SessionRecorder(self.path, batch_size=1, flush_interval=0.05)
+        recorder.start(self.rower)
+        # the disk fails, the writer stops, logs, and the recorder unsubscribes.
+        recorder._file.close()
+        with self.assertLogs('rowercast.session_recorder'):
+            self._row(1)
+            recorder.worker_thread.join(5)
+        self.assertIsNotNone(recorder.error)
+        self.assertEqual(self.rower._subscribers, ())
+        recorder.add_frame(self.rower.get_current_frame())
+        self.assertEqual(len(recorder._pending), 0)
+
+    def test_not_a_session_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a session file, at all, not even close to one')
+        with self.assertRaises(SessionFileError):
+            SessionReader(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import threading
+import unittest
+
+import rower
+from simulator import Interval, RowingSimulator, SimulatorFleet, run_schedule
+
+
+class _FakeClock:
+    """A clock moved by the waits of a stop event, each wait oversleeps by a jitter."""
+
+    def __init__(self, jitter):
+        self.now = 100.0
+        self.jitter = jitter
+
+    def __call__(self):
+        return self.now
+
+
+class _FakeStopEvent:
+
+    def __init__(self, clock):
+        self.clock = clock
+
+    def is_set(self):
+        return False
+
+    def wait(self, seconds):
+        self.clock.now += seconds + self.clock.jitter
+        return False
+
+
+class RunScheduleTestCase(unittest.TestCase):
+
+    def test_no_drift(self):
+        clock = _FakeClock(jitter=0.0004)
+        ticks = []
+
+        def step(seconds):
+            ticks.append((seconds, clock.now))
+            return len(ticks) < 1000
+
+        late = run_schedule(1000, step, _FakeStopEvent(clock), clock)
+        self.assertEqual(late, 0)
+        # the last frame is 1 second after the start, give or take one jitter, not 1000 of them.
+        self.assertEqual(ticks[-1][0], 1.0)
+        self.assertAlmostEqual(ticks[-1][1], 101.0, delta=0.0005)
+
+    def test_stop(self):
+        stop_event = threading.Event()
+        stop_event.set()
+        self.assertEqual(run_schedule(10, lambda seconds: self.fail("stepped"), stop_event), 0)
+
+
+class RowingSimulatorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.rower = rower.Rower(history_capacity=0)
+
+    def _run(self, simulator, seconds, rate):
+        for n in range(1, int(seconds * rate) + 1):
+            if not simulator.step(n / rate):
+                break
+
+    def test_steady_state(self):
+        simulator = RowingSimulator(self.rower, [Interval(spm=24, pace=120)])
+        powers = []
+        speeds = []
+        for n in range(1, 60 * 50 + 1):
+            frame = simulator.advance(n / 50)
+            powers.append(frame['instantaneous_power'])
+            speeds.append(frame['instantaneous_speed'])
+        # 24 whole strokes in 60 seconds, the swings cancel out.
+        self.assertAlmostEqual(simulator.distance, 60 * 500 / 120, places=6)
+        self.assertEqual(frame['total_elapsed_time'], 60)
+        self.assertEqual(frame['strokes_per_minute'], 24)
+        # the power is in the drive only, its average is 2.8 v^3.
+        self.assertAlmostEqual(sum(powers) / len(powers), 2.8 * (500 / 120) ** 3, delta=2)
+        self.assertEqual(min(powers), 0)
+        self.assertAlmostEqual(max(speeds), 500 / 120 * 1.1, places=2)
+
+    def test_distance_rate_independent(self):
+        low = RowingSimulator(rower.Rower(history_capacity=0), [Interval(spm=lambda t: 20 + t / 10, pace=110)])
+        high = RowingSimulator(rower.Rower(history_capacity=0), [Interval(spm=lambda t: 20 + t / 10, pace=110)])
+        self._run(low, 30, 2)
+        self._run(high, 30, 500)
+        self.assertAlmostEqual(low.distance, high.distance, delta=0.5)
+
+    def test_intervals(self):
+        # whole strokes in each interval, 5 and 3.
+        workout = [Interval(15, spm=20, pace=150), Interval(5, rest=True), Interval(6, spm=30, pace=100)]
+        simulator = RowingSimulator(self.rower, workout, rate=4)
+        self._run(simulator, 30, 4)
+        self.assertTrue(simulator.finished)
+        self.assertEqual(simulator.frames, 26 * 4 - 1)
+        self.assertEqual(self.rower.get_current_frame().derived()['interval_number'], 3)
+        self.assertAlmostEqual(simulator.distance, 15 * 500 / 150 + 6 * 500 / 100, places=6)
+
+    def test_start_close(self):
+        simulator = RowingSimulator(self.rower, rate=200)
+        since = self.rower.get_current_frame().seq
+        simulator.start()
+        try:
+            self.assertIsNotNone(self.rower.wait_for_update(since, timeout=2))
+        finally:
+            self.assertTrue(simulator.close(timeout=1))
+
+
+class SimulatorFleetTestCase(unittest.TestCase):
+
+    def test_fleet(self):
+        rowers = [rower.Rower(history_capacity=0) for _ in range(4)]
+        fleet = SimulatorFleet([RowingSimulator(r, [Interval(0.2)]) for r in rowers], rate=100)
+        fleet.start()
+        fleet.worker_thread.join(timeout=5)
+        # stopped on its own at the end of the workouts.
+        self.assertFalse(fleet.worker_thread.is_alive())
+        self.assertEqual(fleet.frames, 4 * 19)
+        for r in rowers:
+            self.assertEqual(r.get_current_frame()['strokes_per_minute'], 24)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+
+import rower
+from serial_reader import create_reader
+from waterrower_reader import WaterRowerS4Reader, decode_s4_reply
+
+
+class _FakeS4:
+    """A WaterRower S4 on a serial port, replies to the memory reads, with stroke events in between."""
+
+    # address: reply line, 1:02:03, 5000 m, 3.25 m/s, 26 spm, 180 W.
+    REPLIES = {
+        b'1E1': b'IDS1E103',
+        b'1E2': b'IDS1E202',
+        b'1E3': b'IDS1E301',
+        b'055': b'IDD0551388',
+        b'14A': b'IDD14A0145',
+        b'1A9': b'IDS1A91A',
+        b'088': b'IDD08800B4',
+    }
+
+    def __init__(self):
+        # read timeout of the port, and the function told of the seconds a read is blocked for, None for no block.
+        self.timeout = 1
+        self.on_wait = None
+        self.writes = []
+        self._output = b''
+
+    def write(self, data):
+        self.writes.append(data)
+        commands = data.split(b'\r\n')[:-1]
+        for index, command in enumerate(commands):
+            self._output += self.REPLIES[command[3:]] + b'\r\n'
+            if index == 1:
+                self._output += b'SS\r\n'
+
+    @property
+    def in_waiting(self):
+        return len(self._output)
+
+    def read(self, size=1):
+        if not self._output and self.on_wait is not None:
+            # nothing to read, blocked for the read timeout.
+            self.on_wait(self.timeout)
+        data, self._output = self._output[:size], self._output[size:]
+        return data
+
+
+class WaterRowerS4ReaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.rower = rower.Rower(history_capacity=0)
+        self.reader = create_reader('waterrower_s4', self.rower, '', clock=lambda: self.now)
+        self.s4 = _FakeS4()
+
+    def _round(self):
+        self.reader._handle_messages(self.reader._read_messages(self.s4))
+        self.now += self.reader.poll_interval
+
+    def _wait(self, seconds):
+        self.now += seconds
+
+    def test_reply_timeout(self):
+        # no reply, the reads wait up to the reply deadline, not for the 1 second timeout of the port.
+        self.s4.write = lambda data: None
+        self.s4.on_wait = self._wait
+        self.assertEqual(self.reader._read_messages(self.s4), [])
+        self.assertEqual(self.reader.timeouts, 1)
+        self.assertAlmostEqual(self.now, self.reader.REPLY_TIMEOUT)
+
+    def test_decode(self):
+        self.assertEqual(decode_s4_reply(b'IDD0551388\r\n'), (b'055', 5000))
+        # the display time digits are decimal.
+        self.assertEqual(decode_s4_reply(b'IDS1E159'), (b'1E1', 59))
+        self.assertIsNone(decode_s4_reply(b'SS'))
+        self.assertIsNone(decode_s4_reply(b'IDS1E1'))
+        self.assertIsNone(decode_s4_reply(b'IDS999FF'))
+
+    def test_batched_polling(self):
+        self.assertIsInstance(self.reader, WaterRowerS4Reader)
+        self._round()
+        # all the reads in one write, one round trip.
+        self.assertEqual(len(self.s4.writes), 1)
+        self.assertEqual(self.s4.writes[0].count(b'\r\n'), 7)
+        frame = self.rower.get_current_frame()
+        self.assertEqual(frame['total_elapsed_time'], 3723)
+        self.assertEqual(frame['total_distance_traveled'], 5000)
+        self.assertEqual(frame['instantaneous_speed'], 3.25)
+        self.assertEqual(frame['strokes_per_minute'], 26)
+        self.assertEqual(frame['instantaneous_power'], 180)
+
+        # the hours every 4 rounds, the time goes on with the last hours read.
+        self._round()
+        self.assertEqual(self.s4.writes[1], b'IRS1E1\r\nIRS1E2\r\nIRD055\r\nIRD14A\r\n')
+        self.assertEqual(self.rower.get_current_frame()['total_elapsed_time'], 3723)
+
+
+if __name__ == '__main__':
+    unittest.main()
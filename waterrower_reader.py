@@ -0,0 +1,140 @@
+"""Serial reader for the WaterRower S4 monitor
+
+The S4 speaks ASCII lines, ending with \\r\\n, on its USB serial port, at 19200 baud:
+    USB             connect, the S4 replies _WR_.
+    IRS<addr>       read the single byte at the 3 hex digit address, reply IDS<addr><2 hex digits>.
+    IRD<addr>       read a double byte, reply IDD<addr><4 hex digits>.
+    IRT<addr>       read a triple byte, reply IDT<addr><6 hex digits>.
+On its own it only sends the stroke events, SS and SE, and P<n> pulses, its data must be polled from its memory. Each
+poll round writes all the reads due in one go, and reads their replies, one round trip.
+
+Memory map of the values read, address: (field, size, base of the digits):
+    055     distance in meter, double.
+    14A     speed in cm/s, double.
+    1A9     strokes per minute, single.
+    088     power in watts, double.
+    1E1     seconds of the display time, single, decimal digits.
+    1E2     minutes of the display time, single, decimal digits.
+    1E3     hours of the display time, single, decimal digits.
+
+"""
+
+import serial
+
+from serial_reader import PolledSerialReader, register_reader
+
+# read command letters and reply prefixes, by size in bytes.
+_READ_COMMANDS = {1: b'IRS', 2: b'IRD', 3: b'IRT'}
+_REPLY_SIZES = {b'IDS': 1, b'IDD': 2, b'IDT': 3}
+
+# the parts of the display time, kept by the reader, a reply may have some of them only.
+_TIME_PARTS = ('hours', 'minutes', 'seconds')
+
+# address: (field, size, base), the time parts are put together into total_elapsed_time.
+S4_MEMORY_MAP = {
+    b'055': ('total_distance_traveled', 2, 16),
+    b'14A': ('speed_cm', 2, 16),
+    b'1A9': ('strokes_per_minute', 1, 16),
+    b'088': ('instantaneous_power', 2, 16),
+    b'1E1': ('seconds', 1, 10),
+    b'1E2': ('minutes', 1, 10),
+    b'1E3': ('hours', 1, 10),
+}
+
+
+def s4_read_command(address):
+    """The read command of the memory address, its size from the memory map."""
+    return _READ_COMMANDS[S4_MEMORY_MAP[address][1]] + address + b'\r\n'
+
+
+def decode_s4_reply(line):
+    """Decode a memory read reply line, return (address, value), None if it's not one of the memory map."""
+    line = line.strip()
+    size = _REPLY_SIZES.get(line[:3])
+    if size is None:
+        return None
+    address = line[3:6]
+    entry = S4_MEMORY_MAP.get(address)
+    digits = line[6:6 + 2 * size]
+    if entry is None or len(digits) != 2 * size:
+        return None
+    try:
+        return address, int(digits, entry[2])
+    except ValueError:
+        return None
+
+
+@register_reader('waterrower_s4')
+class WaterRowerS4Reader(PolledSerialReader):
+    """Serial reader for the WaterRower S4 monitor, polled, see the module doc."""
+
+    # (memory address, every n rounds), the time and the distance each round, the rest every other round.
+    queries = (
+        (b'1E1', 1),
+        (b'1E2', 1),
+        (b'1E3', 4),
+        (b'055', 1),
+        (b'14A', 1),
+        (b'1A9', 2),
+        (b'088', 2),
+    )
+    # reads written at once, the S4 input buffer is small.
+    max_batch_size = 8
+
+    BAUD_RATE = 19200
+
+    def __init__(self, outbound_rower, serial_device_address, **kwargs):
+        super(WaterRowerS4Reader, self).__init__(outbound_rower, serial_device_address, **kwargs)
+        # the parts of the display time read so far, the hours are read less often.
+        self._time_parts = {'hours': 0}
+
+    def _open_port(self, timeout=1):
+        return serial.Serial(self.serial_device_address, baudrate=self.BAUD_RATE, timeout=timeout)
+
+    def _connect(self, ser):
+        ser.write(b'USB\r\n')
+
+    def _encode_queries(self, batch):
+        return b''.join(s4_read_command(address) for address in batch)
+
+    def _read_reply(self, ser, batch):
+        """Read the lines until each address of the batch has its reply, the stroke events are skipped."""
+        expected = set(batch)
+        lines = []
+        buffer = bytearray()
+        deadline = self.clock() + self.REPLY_TIMEOUT
+        while expected and self.clock() < deadline:
+            data = self._read_before(ser, deadline)
+            if not data:
+                continue
+            buffer += data
+            while True:
+                end = buffer.find(b'\n')
+                if end < 0:
+                    break
+                line = bytes(buffer[:end + 1])
+                del buffer[:end + 1]
+                decoded = decode_s4_reply(line)
+                if decoded is not None:
+                    expected.discard(decoded[0])
+                    lines.append(line)
+        return b''.join(lines)
+
+    def _decode_reply(self, reply):
+        fields = {}
+        for line in reply.splitlines():
+            decoded = decode_s4_reply(line)
+            if decoded is None:
+                continue
+            address, value = decoded
+            name = S4_MEMORY_MAP[address][0]
+            if name in _TIME_PARTS:
+                self._time_parts[name] = value
+            elif name == 'speed_cm':
+                fields['instantaneous_speed'] = value / 100
+            else:
+                fields[name] = value
+        parts = self._time_parts
+        if 'seconds' in parts and 'minutes' in parts:
+            fields['total_elapsed_time'] = (parts['hours'] * 60 + parts['minutes']) * 60 + parts['seconds']
+        return fields